@@ -0,0 +1,59 @@
+"""
+Compare two benchmark result files (python -m bench.compare old.json new.json).
+Prints p50/p95 and throughput per measurement with the relative change;
+changes beyond --threshold are flagged.
+"""
+import argparse
+import json
+
+
+def _flatten(node, prefix=""):
+    if isinstance(node, dict):
+        if "p50_ms" in node or "requests_per_s" in node:
+            yield prefix, node
+            return
+        for key, value in node.items():
+            if isinstance(value, dict):
+                yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+
+
+def _metrics(summary):
+    latency = summary.get("latency", summary)
+    out = {"p50_ms": latency.get("p50_ms"), "p95_ms": latency.get("p95_ms")}
+    throughput = summary.get("throughput_per_s", summary.get("requests_per_s"))
+    if throughput is not None:
+        out["throughput"] = throughput
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change flagged as a regression.")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = dict(_flatten(json.load(f)["results"]))
+    with open(args.new) as f:
+        new = dict(_flatten(json.load(f)["results"]))
+
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        before, after = _metrics(old[name]), _metrics(new[name])
+        for metric, value in after.items():
+            previous = before.get(metric)
+            if not previous or value is None:
+                continue
+            change = (value - previous) / previous
+            worse = change < -args.threshold if metric == "throughput" else change > args.threshold
+            regressions += worse
+            flag = "  REGRESSION" if worse else ""
+            print(f"{name:45s} {metric:11s} {previous:12.3f} -> {value:12.3f} ({change:+.1%}){flag}")
+
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
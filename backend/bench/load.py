@@ -0,0 +1,91 @@
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from .stats import summarize
+
+
+def run_load(send, requests, concurrency):
+    """
+    Call send(i) for i in range(requests) from `concurrency` threads.
+    send returns an HTTP status code; anything else than 200 counts as an error.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def _worker():
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                status = send(i)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker) for _ in range(max(concurrency, 1))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall, 3),
+        "requests_per_s": round(requests / wall, 2) if wall else None,
+        "statuses": statuses,
+        "errors": requests - statuses.get("200", 0),
+        "latency": summarize(latencies),
+    }
+
+
+def client_sender(token, path, questions):
+    """
+    send() posting questions through the Django test client (one client per thread).
+    """
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = local.client.post(path, {"question": questions[i % len(questions)]}, content_type="application/json")
+        return response.status_code
+
+    return send
+
+
+def http_sender(base_url, token, path, questions, timeout=120):
+    """
+    send() posting questions to a running server.
+    """
+    url = base_url.rstrip("/") + path
+
+    def send(i):
+        body = json.dumps({"question": questions[i % len(questions)]}).encode()
+        request = urllib.request.Request(
+            url, data=body, method="POST",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return send
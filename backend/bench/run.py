@@ -0,0 +1,215 @@
+"""
+End-to-end RAG benchmark: synthetic PDFs of each --pages size go through text
+extraction, chunking, embedding, process_pdf_obj and ask_pdf, followed by a
+concurrent ask_pdf load test. Results (latency percentiles, throughput) are
+written as JSON; compare two runs with `python -m bench.compare`.
+
+    python -m bench.run --pages 10 100 --output bench-results.json
+
+Runs against a throwaway test database and media directory, with the models
+from the registry (the first run downloads them). With --server, the load
+test targets a running server instead (--token and --pdf-id required).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from .stats import Samples, summarize
+from .synthetic import make_pdf, VOCAB
+from .load import run_load, client_sender, http_sender
+
+_SETTINGS = (
+    "PDF_EXTRACT_WORKERS", "PDF_EMBED_BATCH_SIZE", "PDF_PIPELINE_BATCH_CHUNKS", "PDF_EMBEDDING_DTYPE",
+    "PDF_INFERENCE_BACKEND", "PDF_ONNX_QUANTIZE", "PDF_RERANK_ENABLED", "PDF_RERANK_CANDIDATES",
+    "PDF_HYBRID_CANDIDATES", "PDF_PROMPT_MAX_TOKENS", "PDF_GENERATION_MAX_BATCH_SIZE",
+)
+
+
+def _questions(texts, count):
+    """
+    Distinct questions about the document: a part number lookup and a topic question per page.
+    """
+    questions = []
+    for i, text in enumerate(texts):
+        words = text.split()
+        questions.append(f"What does the document say about part {words[1]}?")
+        questions.append(f"Summarize the {VOCAB[i % len(VOCAB)]} details on page {i + 1}.")
+    return questions[:count] or ["What is this document about?"]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata(args):
+    from django.conf import settings
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "settings": {name: getattr(settings, name, None) for name in _SETTINGS},
+    }
+
+
+def _bench_document(args, user, token, pages, workdir):
+    from django.core.files import File
+    from django.test import Client
+
+    from pdfs.model_registry import get_embed_model
+    from pdfs.models import PDF, PDFChunk, EmbeddingCache
+    from pdfs.chunking import chunk_text
+    from pdfs.views import extract_text_from_pdf, process_pdf_obj
+
+    path = os.path.join(workdir, f"synthetic-{pages}.pdf")
+    texts = make_pdf(path, pages, words_per_page=args.words_per_page)
+    with open(path, "rb") as f:
+        pdf_obj = PDF.objects.create(user=user, file=File(f, name=os.path.basename(path)), title=f"bench {pages}")
+    result = {"pages": pages, "file_bytes": os.path.getsize(path)}
+    print(f"== {pages} pages ({result['file_bytes']} bytes)")
+
+    # Extraction from the stored file (a path, so the process pool applies to large PDFs)
+    extract = Samples()
+    for _ in range(args.iterations):
+        with extract.time():
+            text = extract_text_from_pdf(pdf_obj.file)
+    result["extract"] = summarize(extract, units=pages)
+
+    chunking = Samples()
+    for _ in range(args.iterations):
+        with chunking.time():
+            chunks = chunk_text(text)
+    result["chunk"] = summarize(chunking, units=len(chunks))
+    result["chunks"] = len(chunks)
+
+    model = get_embed_model()
+    batch = Samples()
+    for _ in range(args.iterations):
+        with batch.time():
+            model.encode(chunks, batch_size=64, convert_to_numpy=True)
+    result["embed_batch"] = summarize(batch, units=len(chunks))
+    single = Samples()
+    for question in _questions(texts, args.questions):
+        with single.time():
+            model.encode(question)
+    result["embed_query"] = summarize(single, units=1)
+
+    # Full processing; without --warm every iteration starts from scratch
+    # (reprocessing would otherwise reuse the existing chunk rows and cached embeddings)
+    process = Samples()
+    stages = []
+    for _ in range(args.iterations):
+        if not args.warm:
+            EmbeddingCache.objects.all().delete()
+            PDFChunk.objects.filter(pdf=pdf_obj).delete()
+        with process.time():
+            ok, payload = process_pdf_obj(pdf_obj)
+        if not ok:
+            raise RuntimeError(f"process_pdf_obj failed: {payload}")
+        stages.append(payload["timings"])
+    result["process"] = summarize(process, units=pages)
+    result["process_stage_seconds"] = {
+        stage: round(sum(t[stage] for t in stages) / len(stages), 4) for stage in stages[0]
+    }
+    PDF.objects.filter(id=pdf_obj.id).update(processing_status=PDF.PROCESSING_DONE)
+
+    path = f"/api/ask_pdf/{pdf_obj.id}/"
+    questions = _questions(texts, args.questions)
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+    ask = Samples()
+    for question in questions:
+        with ask.time():
+            response = client.post(path, {"question": question}, content_type="application/json")
+        if response.status_code != 200:
+            raise RuntimeError(f"ask_pdf returned {response.status_code}: {response.content[:200]!r}")
+    result["ask"] = summarize(ask, units=1)
+
+    if args.requests:
+        # Cycles through the same questions, so answer cache hits are part of the mix
+        result["load"] = run_load(client_sender(token, path, questions), args.requests, args.concurrency)
+
+    for name in ("extract", "chunk", "embed_batch", "embed_query", "process", "ask"):
+        print(f"  {name:12s} p50={result[name]['p50_ms']:.1f}ms p95={result[name]['p95_ms']:.1f}ms")
+    if "load" in result:
+        load = result["load"]
+        print(f"  load         {load['requests_per_s']} req/s p95={load['latency']['p95_ms']:.1f}ms errors={load['errors']}")
+    return result
+
+
+def _run_local(args):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    workdir = tempfile.mkdtemp(prefix="pdf-bench-")
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(workdir, "media"), ALLOWED_HOSTS=["*"]):
+            user = User.objects.create_user(username="bench", password="bench")
+            token = str(AccessToken.for_user(user))
+            return {f"pages_{pages}": _bench_document(args, user, token, pages, workdir) for pages in args.pages}
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_server(args):
+    if not (args.token and args.pdf_id):
+        raise SystemExit("--server needs --token and --pdf-id")
+    path = f"/api/ask_pdf/{args.pdf_id}/"
+    questions = [f"What does the document say about {word}?" for word in VOCAB][: max(args.questions, 1)]
+    load = run_load(http_sender(args.server, args.token, path, questions), args.requests, args.concurrency)
+    print(f"load {load['requests_per_s']} req/s p95={load['latency']['p95_ms']:.1f}ms errors={load['errors']}")
+    return {"server": {"url": args.server, "pdf_id": args.pdf_id, "load": load}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100], help="Page counts of the synthetic PDFs.")
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=3, help="Repeats of the extract/chunk/embed/process stages.")
+    parser.add_argument("--questions", type=int, default=20, help="Sequential ask_pdf calls per document.")
+    parser.add_argument("--requests", type=int, default=50, help="ask_pdf calls in the load test (0 to skip).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warm", action="store_true", help="Keep chunks and cached embeddings between process runs.")
+    parser.add_argument("--server", help="Run only the load test, against this base URL.")
+    parser.add_argument("--token", help="JWT access token for --server.")
+    parser.add_argument("--pdf-id", type=int, help="Processed PDF to ask about with --server.")
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args(argv)
+
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pdfchat.settings")
+    django.setup()
+
+    started = time.perf_counter()
+    report = {"metadata": _metadata(args)}
+    report["results"] = _run_server(args) if args.server else _run_local(args)
+    report["metadata"]["duration_s"] = round(time.perf_counter() - started, 1)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def summarize(samples, units=None):
+    """
+    Latency summary in milliseconds for samples in seconds. With `units`
+    (items processed per sample, e.g. pages), throughput is added as units/s.
+    """
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples, dtype="float64") * 1000
+    summary = {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+    if units is not None:
+        total = float(np.sum(samples))
+        summary["throughput_per_s"] = round(units * len(samples) / total, 2) if total else None
+    return summary
+
+
+class Samples(list):
+    """
+    A list of durations (seconds) with a timing context manager.
+    """
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.append(time.perf_counter() - started)
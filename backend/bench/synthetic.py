@@ -0,0 +1,72 @@
+import random
+
+# Minimal, dependency-free PDF writer for benchmarks: one Helvetica text
+# stream per page, so PyPDF2 extracts exactly what was written.
+
+VOCAB = (
+    "the contract clause section payment invoice delivery term party notice warranty liability "
+    "report figure table revenue growth quarter customer product service policy data model "
+    "engine valve pump pressure manual maintenance inspection schedule safety procedure"
+).split()
+
+_WORDS_PER_LINE = 12
+_LINES_PER_PAGE = 60
+
+
+def page_text(page_number, words_per_page, rng):
+    """
+    Sentences of vocabulary words, with a page marker and a part number
+    identifier (e.g. PN-01234) so keyword queries have exact targets.
+    """
+    words = [f"page{page_number}", f"PN-{rng.randrange(100000):05d}"]
+    while len(words) < words_per_page:
+        sentence = rng.choices(VOCAB, k=rng.randint(6, 18))
+        sentence[-1] += "."
+        words.extend(sentence)
+    return " ".join(words[:words_per_page])
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(path, pages, words_per_page=300, seed=0):
+    """
+    Write a `pages`-page PDF to `path` and return the text of each page.
+    """
+    rng = random.Random(seed)
+    texts = [page_text(i + 1, words_per_page, rng) for i in range(pages)]
+
+    # 1 catalog, 2 page tree, 3 font, then a (page, content stream) pair per page
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(texts):
+        words = text.split()
+        lines = [" ".join(words[j:j + _WORDS_PER_LINE]) for j in range(0, len(words), _WORDS_PER_LINE)]
+        lines = lines[:_LINES_PER_PAGE]
+        stream = ("BT /F1 9 Tf 30 810 Td 12 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET").encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+    return texts
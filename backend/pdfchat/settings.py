@@ -26,6 +26,100 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# PDF processing
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "25"))
+PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", "64"))
+PDF_PIPELINE_BATCH_CHUNKS = int(os.getenv("PDF_PIPELINE_BATCH_CHUNKS", "256"))  # chunks embedded + written per step
+PDF_EMBEDDING_DTYPE = os.getenv("PDF_EMBEDDING_DTYPE", "float32")  # or "float16"
+# Embedding cache rows no chunk uses are pruned once older than this (seconds)
+PDF_EMBEDDING_CACHE_MIN_AGE = int(os.getenv("PDF_EMBEDDING_CACHE_MIN_AGE", "3600"))
+
+# Per-PDF vector index (normalized embeddings, inner-product / cosine search):
+# "flat" (exact), "ivf" or "hnsw" (approximate; PDFs under 1000 chunks stay flat)
+PDF_INDEX_TYPE = os.getenv("PDF_INDEX_TYPE", "flat")
+PDF_INDEX_IVF_NPROBE = int(os.getenv("PDF_INDEX_IVF_NPROBE", "16"))
+PDF_INDEX_HNSW_M = int(os.getenv("PDF_INDEX_HNSW_M", "32"))
+PDF_INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("PDF_INDEX_HNSW_EF_CONSTRUCTION", "80"))
+PDF_INDEX_HNSW_EF_SEARCH = int(os.getenv("PDF_INDEX_HNSW_EF_SEARCH", "64"))
+
+# Retrieval: vector and BM25 candidates fused with reciprocal rank fusion
+PDF_HYBRID_CANDIDATES = int(os.getenv("PDF_HYBRID_CANDIDATES", "20"))  # per retriever
+PDF_RRF_K = int(os.getenv("PDF_RRF_K", "60"))
+PDF_BM25_K1 = float(os.getenv("PDF_BM25_K1", "1.2"))
+PDF_BM25_B = float(os.getenv("PDF_BM25_B", "0.75"))
+
+# Reranking: the fused candidate pool is rescored by a cross-encoder before generation
+PDF_RERANK_ENABLED = os.getenv("PDF_RERANK_ENABLED", "True") == 'True'
+PDF_RERANK_CANDIDATES = int(os.getenv("PDF_RERANK_CANDIDATES", "50"))
+PDF_RERANK_BATCH_SIZE = int(os.getenv("PDF_RERANK_BATCH_SIZE", "16"))
+PDF_RERANK_BUDGET_MS = float(os.getenv("PDF_RERANK_BUDGET_MS", "150"))  # stop scoring new batches after this
+PDF_RERANK_CACHE_SIZE = int(os.getenv("PDF_RERANK_CACHE_SIZE", "10000"))
+
+# Prompt input budget in tokens (flan-t5 truncates at 512); retrieved chunks are packed to fit
+PDF_PROMPT_MAX_TOKENS = int(os.getenv("PDF_PROMPT_MAX_TOKENS", "512"))
+
+# Inference backend for the embedding and answer models: "torch" or "onnx" (ONNX Runtime on CPU).
+# ONNX models are exported on first load (or with manage.py export_onnx) into PDF_ONNX_MODEL_DIR.
+PDF_INFERENCE_BACKEND = os.getenv("PDF_INFERENCE_BACKEND", "torch")
+PDF_ONNX_MODEL_DIR = os.getenv("PDF_ONNX_MODEL_DIR", os.path.join(BASE_DIR, "onnx_models"))
+PDF_ONNX_QUANTIZE = os.getenv("PDF_ONNX_QUANTIZE") == 'True'  # int8 dynamic quantization
+PDF_ONNX_THREADS = int(os.getenv("PDF_ONNX_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Load models in the server master before workers fork (use with gunicorn --preload)
+PDF_PRELOAD_MODELS = os.getenv("PDF_PRELOAD_MODELS") == 'True'
+
+# Answer generation: concurrent ask_pdf prompts are batched together
+PDF_GENERATION_MAX_BATCH_SIZE = int(os.getenv("PDF_GENERATION_MAX_BATCH_SIZE", "8"))
+PDF_GENERATION_MAX_WAIT_MS = float(os.getenv("PDF_GENERATION_MAX_WAIT_MS", "10"))
+
+# Async views: blocking model calls run on a bounded executor; callers beyond
+# workers + queue size wait up to the queue timeout for a slot, then get a 429
+PDF_MODEL_EXECUTOR_WORKERS = int(os.getenv("PDF_MODEL_EXECUTOR_WORKERS", "8"))
+PDF_MODEL_EXECUTOR_QUEUE_SIZE = int(os.getenv("PDF_MODEL_EXECUTOR_QUEUE_SIZE", "32"))
+PDF_MODEL_EXECUTOR_QUEUE_TIMEOUT = float(os.getenv("PDF_MODEL_EXECUTOR_QUEUE_TIMEOUT", "5"))  # seconds
+
+# Answer cache (per process), scoped to a PDF's processed_at so reprocessing invalidates it
+PDF_ANSWER_CACHE_SIZE = int(os.getenv("PDF_ANSWER_CACHE_SIZE", "1024"))
+PDF_ANSWER_CACHE_TTL = int(os.getenv("PDF_ANSWER_CACHE_TTL", "3600"))  # seconds
+PDF_ANSWER_CACHE_SIMILARITY = float(os.getenv("PDF_ANSWER_CACHE_SIMILARITY", "0.95"))  # cosine
+
+# Question embeddings per (embedding model, normalized question). With a path, they are also
+# kept in a local SQLite file shared by the worker processes on the host ("" = memory only)
+PDF_QUERY_EMBED_CACHE_SIZE = int(os.getenv("PDF_QUERY_EMBED_CACHE_SIZE", "10000"))
+PDF_QUERY_EMBED_CACHE_PATH = os.getenv("PDF_QUERY_EMBED_CACHE_PATH", "")
+PDF_QUERY_EMBED_CACHE_DISK_SIZE = int(os.getenv("PDF_QUERY_EMBED_CACHE_DISK_SIZE", "100000"))
+
+# Cross-document search: per-user HNSW index, sharded by vector count
+PDF_USER_INDEX_SHARD_SIZE = int(os.getenv("PDF_USER_INDEX_SHARD_SIZE", "100000"))
+PDF_USER_INDEX_HNSW_M = int(os.getenv("PDF_USER_INDEX_HNSW_M", "32"))
+PDF_USER_INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("PDF_USER_INDEX_HNSW_EF_CONSTRUCTION", "80"))
+PDF_USER_INDEX_HNSW_EF_SEARCH = int(os.getenv("PDF_USER_INDEX_HNSW_EF_SEARCH", "64"))
+PDF_USER_INDEX_MAX_DEAD_RATIO = float(os.getenv("PDF_USER_INDEX_MAX_DEAD_RATIO", "0.3"))  # compact shards above this
+PDF_USER_INDEX_CACHE_BYTES = int(os.getenv("PDF_USER_INDEX_CACHE_BYTES", str(1024**3)))  # mapped shards kept per process
+
+# Resumable chunked uploads (/api/uploads/): parts are written here, then moved into MEDIA_ROOT
+PDF_UPLOAD_DIR = os.getenv("PDF_UPLOAD_DIR", os.path.join(BASE_DIR, "upload_parts"))
+PDF_UPLOAD_MAX_SIZE = int(os.getenv("PDF_UPLOAD_MAX_SIZE", str(2 * 1024**3)))  # bytes
+PDF_UPLOAD_MAX_PART_SIZE = int(os.getenv("PDF_UPLOAD_MAX_PART_SIZE", str(64 * 1024**2)))  # bytes
+PDF_UPLOAD_SESSION_TTL = int(os.getenv("PDF_UPLOAD_SESSION_TTL", str(24 * 3600)))  # seconds since the last part
+PDF_UPLOAD_PART_TIMEOUT = int(os.getenv("PDF_UPLOAD_PART_TIMEOUT", "600"))  # seconds before a stalled part can be retried
+
+# view_pdf file transfer: "" (Django sends the file), "x-accel" (nginx X-Accel-Redirect to
+# PDF_X_ACCEL_PREFIX + file name, an internal location aliased to MEDIA_ROOT) or "x-sendfile"
+PDF_FILE_OFFLOAD = os.getenv("PDF_FILE_OFFLOAD", "")
+PDF_X_ACCEL_PREFIX = os.getenv("PDF_X_ACCEL_PREFIX", "/protected-media/")
+
+# /metrics (Prometheus text format). With a token, scrapes must send "Authorization: Bearer <token>"
+PDF_METRICS_TOKEN = os.getenv("PDF_METRICS_TOKEN", "")
+
+# Background processing (manage.py run_workers)
+PDF_WORKER_CONCURRENCY = int(os.getenv("PDF_WORKER_CONCURRENCY", "2"))
+PDF_JOB_MAX_ATTEMPTS = int(os.getenv("PDF_JOB_MAX_ATTEMPTS", "3"))
+PDF_JOB_RETRY_BACKOFF = int(os.getenv("PDF_JOB_RETRY_BACKOFF", "30"))  # seconds, doubled per attempt
+PDF_JOB_STALE_AFTER = int(os.getenv("PDF_JOB_STALE_AFTER", "1800"))  # seconds without a heartbeat
+PDF_JOB_HEARTBEAT_INTERVAL = int(os.getenv("PDF_JOB_HEARTBEAT_INTERVAL", "60"))  # seconds
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -19,8 +19,11 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from pdfs.views import metrics
+
 urlpatterns = [
     path('api/', include('api.urls')),
     path('api/', include('pdfs.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
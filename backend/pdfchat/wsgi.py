@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pdfchat.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.PDF_PRELOAD_MODELS:
+    from pdfs.model_registry import preload_models
+
+    preload_models()
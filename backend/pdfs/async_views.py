@@ -0,0 +1,135 @@
+import json
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .auth import aauthenticate_bearer
+from .cache import AnswerCache, get_answer_cache, get_query_embedding_cache
+from .executor import ExecutorSaturated, get_model_executor
+from .generation import generate_answer
+from .metrics import span, timed_view
+from .model_registry import embed_model_key
+from .models import PDF, PDFChunk
+from .views import _build_prompt, _embed_question, _retrieve_context
+
+
+# Async versions of ask_pdf, pdf_chunks and my_pdfs for ASGI servers. The DB is
+# queried with the async ORM and every blocking model call goes through the
+# bounded model executor, so waiting clients cost a coroutine, not a thread.
+# Auth is the same SimpleJWT bearer token the DRF views use (a header, not a
+# cookie, so like DRF's views they are exempt from CSRF checks).
+
+
+def _busy_response(e):
+    response = JsonResponse({"error": str(e)}, status=429)
+    response["Retry-After"] = "1"
+    return response
+
+
+async def _get_user_pdf(user, pdf_id):
+    return await PDF.objects.select_related("content_source").filter(id=pdf_id, user=user).afirst()
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@timed_view("ask_pdf_async")
+async def ask_pdf_async(request, pdf_id):
+    """
+    Async ask_pdf: same retrieval and generation, same response shape.
+    Returns 429 when the model executor stays saturated past its queue timeout.
+    """
+    user, error = await aauthenticate_bearer(request)
+    if error is not None:
+        return error
+
+    try:
+        with span("parse_request"):
+            body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    question = str(body.get("question", "")).strip()
+    if not question:
+        return JsonResponse({"error": "Question required"}, status=400)
+
+    with span("fetch_pdf"):
+        pdf_obj = await _get_user_pdf(user, pdf_id)
+    if pdf_obj is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+
+    cache = get_answer_cache()
+    scope = AnswerCache.scope_for(pdf_obj.content_owner)
+    answer = cache.get_exact(scope, question)
+    if answer is not None:
+        return JsonResponse({"answer": answer, "cached": True})
+
+    executor = get_model_executor()
+    try:
+        # Only the in-memory cache is checked on the loop: the disk store (a
+        # blocking SQLite read) and the model run in the executor
+        q_embed = get_query_embedding_cache().peek(embed_model_key(), question)
+        if q_embed is None:
+            q_embed = await executor.run(_embed_question, question)
+        answer = cache.get_similar(scope, q_embed)
+        if answer is not None:
+            return JsonResponse({"answer": answer, "cached": True})
+
+        relevant_text, error = await executor.run(_retrieve_context, pdf_obj, question, q_embed)
+        if error is not None:
+            return JsonResponse(error.data, status=error.status_code)
+
+        # The span includes the wait for an executor slot
+        with span("generate"):
+            answer = await executor.run(generate_answer, _build_prompt(relevant_text, question))
+    except ExecutorSaturated as e:
+        return _busy_response(e)
+
+    cache.set(scope, question, q_embed, answer)
+    return JsonResponse({"answer": answer})
+
+
+@require_http_methods(["GET"])
+async def pdf_chunks_async(request, pdf_id):
+    """
+    Async pdf_chunks: all chunks of a PDF.
+    """
+    user, error = await aauthenticate_bearer(request)
+    if error is not None:
+        return error
+
+    pdf_obj = await _get_user_pdf(user, pdf_id)
+    if pdf_obj is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+
+    chunks = PDFChunk.objects.filter(pdf=pdf_obj.content_owner).order_by("order").values(
+        "id", "chunk_text", "order", "page_number"
+    )
+    return JsonResponse([c async for c in chunks], safe=False)
+
+
+@require_http_methods(["GET"])
+async def my_pdfs_async(request):
+    """
+    Async my_pdfs: the user's PDFs with processing progress.
+    """
+    user, error = await aauthenticate_bearer(request)
+    if error is not None:
+        return error
+
+    pdfs = PDF.objects.filter(user=user).order_by("-uploaded_at").values(
+        "id", "title", "processing_status", "processing_error", "page_count", "pages_processed", "chunks_processed"
+    )
+    data = [
+        {
+            "id": p["id"],
+            "title": p["title"],
+            "file_url": f"/api/pdf/{p['id']}/view/",
+            "processing_status": p["processing_status"],
+            "processing_error": p["processing_error"],
+            "page_count": p["page_count"],
+            "pages_processed": p["pages_processed"],
+            "chunks_processed": p["chunks_processed"],
+        }
+        async for p in pdfs
+    ]
+    return JsonResponse(data, safe=False)
@@ -0,0 +1,41 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+
+class _BearerRequest:
+    """
+    Minimal request object carrying only the Authorization header, for JWTAuthentication.
+    """
+
+    def __init__(self, token):
+        self.META = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+def authenticate_bearer(request):
+    """
+    Validate the JWT in "Authorization: Bearer <token>" for views outside DRF.
+    Returns (user, None) or (None, 401 HttpResponse).
+    """
+    auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not auth_header.startswith("Bearer "):
+        return None, HttpResponse("Unauthorized", status=401)
+
+    token = auth_header.split(" ")[1]
+    try:
+        auth_result = JWTAuthentication().authenticate(_BearerRequest(token))
+    except (InvalidToken, AuthenticationFailed) as e:
+        return None, HttpResponse(f"Unauthorized: {str(e)}", status=401)
+
+    if auth_result is None:
+        return None, HttpResponse("Unauthorized", status=401)
+    return auth_result[0], None
+
+
+async def aauthenticate_bearer(request):
+    """
+    Async authenticate_bearer (the user lookup hits the DB).
+    """
+    return await sync_to_async(authenticate_bearer)(request)
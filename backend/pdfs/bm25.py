@@ -0,0 +1,176 @@
+import re
+
+import numpy as np
+
+
+# Lexical (BM25) index over one PDF's chunks. Kept free of Django imports.
+# Postings are stored CSR-style in flat numpy arrays: the postings of term t
+# (terms sorted) are doc_ids[offsets[t]:offsets[t + 1]] with matching tfs,
+# so a query is a few binary searches plus vectorized scoring.
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/:-][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Lowercased alphanumeric tokens. Identifiers such as "AB-1234.5" or
+    "clause 4.2.1" are kept whole and also split into their parts, so both
+    the exact identifier and its pieces match.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Immutable BM25 index. `orders` maps internal doc ids to PDFChunk.order.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, tfs, doc_lengths, orders, k1=1.2, b=0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.orders = orders
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_lengths)
+        self.avg_doc_length = float(doc_lengths.mean()) if n_docs else 0.0
+        doc_freq = np.diff(offsets).astype("float32")
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype("float32")
+
+    @property
+    def size(self):
+        return len(self.doc_lengths)
+
+    def _term_ids(self, tokens):
+        if not len(self.terms):
+            return []
+        tokens = np.unique(np.asarray(tokens, dtype=str))
+        pos = np.searchsorted(self.terms, tokens)
+        pos = np.minimum(pos, len(self.terms) - 1)
+        return pos[self.terms[pos] == tokens].tolist()
+
+    def search(self, query, top_k=5):
+        """
+        Return (chunk orders, BM25 scores) of the top_k matching chunks, best first.
+        """
+        term_ids = self._term_ids(tokenize(query))
+        if not term_ids or not self.size:
+            return [], []
+
+        scores = np.zeros(self.size, dtype="float32")
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for t in term_ids:
+            start, stop = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[start:stop]
+            tf = self.tfs[start:stop]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return self.orders[matched].tolist(), scores[matched].tolist()
+
+    def to_arrays(self):
+        return {
+            "terms": self.terms,
+            "offsets": self.offsets,
+            "doc_ids": self.doc_ids,
+            "tfs": self.tfs,
+            "doc_lengths": self.doc_lengths,
+            "orders": self.orders,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, k1=1.2, b=0.75):
+        return cls(
+            arrays["terms"], arrays["offsets"], arrays["doc_ids"], arrays["tfs"],
+            arrays["doc_lengths"], arrays["orders"], k1=k1, b=b,
+        )
+
+
+class BM25Builder:
+    """
+    Collects chunks batch by batch (as the processing pipeline produces them)
+    and builds a BM25Index at the end. Per-chunk term counts are kept as
+    small arrays rather than dicts so memory stays proportional to postings.
+    """
+
+    def __init__(self):
+        self._vocab = {}
+        self._doc_term_ids = []
+        self._doc_tfs = []
+        self._orders = []
+
+    def add(self, order, text):
+        ids = np.fromiter(
+            (self._vocab.setdefault(tok, len(self._vocab)) for tok in tokenize(text)), dtype="int32"
+        )
+        term_ids, tfs = np.unique(ids, return_counts=True)
+        self._doc_term_ids.append(term_ids.astype("int32"))
+        self._doc_tfs.append(tfs.astype("float32"))
+        self._orders.append(order)
+
+    def build(self, k1=1.2, b=0.75):
+        n_docs = len(self._orders)
+        doc_lengths = np.array([tfs.sum() for tfs in self._doc_tfs], dtype="float32")
+        if self._doc_term_ids:
+            term_ids = np.concatenate(self._doc_term_ids)
+            tfs = np.concatenate(self._doc_tfs)
+        else:
+            term_ids = np.zeros(0, dtype="int32")
+            tfs = np.zeros(0, dtype="float32")
+        doc_ids = np.repeat(np.arange(n_docs, dtype="int32"), [len(t) for t in self._doc_term_ids])
+
+        # Renumber terms in sorted order so lookups can binary-search the term array
+        words = np.array(list(self._vocab), dtype=str) if self._vocab else np.array([], dtype="<U1")
+        sort = np.argsort(words, kind="stable")
+        rank = np.empty(len(words), dtype="int32")
+        rank[sort] = np.arange(len(words), dtype="int32")
+        term_ids = rank[term_ids] if len(term_ids) else term_ids
+
+        postings = np.lexsort((doc_ids, term_ids))
+        offsets = np.zeros(len(words) + 1, dtype="int64")
+        np.cumsum(np.bincount(term_ids, minlength=len(words)), out=offsets[1:])
+
+        return BM25Index(
+            words[sort],
+            offsets,
+            doc_ids[postings],
+            tfs[postings],
+            doc_lengths,
+            np.asarray(self._orders, dtype="int64"),
+            k1=k1,
+            b=b,
+        )
+
+
+def build_bm25(chunks, k1=1.2, b=0.75):
+    """
+    Build an index from (order, chunk_text) pairs.
+    """
+    builder = BM25Builder()
+    for order, text in chunks:
+        builder.add(order, text)
+    return builder.build(k1=k1, b=b)
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=5):
+    """
+    Fuse ranked lists of ids: score(id) = sum over lists of 1 / (k + rank).
+    Returns the top_k ids, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])[:top_k]
@@ -0,0 +1,343 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question):
+    """
+    Case/whitespace/trailing-punctuation insensitive form of a question, used as a cache key.
+    """
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional TTL (seconds) and hit/miss counters.
+    `on_evict(key, value)` is called for entries dropped by size, TTL or delete.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, on_evict=None):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl = ttl
+        self.on_evict = on_evict
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, expires_at):
+        return expires_at is not None and expires_at < time.monotonic()
+
+    def _drop(self, key):
+        value, _ = self._data.pop(key)
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self._expired(item[1]):
+                self._drop(key)
+                item = None
+
+            if item is None:
+                if count:
+                    self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class AnswerCache:
+    """
+    Answers keyed by scope (pdf_id, processed_at) and question.
+    An exact hit matches the normalized question; a semantic hit matches a
+    cached question in the same scope whose embedding has cosine similarity
+    >= `similarity` with the new one. Reprocessing a PDF changes its scope,
+    so old answers are never served again and age out of the LRU.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, similarity=0.95):
+        self.similarity = similarity
+        self._scopes = {}
+        self._lock = threading.RLock()
+        self._entries = LRUCache(max_entries, ttl, on_evict=self._forget)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope_for(pdf_obj):
+        processed_at = pdf_obj.processed_at.isoformat() if pdf_obj.processed_at else None
+        return (pdf_obj.id, processed_at)
+
+    def _forget(self, key, value):
+        scope = key[0]
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    @staticmethod
+    def _unit(vec):
+        vec = np.asarray(vec, dtype="float32").ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def get_exact(self, scope, question):
+        with self._lock:
+            entry = self._entries.get((scope, normalize_question(question)), count=False)
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, scope, question_vec):
+        """
+        Best cached answer in scope above the similarity threshold (counts a miss otherwise).
+        """
+        with self._lock:
+            keys = list(self._scopes.get(scope, ()))
+            entries = [(k, self._entries.get(k, count=False)) for k in keys]
+            entries = [(k, e) for k, e in entries if e is not None]
+            if entries:
+                matrix = np.stack([e[1] for _, e in entries])
+                scores = matrix @ self._unit(question_vec)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    self.semantic_hits += 1
+                    return entries[best][1][0]
+
+            self.misses += 1
+            return None
+
+    def set(self, scope, question, question_vec, answer):
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._entries.set(key, (answer, self._unit(question_vec)))
+            self._scopes.setdefault(scope, set()).add(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._entries.max_entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self._entries.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class QueryEmbeddingCache:
+    """
+    Question embeddings keyed by (embedding model key, normalized question),
+    so a repeated question skips the embedding model. Entries live in an
+    in-process LRU; with `path`, they are also written to a SQLite file that
+    other worker processes on the host read on a local miss. The file keeps
+    at most `max_disk_entries` rows (oldest written are pruned).
+    """
+
+    _PRUNE_EVERY = 1000  # writes between prunes of the disk store
+
+    def __init__(self, max_entries=10000, path=None, max_disk_entries=100000):
+        self.path = path or None
+        self.max_disk_entries = max_disk_entries
+        self._memory = LRUCache(max_entries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(model TEXT NOT NULL, question TEXT NOT NULL, embedding BLOB NOT NULL, "
+                    "PRIMARY KEY (model, question))"
+                )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; WAL lets readers in other processes proceed during writes
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _frozen(vec):
+        vec = np.array(vec, dtype="float32").ravel()
+        vec.flags.writeable = False  # shared between requests
+        return vec
+
+    def peek(self, model_key, question):
+        """
+        In-memory lookup only: no disk I/O, so it is safe on an event loop.
+        Hits are counted; a miss is counted by the get() that should follow.
+        """
+        vec = self._memory.get((model_key, normalize_question(question)), count=False)
+        if vec is not None:
+            with self._lock:
+                self.hits += 1
+        return vec
+
+    def get(self, model_key, question):
+        key = (model_key, normalize_question(question))
+        vec = self._memory.get(key, count=False)
+        if vec is not None:
+            with self._lock:
+                self.hits += 1
+            return vec
+
+        if self.path:
+            try:
+                row = self._connection().execute(
+                    "SELECT embedding FROM query_embeddings WHERE model = ? AND question = ?", key
+                ).fetchone()
+            except sqlite3.Error as e:
+                print("Query embedding store read error:", e)
+                row = None
+            if row is not None:
+                vec = self._frozen(np.frombuffer(row[0], dtype="float32"))
+                self._memory.set(key, vec)
+                with self._lock:
+                    self.disk_hits += 1
+                return vec
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model_key, question, vec):
+        key = (model_key, normalize_question(question))
+        vec = self._frozen(vec)
+        self._memory.set(key, vec)
+        if not self.path:
+            return vec
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self._PRUNE_EVERY == 0
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, question, embedding) VALUES (?, ?, ?)",
+                    (*key, vec.tobytes()),
+                )
+                if prune:
+                    # INSERT OR REPLACE gives rewritten rows a new rowid: rowid order is write order
+                    conn.execute(
+                        "DELETE FROM query_embeddings WHERE rowid <= "
+                        "(SELECT MAX(rowid) FROM query_embeddings) - ?",
+                        (self.max_disk_entries,),
+                    )
+        except sqlite3.Error as e:
+            print("Query embedding store write error:", e)
+        return vec
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self._memory.max_entries,
+                "disk_store": self.path,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self._memory.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Process-wide answer cache configured from settings.
+    """
+    global _answer_cache
+    if _answer_cache is None:
+        from django.conf import settings
+
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    max_entries=settings.PDF_ANSWER_CACHE_SIZE,
+                    ttl=settings.PDF_ANSWER_CACHE_TTL,
+                    similarity=settings.PDF_ANSWER_CACHE_SIMILARITY,
+                )
+    return _answer_cache
+
+
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """
+    Process-wide question embedding cache configured from settings.
+    """
+    global _query_embedding_cache
+    if _query_embedding_cache is None:
+        from django.conf import settings
+
+        with _query_embedding_cache_lock:
+            if _query_embedding_cache is None:
+                _query_embedding_cache = QueryEmbeddingCache(
+                    max_entries=settings.PDF_QUERY_EMBED_CACHE_SIZE,
+                    path=settings.PDF_QUERY_EMBED_CACHE_PATH,
+                    max_disk_entries=settings.PDF_QUERY_EMBED_CACHE_DISK_SIZE,
+                )
+    return _query_embedding_cache
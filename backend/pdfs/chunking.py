@@ -0,0 +1,57 @@
+import itertools
+from collections import deque
+
+
+# The one chunking implementation: word windows of chunk_size words that
+# overlap by `overlap` words. Kept free of Django so scripts can use it.
+
+
+def chunk_text(text: str, chunk_size: int = 200, overlap: int = 40):
+    """
+    Word-based overlapping chunking.
+    chunk_size and overlap are in WORDS.
+    """
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(chunk_size - overlap, 1)
+    chunks = []
+    for i in range(0, len(words), step):
+        chunk = " ".join(words[i:i + chunk_size]).strip()
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+
+def iter_chunks(pages, chunk_size: int = 200, overlap: int = 40):
+    """
+    Same chunking as chunk_text, streamed over (page_number, text) pages.
+    Keeps only a rolling window of about chunk_size words in memory and
+    yields (chunk_text, page_number) as soon as each chunk is complete,
+    where page_number is the page the chunk starts on.
+    """
+    step = max(chunk_size - overlap, 1)
+    window = deque()  # (word, page_number), window[0] is the next chunk's first word
+    skip = 0  # words still to drop when step > chunk_size
+
+    def _emit():
+        words = list(itertools.islice(window, chunk_size))
+        return " ".join(w for w, _ in words), words[0][1]
+
+    for page_number, text in pages:
+        for word in text.split():
+            if skip:
+                skip -= 1
+                continue
+            window.append((word, page_number))
+            if len(window) == chunk_size:
+                yield _emit()
+                for _ in range(min(step, len(window))):
+                    window.popleft()
+                skip = step - chunk_size if step > chunk_size else 0
+
+    while window:
+        yield _emit()
+        for _ in range(min(step, len(window))):
+            window.popleft()
@@ -0,0 +1,108 @@
+import hashlib
+
+from django.db import transaction
+
+from .models import PDF, PDFChunk
+from .jobs import enqueue_processing
+from .index_store import invalidate_index
+from . import user_index
+
+
+def hash_uploaded_file(uploaded_file):
+    """
+    SHA-256 of an uploaded file, read chunk by chunk (never fully in memory).
+    """
+    digest = hashlib.sha256()
+    for part in uploaded_file.chunks():
+        digest.update(part)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def find_processed_copy(content_hash):
+    """
+    Canonical, fully processed PDF with this content, if any.
+    """
+    return (
+        PDF.objects.filter(
+            content_hash=content_hash,
+            content_source__isnull=True,
+            processing_status=PDF.PROCESSING_DONE,
+        )
+        .order_by("id")
+        .first()
+    )
+
+
+def create_pdf(user, uploaded_file, title, content_hash):
+    """
+    Register an upload. If the same content was already processed, the new PDF
+    just references it (no file copy, no processing) and is done immediately.
+    Otherwise the file is stored and processing is queued. Callers must not
+    tell the uploader which case happened (it would reveal that someone else
+    uploaded the same file).
+    """
+    source = find_processed_copy(content_hash)
+    if source is not None:
+        pdf_obj = PDF.objects.create(
+            user=user,
+            file=source.file.name,
+            title=title,
+            content_hash=content_hash,
+            content_source=source,
+            processing_status=PDF.PROCESSING_DONE,
+            processed_at=source.processed_at,
+            page_count=source.page_count,
+            pages_processed=source.pages_processed,
+            chunks_processed=source.chunks_processed,
+        )
+        try:
+            user_index.index_document(user.id, source.id)
+        except Exception as e:
+            print(f"User index update failed for PDF {pdf_obj.id}:", e)
+        return pdf_obj
+
+    pdf_obj = PDF.objects.create(
+        user=user,
+        file=uploaded_file,
+        title=title,
+        content_hash=content_hash,
+        processing_status=PDF.PROCESSING_PENDING,
+    )
+    # Queue background processing (picked up by `manage.py run_workers`)
+    enqueue_processing(pdf_obj)
+    return pdf_obj
+
+
+def release_content(pdf_obj):
+    """
+    Called before a PDF is deleted. If other PDFs still reference its content,
+    hand the content (chunks; the file and index are shared by name) over to
+    one of them so the deletion doesn't take it away.
+    Returns True if the content is still referenced after this PDF is gone.
+    """
+    if pdf_obj.content_source_id is not None:
+        return True
+
+    with transaction.atomic():
+        refs = list(PDF.objects.select_for_update().filter(content_source=pdf_obj).order_by("id"))
+        if not refs:
+            return False
+
+        heir = refs[0]
+        PDFChunk.objects.filter(pdf=pdf_obj).update(pdf=heir)
+        PDF.objects.filter(id__in=[r.id for r in refs[1:]]).update(content_source=heir)
+        PDF.objects.filter(id=heir.id).update(content_source=None)
+    return True
+
+
+def delete_content_files(pdf_obj):
+    """
+    Remove the stored file and its search index once nothing references them.
+    """
+    if not pdf_obj.file:
+        return
+    if PDF.objects.filter(file=pdf_obj.file.name).exists():
+        return
+    invalidate_index(pdf_obj)
+    pdf_obj.file.delete(save=False)
@@ -0,0 +1,65 @@
+import re
+
+
+# Packs retrieved chunks into the answer model's input budget. Chunk token
+# counts are computed once at ingest (PDFChunk.token_count), so a request
+# only tokenizes the prompt template and, at most, the one chunk it trims.
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text):
+    return [s for s in _SENTENCE_RE.split(text) if s.strip()]
+
+
+def count_tokens(tokenizer, texts):
+    """
+    Token count of each text, without special tokens.
+    """
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def _trim_to_budget(tokenizer, text, budget):
+    """
+    Longest prefix of whole sentences that fits in `budget` tokens ("" if none does).
+    """
+    sentences = split_sentences(text)
+    kept = []
+    used = 0
+    for sentence, tokens in zip(sentences, count_tokens(tokenizer, sentences)):
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept)
+
+
+def pack_context(tokenizer, chunks, budget, separator="\n\n"):
+    """
+    Greedily fill `budget` tokens with chunks [(text, token_count)] given in
+    relevance order. Chunks that fit are taken whole; the first one that
+    doesn't is trimmed at a sentence boundary and packing stops.
+    Returns the packed text.
+    """
+    separator_tokens = count_tokens(tokenizer, [separator])[0]
+    packed = []
+    used = 0
+    for text, tokens in chunks:
+        cost = tokens + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(text)
+            used += cost
+            continue
+
+        remaining = budget - used - (separator_tokens if packed else 0)
+        trimmed = _trim_to_budget(tokenizer, text, remaining) if remaining > 0 else ""
+        if not trimmed and not packed and remaining > 0:
+            # Not even one sentence of the best chunk fits: cut it at the token budget instead
+            ids = tokenizer(text, add_special_tokens=False)["input_ids"][:remaining]
+            trimmed = tokenizer.decode(ids, skip_special_tokens=True)
+        if trimmed:
+            packed.append(trimmed)
+        break
+    return separator.join(packed)
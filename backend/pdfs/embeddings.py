@@ -0,0 +1,138 @@
+import hashlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+def embedding_dtype():
+    """
+    On-disk dtype for new PDFChunk.embedding rows (float32 by default, float16
+    halves the row size). Each row records the dtype it was written with in
+    `embedding_dtype`, so changing the setting doesn't affect existing rows.
+    """
+    return np.dtype(getattr(settings, "PDF_EMBEDDING_DTYPE", "float32"))
+
+
+def embeddings_to_bytes(matrix, dtype=None):
+    """
+    Serialize every row of an (n x dim) matrix, converting the dtype once.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=dtype or embedding_dtype())
+    return [row.tobytes() for row in matrix]
+
+
+def embedding_from_bytes(blob, dtype=None):
+    """
+    Read one stored embedding (written with `dtype`) back as a float32 vector.
+    """
+    dtype = np.dtype(dtype or embedding_dtype())
+    if len(blob) % dtype.itemsize:
+        raise ValueError(f"{len(blob)}-byte embedding is not a whole number of {dtype.name} values")
+    return np.frombuffer(blob, dtype=dtype).astype("float32")
+
+
+def embeddings_matrix(blobs, dtypes=None):
+    """
+    Stack stored embeddings into one contiguous (n x dim) float32 matrix.
+    `dtypes` gives each blob's stored dtype (a single dtype applies to all).
+    Raises ValueError if the rows don't all decode to the same dimension.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype="float32")
+    if dtypes is None or isinstance(dtypes, (str, np.dtype)):
+        dtypes = [dtypes] * len(blobs)
+
+    kinds = {np.dtype(d or embedding_dtype()) for d in dtypes}
+    if len(kinds) == 1 and len({len(blob) for blob in blobs}) == 1:
+        dtype = kinds.pop()
+        if len(blobs[0]) % dtype.itemsize:
+            raise ValueError(f"{len(blobs[0])}-byte embeddings are not a whole number of {dtype.name} values")
+        matrix = np.frombuffer(b"".join(blobs), dtype=dtype).reshape(len(blobs), -1)
+        return matrix.astype("float32", copy=False)
+
+    # Rows written under different PDF_EMBEDDING_DTYPE settings
+    vectors = [embedding_from_bytes(blob, dtype) for blob, dtype in zip(blobs, dtypes)]
+    if len({v.shape[0] for v in vectors}) > 1:
+        raise ValueError("Stored embeddings have different dimensions")
+    return np.vstack(vectors)
+
+
+def chunk_hash(text):
+    """
+    Content hash of a chunk's text (PDFChunk.content_hash / EmbeddingCache.chunk_hash).
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_cached_embeddings(model_name, hashes):
+    """
+    {chunk_hash: float32 vector} for the hashes already in EmbeddingCache.
+    """
+    from .models import EmbeddingCache
+
+    rows = EmbeddingCache.objects.filter(model_name=model_name, chunk_hash__in=set(hashes)).values_list(
+        "chunk_hash", "embedding", "embedding_dtype"
+    )
+    return {h: embedding_from_bytes(blob, dtype) for h, blob, dtype in rows}
+
+
+def store_cached_embeddings(model_name, hashes, matrix):
+    """
+    Add freshly computed embeddings to EmbeddingCache (existing keys are left alone).
+    """
+    from .models import EmbeddingCache
+
+    dtype = embedding_dtype()
+    EmbeddingCache.objects.bulk_create(
+        [
+            EmbeddingCache(model_name=model_name, chunk_hash=h, embedding=blob, embedding_dtype=dtype.name)
+            for h, blob in zip(hashes, embeddings_to_bytes(matrix, dtype))
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def convert_stored_embeddings(batch_size=1000):
+    """
+    Rewrite PDFChunk and EmbeddingCache rows stored with another dtype into
+    the current PDF_EMBEDDING_DTYPE. Returns {model name: rows converted}.
+    """
+    from .models import EmbeddingCache, PDFChunk
+
+    dtype = embedding_dtype()
+    converted = {}
+    for model in (PDFChunk, EmbeddingCache):
+        stale = model.objects.filter(embedding__isnull=False).exclude(embedding_dtype=dtype.name)
+        count = 0
+        while True:
+            rows = list(stale.order_by("id").only("id", "embedding", "embedding_dtype")[:batch_size])
+            if not rows:
+                break
+            for row in rows:
+                vector = embedding_from_bytes(row.embedding, row.embedding_dtype)
+                row.embedding = vector.astype(dtype).tobytes()
+                row.embedding_dtype = dtype.name
+            model.objects.bulk_update(rows, ["embedding", "embedding_dtype"])
+            count += len(rows)
+        converted[model.__name__] = count
+    return converted
+
+
+def prune_embedding_cache(min_age=None):
+    """
+    Delete EmbeddingCache rows whose text no longer appears in any PDFChunk
+    (deleted or reprocessed documents). Rows younger than `min_age` seconds
+    (PDF_EMBEDDING_CACHE_MIN_AGE by default) are kept: processing caches a
+    batch's embeddings just before inserting its chunks.
+    Returns the number of rows deleted.
+    """
+    from .models import EmbeddingCache, PDFChunk
+
+    min_age = settings.PDF_EMBEDDING_CACHE_MIN_AGE if min_age is None else min_age
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    used = PDFChunk.objects.filter(content_hash=OuterRef("chunk_hash"))
+    deleted, _ = EmbeddingCache.objects.filter(created_at__lt=cutoff).exclude(Exists(used)).delete()
+    return deleted
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when no slot frees up in the model executor within the queue timeout.
+    """
+
+
+class ModelExecutor:
+    """
+    Bounded thread pool for blocking model calls made from async views.
+    At most `workers` calls run at once and `queue_size` more wait in the
+    pool's queue; beyond that, callers wait up to `queue_timeout` seconds for
+    a slot (without blocking the event loop) and then get ExecutorSaturated,
+    which the views turn into a 429.
+    """
+
+    def __init__(self, workers=8, queue_size=32, queue_timeout=5.0):
+        self.workers = max(int(workers), 1)
+        self.capacity = self.workers + max(int(queue_size), 0)
+        self.queue_timeout = max(float(queue_timeout), 0.0)
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model-executor")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def _try_acquire(self):
+        with self._lock:
+            if self._in_flight < self.capacity:
+                self._in_flight += 1
+                return True
+            return False
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    async def _acquire(self):
+        if self._try_acquire():
+            return
+        with self._lock:
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            delay = 0.005
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+                if self._try_acquire():
+                    return
+                delay = min(delay * 2, 0.05)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._rejected += 1
+        raise ExecutorSaturated(f"Model executor busy ({self.capacity} calls in flight)")
+
+    @staticmethod
+    def _call(fn, args, kwargs):
+        # Executor threads live outside the request cycle: drop stale DB connections like a request would
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs) on the pool, subject to admission control.
+        """
+        await self._acquire()
+        try:
+            future = self._pool.submit(self._call, fn, args, kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "queue_timeout": self.queue_timeout,
+            }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_model_executor():
+    """
+    Process-wide model executor configured from settings.
+    """
+    global _executor
+    if _executor is None:
+        from django.conf import settings
+
+        with _executor_lock:
+            if _executor is None:
+                _executor = ModelExecutor(
+                    workers=settings.PDF_MODEL_EXECUTOR_WORKERS,
+                    queue_size=settings.PDF_MODEL_EXECUTOR_QUEUE_SIZE,
+                    queue_timeout=settings.PDF_MODEL_EXECUTOR_QUEUE_TIMEOUT,
+                )
+    return _executor
@@ -0,0 +1,145 @@
+import os
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+import pdfplumber
+
+
+# Kept free of Django imports: page ranges are extracted in worker processes.
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """
+    Shared process pool, created on first use. Workers are spawned (not forked)
+    so they don't inherit the server's threads, models or DB connections.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _pypdf_reader(source):
+    """
+    PyPDF2 reader with its page count, or (None, 0) when PyPDF2 can't parse the file.
+    """
+    try:
+        reader = PyPDF2.PdfReader(source)
+        return reader, len(reader.pages)
+    except Exception as e:
+        print("PyPDF2 error:", e)
+        return None, 0
+
+
+def count_pages(source):
+    """
+    Number of pages (source is a path or a binary file object), from PyPDF2,
+    or pdfplumber when PyPDF2 can't open the file.
+    """
+    reader, page_count = _pypdf_reader(source)
+    if reader is not None:
+        return page_count
+    _rewind(source)
+    with pdfplumber.open(source) as pdf:
+        return len(pdf.pages)
+
+
+def iter_page_range(source, start, stop):
+    """
+    Yield pages [start, stop) as (page_number, text), page numbers 1-based.
+    PyPDF2 is tried first; only pages where it yields nothing go to pdfplumber
+    (every page, when PyPDF2 can't open the file).
+    """
+    reader, page_count = _pypdf_reader(source)
+    plumber = None
+    try:
+        if reader is None:
+            _rewind(source)
+            plumber = pdfplumber.open(source)
+            page_count = len(plumber.pages)
+
+        for i in range(start, min(stop, page_count)):
+            text = ""
+            if reader is not None:
+                try:
+                    text = reader.pages[i].extract_text() or ""
+                except Exception as e:
+                    print(f"PyPDF2 error on page {i + 1}:", e)
+
+            if not text.strip():
+                try:
+                    if plumber is None:
+                        _rewind(source)
+                        plumber = pdfplumber.open(source)
+                    text = plumber.pages[i].extract_text() or ""
+                except Exception as e:
+                    print(f"pdfplumber error on page {i + 1}:", e)
+
+            yield i + 1, text.strip()
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+
+def extract_page_range(source, start, stop):
+    """
+    List form of iter_page_range (what pool workers return).
+    """
+    return list(iter_page_range(source, start, stop))
+
+
+def page_ranges(page_count, pages_per_task):
+    step = max(pages_per_task, 1)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def iter_pages(source, workers=1, pages_per_task=25, page_count=None):
+    """
+    Yield every page of a PDF as (page_number, text), in page order.
+    When `source` is a filesystem path and the document spans more than one
+    page range, ranges are extracted on a process pool of `workers` processes
+    with at most 2 * workers ranges in flight, so memory stays bounded by
+    the window rather than the document. Otherwise extraction runs here.
+    """
+    if page_count is None:
+        page_count = count_pages(source)
+        _rewind(source)
+
+    ranges = page_ranges(page_count, pages_per_task)
+    if workers <= 1 or len(ranges) <= 1 or not isinstance(source, (str, os.PathLike)):
+        yield from iter_page_range(source, 0, page_count)
+        return
+
+    pool = _get_pool(workers)
+    path = os.fspath(source)
+    pending = deque()
+    ranges = iter(ranges)
+    try:
+        for start, stop in itertools.islice(ranges, 2 * workers):
+            pending.append(pool.submit(extract_page_range, path, start, stop))
+
+        while pending:
+            pages = pending.popleft().result()
+            for start, stop in itertools.islice(ranges, 1):
+                pending.append(pool.submit(extract_page_range, path, start, stop))
+            yield from pages
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,166 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# File responses for authorized downloads: conditional GETs (ETag /
+# Last-Modified -> 304), single byte ranges (206 / 416) and, when configured,
+# offloading the transfer to the front proxy (X-Accel-Redirect for nginx,
+# X-Sendfile for Apache/lighttpd) once Django has checked permissions.
+# Without offload, full responses go through FileResponse, which WSGI servers
+# send with wsgi.file_wrapper (sendfile) when the file is on local disk.
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_BLOCK_SIZE = 64 * 1024
+
+
+def _file_stat(file_field):
+    """
+    (size, mtime) of a stored file; mtime is None when the storage can't tell.
+    """
+    storage = file_field.storage
+    try:
+        stat = os.stat(file_field.path)
+        return stat.st_size, stat.st_mtime
+    except (NotImplementedError, OSError):
+        pass
+
+    size = storage.size(file_field.name)
+    try:
+        mtime = storage.get_modified_time(file_field.name).timestamp()
+    except (NotImplementedError, OSError):
+        mtime = None
+    return size, mtime
+
+
+def make_etag(size, mtime):
+    return f'"{size:x}-{int((mtime or 0) * 1_000_000):x}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" range into (start, stop) with stop exclusive.
+    Returns None when there is no usable range (serve the whole file) and
+    "unsatisfiable" when the range lies outside the file.
+    Multiple ranges are not supported and fall back to the whole file.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size
+
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if start >= size or stop <= start:
+        return "unsatisfiable"
+    return start, stop
+
+
+def _if_range_matches(request, etag, mtime):
+    """
+    If-Range: honour the Range header only if the client's copy is still current.
+    """
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and mtime is not None and int(mtime) <= since
+
+
+def _iter_range(file_obj, start, stop):
+    try:
+        file_obj.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            block = file_obj.read(min(_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        file_obj.close()
+
+
+def _offload_response(file_field):
+    mode = settings.PDF_FILE_OFFLOAD
+    if mode == "x-accel":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = settings.PDF_X_ACCEL_PREFIX.rstrip("/") + "/" + quote(file_field.name)
+        return response
+    if mode == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = file_field.path
+        return response
+    return None
+
+
+def serve_file(request, file_field, content_type, filename):
+    """
+    Response for an already authorized download of `file_field`.
+    """
+    size, mtime = _file_stat(file_field)
+    etag = make_etag(size, mtime)
+
+    def _headers(response):
+        response["ETag"] = etag
+        if mtime is not None:
+            response["Last-Modified"] = http_date(mtime)
+        response["Accept-Ranges"] = "bytes"
+        # Revalidate every time: the response is per-user and authorization may change
+        response["Cache-Control"] = "private, no-cache"
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+        return response
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(mtime) if mtime is not None else None
+    )
+    if not_modified is not None:
+        return _headers(not_modified)
+
+    # The proxy handles ranges and conditional requests itself for offloaded files
+    response = _offload_response(file_field)
+    if response is not None:
+        response["Content-Type"] = content_type
+        return _headers(response)
+
+    byte_range = None
+    if _if_range_matches(request, etag, mtime):
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _headers(response)
+
+    if byte_range is None:
+        response = FileResponse(file_field.open("rb"), content_type=content_type)
+        return _headers(response)
+
+    start, stop = byte_range
+    if request.method == "HEAD":
+        response = HttpResponse(status=206, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            _iter_range(file_field.open("rb"), start, stop), status=206, content_type=content_type
+        )
+    response["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    response["Content-Length"] = str(stop - start)
+    return _headers(response)
@@ -0,0 +1,224 @@
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .model_registry import get_llm
+from .metrics import GENERATED_TOKENS, span
+
+
+MAX_NEW_TOKENS = 200
+
+
+def generate_batch(prompts, max_new_tokens=MAX_NEW_TOKENS):
+    """
+    Generate answers for several prompts in one padded forward pass.
+    """
+    tokenizer, llm_model, device = get_llm()
+    with span("tokenize"):
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True).to(device)
+    with span("model_generate"):
+        outputs = llm_model.generate(**inputs, max_new_tokens=max_new_tokens)
+    # Output rows start with the decoder start token and are padded to the longest answer
+    if tokenizer.pad_token_id is not None:
+        GENERATED_TOKENS.inc(int((outputs[:, 1:] != tokenizer.pad_token_id).sum()))
+    else:
+        GENERATED_TOKENS.inc(int(outputs[:, 1:].numel()))
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+class GenerationBatcher:
+    """
+    Collects prompts submitted concurrently (from request threads) for up to
+    max_wait_ms and runs them through generate() as one batch of at most
+    max_batch_size. Each caller blocks only on its own result.
+    """
+
+    def __init__(self, max_batch_size=8, max_wait_ms=10, max_new_tokens=MAX_NEW_TOKENS):
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.max_new_tokens = max_new_tokens
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, prompt):
+        """
+        Queue a prompt; returns a Future resolving to the answer text.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((prompt, future))
+        return future
+
+    def generate(self, prompt, timeout=None):
+        return self.submit(prompt).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Skip callers that already gave up
+            batch = [(p, f) for p, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+
+            try:
+                answers = generate_batch([p for p, _ in batch], self.max_new_tokens)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), answer in zip(batch, answers):
+                future.set_result(answer)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": sum(self._batch_sizes.values()),
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    Process-wide generation batcher configured from settings.
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = GenerationBatcher(
+                    max_batch_size=settings.PDF_GENERATION_MAX_BATCH_SIZE,
+                    max_wait_ms=settings.PDF_GENERATION_MAX_WAIT_MS,
+                )
+    return _batcher
+
+
+def generate_answer(prompt, max_new_tokens=MAX_NEW_TOKENS):
+    """
+    Blocking generation of the full answer for one prompt.
+    Goes through the shared batcher so concurrent requests are batched together.
+    """
+    if max_new_tokens != MAX_NEW_TOKENS:
+        return generate_batch([prompt], max_new_tokens)[0]
+    return get_batcher().generate(prompt)
+
+
+def sse_event(event, data):
+    """
+    Format one server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_answer_events(prompt, cancelled, max_new_tokens=MAX_NEW_TOKENS, on_complete=None):
+    """
+    Yield SSE events ("token" per decoded piece, then "done") while the model generates.
+    Generation runs in a helper thread and stops as soon as `cancelled` is set,
+    which happens when this generator is closed (client went away).
+    `on_complete(answer)` is called with the full text if the stream finished.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+    class StopWhenCancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            # Called once per generated token
+            GENERATED_TOKENS.inc(input_ids.shape[0])
+            return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    tokenizer, llm_model, device = get_llm()
+    inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    def _generate():
+        try:
+            llm_model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([StopWhenCancelled()]),
+            )
+        except Exception as e:
+            print("Streaming generation error:", e)
+            streamer.end()
+
+    thread = threading.Thread(target=_generate, daemon=True)
+    thread.start()
+
+    pieces = []
+    try:
+        for text in streamer:
+            if cancelled.is_set():
+                break
+            if text:
+                pieces.append(text)
+                yield sse_event("token", {"text": text})
+        if not cancelled.is_set() and on_complete is not None:
+            on_complete("".join(pieces))
+        yield sse_event("done", {})
+    finally:
+        cancelled.set()
+
+
+async def astream_answer_events(prompt, max_new_tokens=MAX_NEW_TOKENS, on_complete=None):
+    """
+    Async wrapper for ASGI: each blocking step runs in a thread so the event loop
+    stays free, and a client disconnect (task cancellation) stops generation.
+    """
+    cancelled = threading.Event()
+    events = stream_answer_events(prompt, cancelled, max_new_tokens, on_complete)
+    next_event = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            event = await next_event(events, None)
+            if event is None:
+                break
+            yield event
+    finally:
+        cancelled.set()
@@ -0,0 +1,312 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .models import PDF, PDFChunk
+from .embeddings import embeddings_matrix
+from .bm25 import BM25Index, build_bm25
+from . import retrieval
+
+
+# Loaded indexes are kept per process, keyed by file path and validated
+# against the file's mtime so a rebuilt index is picked up automatically.
+_MAX_CACHED_INDEXES = 32
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_get(path, mtime):
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            _cache.move_to_end(path)
+            return cached[1]
+    return None
+
+
+def _cache_put(path, mtime, index):
+    with _cache_lock:
+        _cache[path] = (mtime, index)
+        _cache.move_to_end(path)
+        while len(_cache) > _MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+
+
+def _file_path(pdf_obj):
+    if not pdf_obj.file:
+        return None
+    try:
+        return pdf_obj.file.path
+    except NotImplementedError:
+        return None
+
+
+def index_format():
+    """
+    Metric and index type of the persisted vector index, part of its file
+    name so a change of either (or an index from before normalized
+    inner-product search) is never loaded; it is rebuilt instead.
+    """
+    return f"{retrieval.METRIC}-{settings.PDF_INDEX_TYPE}"
+
+
+def index_path(pdf_obj):
+    """
+    Location of the persisted FAISS index for a PDF: next to the media file.
+    Returns None when the storage backend has no local path.
+    """
+    path = _file_path(pdf_obj)
+    return None if path is None else f"{path}.{index_format()}.faiss"
+
+
+def _index_params():
+    return {
+        "hnsw_m": settings.PDF_INDEX_HNSW_M,
+        "hnsw_ef_construction": settings.PDF_INDEX_HNSW_EF_CONSTRUCTION,
+    }
+
+
+def build_index(embeddings, ids):
+    """
+    Build the configured index type (PDF_INDEX_TYPE) over `embeddings`
+    (n x dim) whose search results are the given ids (PDFChunk.order values).
+    """
+    return retrieval.build_index(embeddings, ids, settings.PDF_INDEX_TYPE, **_index_params())
+
+
+def extend_index(index, embeddings, ids):
+    """
+    Add a batch to an index being built incrementally (creates it on the first batch).
+    Incremental builds are flat; finish_index() converts the complete index.
+    """
+    if index is None:
+        return retrieval.build_index(embeddings, ids, "flat")
+    retrieval.add_vectors(index, embeddings, ids)
+    return index
+
+
+def finish_index(index):
+    """
+    Convert an incrementally built index to the configured type.
+    """
+    return retrieval.convert_index(index, settings.PDF_INDEX_TYPE, **_index_params())
+
+
+def _vector_index_paths(pdf_obj):
+    """
+    Paths a vector index of this PDF may have, in every format including ones from older versions.
+    """
+    path = _file_path(pdf_obj)
+    if path is None:
+        return []
+    formats = [f"{retrieval.METRIC}-{kind}." for kind in retrieval.INDEX_KINDS] + [""]  # "" = before formats
+    return [f"{path}.{fmt}faiss" for fmt in formats]
+
+
+def _remove_files(paths):
+    for p in paths:
+        with _cache_lock:
+            _cache.pop(p, None)
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def save_index(pdf_obj, index):
+    """
+    Write the index atomically next to the PDF file, replacing the previous
+    one (indexes in other formats are removed).
+    """
+    path = index_path(pdf_obj)
+    if path is None:
+        return None
+
+    tmp_path = f"{path}.tmp"
+    retrieval.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+    with _cache_lock:
+        _cache.pop(path, None)
+    _remove_files([p for p in _vector_index_paths(pdf_obj) if p != path])
+    return path
+
+
+def invalidate_index(pdf_obj):
+    """
+    Drop the persisted vector and lexical indexes (and any cached copies),
+    e.g. when a PDF's chunks are gone.
+    """
+    if _file_path(pdf_obj) is None:
+        return
+    _remove_files(_vector_index_paths(pdf_obj) + [lexical_index_path(pdf_obj)])
+
+
+def _persist_rebuilt(pdf_obj):
+    """
+    Whether an index rebuilt from the DB may be saved. Not while the PDF is
+    being (re)processed: its chunk rows are then a mix of old and new ones,
+    and processing saves the complete index when it finishes.
+    """
+    return not PDF.objects.filter(id=pdf_obj.id, processing_status=PDF.PROCESSING_RUNNING).exists()
+
+
+def _chunk_embeddings(pdf_obj):
+    """
+    Read the stored chunk embeddings as one (n x dim) matrix plus their orders.
+    """
+    rows = list(
+        PDFChunk.objects.filter(pdf=pdf_obj, embedding__isnull=False)
+        .order_by("order")
+        .values_list("order", "embedding", "embedding_dtype")
+    )
+    if not rows:
+        return None, None
+
+    ids = [order for order, _, _ in rows]
+    return embeddings_matrix([emb for _, emb, _ in rows], [dtype for _, _, dtype in rows]), ids
+
+
+def rebuild_index(pdf_obj):
+    """
+    Build the index from the stored chunk embeddings and persist it (unless
+    the PDF is being processed). Returns None if the PDF has no valid embeddings.
+    """
+    embeddings, ids = _chunk_embeddings(pdf_obj)
+    if embeddings is None:
+        return None
+
+    index = build_index(embeddings, ids)
+    if _persist_rebuilt(pdf_obj):
+        save_index(pdf_obj, index)
+    return index
+
+
+def load_index(pdf_obj):
+    """
+    Return the FAISS index for a PDF.
+    Uses the memory-mapped file on disk when present, otherwise builds it
+    from the DB once and persists it for the next request.
+    """
+    path = index_path(pdf_obj)
+    if path is None:
+        return rebuild_index(pdf_obj)
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    if mtime is not None:
+        cached = _cache_get(path, mtime)
+        if cached is not None:
+            return cached
+
+        try:
+            index = retrieval.read_index(path, mmap=True)
+        except Exception as e:
+            print("FAISS index load error:", e)
+            index = None
+    else:
+        index = None
+
+    if index is None:
+        index = rebuild_index(pdf_obj)
+        if index is None:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return index
+
+    _cache_put(path, mtime, index)
+    return index
+
+
+def lexical_index_path(pdf_obj):
+    """
+    Location of the persisted BM25 index (numpy arrays in an .npz) for a PDF.
+    """
+    path = _file_path(pdf_obj)
+    return None if path is None else f"{path}.bm25.npz"
+
+
+def save_lexical_index(pdf_obj, bm25):
+    """
+    Write the BM25 arrays atomically next to the PDF file.
+    """
+    path = lexical_index_path(pdf_obj)
+    if path is None:
+        return None
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **bm25.to_arrays())
+    os.replace(tmp_path, path)
+
+    with _cache_lock:
+        _cache.pop(path, None)
+    return path
+
+
+def rebuild_lexical_index(pdf_obj):
+    """
+    Build the BM25 index from the stored chunk texts and persist it (unless
+    the PDF is being processed). Returns None if the PDF has no chunks.
+    """
+    chunks = PDFChunk.objects.filter(pdf=pdf_obj).order_by("order").values_list("order", "chunk_text")
+    bm25 = build_bm25(chunks.iterator(chunk_size=1000), k1=settings.PDF_BM25_K1, b=settings.PDF_BM25_B)
+    if not bm25.size:
+        return None
+    if _persist_rebuilt(pdf_obj):
+        save_lexical_index(pdf_obj, bm25)
+    return bm25
+
+
+def load_lexical_index(pdf_obj):
+    """
+    Return the BM25 index for a PDF, from disk when present (cached per
+    process like the FAISS index), otherwise rebuilt from the DB.
+    """
+    path = lexical_index_path(pdf_obj)
+    if path is None:
+        return rebuild_lexical_index(pdf_obj)
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    bm25 = None
+    if mtime is not None:
+        bm25 = _cache_get(path, mtime)
+        if bm25 is not None:
+            return bm25
+        try:
+            with np.load(path) as arrays:
+                bm25 = BM25Index.from_arrays(arrays, k1=settings.PDF_BM25_K1, b=settings.PDF_BM25_B)
+        except Exception as e:
+            print("BM25 index load error:", e)
+
+    if bm25 is None:
+        bm25 = rebuild_lexical_index(pdf_obj)
+        if bm25 is None:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return bm25
+
+    _cache_put(path, mtime, bm25)
+    return bm25
+
+
+def search_index(index, query_vec, top_k=5):
+    """
+    Return (chunk orders, cosine scores) of the top_k most similar chunks, most similar first.
+    """
+    return retrieval.search(
+        index, query_vec, top_k, nprobe=settings.PDF_INDEX_IVF_NPROBE, ef_search=settings.PDF_INDEX_HNSW_EF_SEARCH
+    )[0]
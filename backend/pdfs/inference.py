@@ -0,0 +1,140 @@
+import os
+import shutil
+
+import numpy as np
+
+
+# ONNX Runtime backend for the embedding and answer models (PDF_INFERENCE_BACKEND=onnx).
+# Models are exported once with optimum into PDF_ONNX_MODEL_DIR, optionally
+# int8-quantized (dynamic, weights only), and run on CPU with a fixed number
+# of intra-op threads. Kept free of Django imports so the benchmark script can
+# use it directly; model_registry passes the settings in.
+
+EMBED_TASK = "feature-extraction"
+LLM_TASK = "text2text-generation-with-past"
+EMBED_MAX_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length
+
+
+def onnx_model_dir(base_dir, model_name, quantize):
+    return os.path.join(base_dir, model_name.replace("/", "--"), "int8" if quantize else "fp32")
+
+
+def session_options(threads):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = max(int(threads), 1)
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def quantize_dir(path):
+    """
+    Replace every .onnx graph in `path` with an int8 dynamically quantized copy.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".onnx"):
+            continue
+        src = os.path.join(path, name)
+        tmp = f"{src}.int8"
+        quantize_dynamic(src, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, src)
+
+
+def export_model(model_name, output_dir, task, quantize=False):
+    """
+    Export a Hugging Face model (and its tokenizer) to ONNX in output_dir.
+    The export is written to a temporary directory and moved into place,
+    so a half-written export is never picked up.
+    """
+    from optimum.exporters.onnx import main_export
+    from transformers import AutoTokenizer
+
+    tmp_dir = f"{output_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    main_export(model_name, output=tmp_dir, task=task)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+    if quantize:
+        quantize_dir(tmp_dir)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    os.replace(tmp_dir, output_dir)
+    return output_dir
+
+
+def ensure_exported(base_dir, model_name, task, quantize=False):
+    """
+    Directory of the exported model, exporting it first if needed.
+    """
+    path = onnx_model_dir(base_dir, model_name, quantize)
+    if not os.path.isdir(path):
+        print(f"Exporting {model_name} to ONNX{' (int8)' if quantize else ''} in {path}")
+        export_model(model_name, path, task, quantize)
+    return path
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode() for all-MiniLM-L6-v2 style models:
+    transformer -> mean pooling over the attention mask -> L2 normalization.
+    """
+
+    def __init__(self, model_dir, threads=1, max_length=EMBED_MAX_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), session_options(threads), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        out = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(
+                list(sentences[start:start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype("int64") for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = encoded["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype("float32"))
+
+        embeddings = np.concatenate(out) if out else np.zeros((0, 0), dtype="float32")
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_embedder(base_dir, model_name, quantize=False, threads=1):
+    return OnnxEmbedder(ensure_exported(base_dir, model_name, EMBED_TASK, quantize), threads)
+
+
+def load_onnx_llm(base_dir, model_name, quantize=False, threads=1):
+    """
+    (tokenizer, model, device) like model_registry.get_llm(); the optimum
+    model supports generate() with streamers and stopping criteria.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+
+    path = ensure_exported(base_dir, model_name, LLM_TASK, quantize)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        path, session_options=session_options(threads), provider="CPUExecutionProvider", use_cache=True
+    )
+    return tokenizer, model, "cpu"
@@ -0,0 +1,246 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PDF, ProcessingJob
+
+
+def enqueue_processing(pdf_obj):
+    """
+    Queue a PDF for background processing.
+    Reuses an existing queued/running job so double submits don't process twice.
+    """
+    with transaction.atomic():
+        job = (
+            ProcessingJob.objects.select_for_update()
+            .filter(pdf=pdf_obj, status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING])
+            .first()
+        )
+        if job is None:
+            job = ProcessingJob.objects.create(pdf=pdf_obj, max_attempts=settings.PDF_JOB_MAX_ATTEMPTS)
+
+        PDF.objects.filter(id=pdf_obj.id).update(
+            processing_status=PDF.PROCESSING_PENDING,
+            processing_error=None,
+        )
+    return job
+
+
+def has_active_job(pdf_obj):
+    """
+    Whether a queued or running job will (re)process this PDF's content,
+    through the PDF itself or a duplicate upload sharing it.
+    """
+    return ProcessingJob.objects.filter(
+        Q(pdf=pdf_obj) | Q(pdf__content_source=pdf_obj),
+        status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING],
+    ).exists()
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff in seconds after `attempts` failed tries.
+    """
+    return settings.PDF_JOB_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically take the oldest runnable job, or return None.
+    Uses SKIP LOCKED so several workers (threads or processes) never claim the same job.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ProcessingJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ProcessingJob.STATUS_QUEUED, run_after__lte=now)
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = ProcessingJob.STATUS_RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.save(update_fields=["status", "attempts", "locked_by", "locked_at", "updated_at"])
+    return job
+
+
+def recover_stale_jobs(stale_after=None):
+    """
+    Requeue jobs left running by a worker that died (e.g. on restart): running
+    workers refresh locked_at while they process (see _heartbeat), so a job
+    whose lock is older than `stale_after` seconds has no live worker.
+    Returns the number of recovered jobs.
+    """
+    stale_after = settings.PDF_JOB_STALE_AFTER if stale_after is None else stale_after
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+
+    recovered = 0
+    with transaction.atomic():
+        stale = ProcessingJob.objects.select_for_update(skip_locked=True).filter(
+            status=ProcessingJob.STATUS_RUNNING, locked_at__lt=cutoff
+        )
+        for job in stale:
+            _finish_failed_attempt(job, "Worker stopped while processing")
+            recovered += 1
+    return recovered
+
+
+def _processed_pdf_id(job):
+    """
+    Id of the PDF whose status a job updates: the copy holding the content,
+    which is what process_pdf_obj processes for a duplicate upload.
+    """
+    source_id = PDF.objects.filter(id=job.pdf_id).values_list("content_source_id", flat=True).first()
+    return source_id or job.pdf_id
+
+
+def _finish_failed_attempt(job, error, retry=True):
+    """
+    Either schedule another attempt with backoff or mark the job and PDF failed.
+    """
+    job.last_error = error
+    job.locked_by = None
+    job.locked_at = None
+
+    if retry and job.attempts < job.max_attempts:
+        job.status = ProcessingJob.STATUS_QUEUED
+        job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        job.save()
+        PDF.objects.filter(id=_processed_pdf_id(job)).update(
+            processing_status=PDF.PROCESSING_PENDING,
+            processing_error=f"Retrying after error: {error}",
+        )
+    else:
+        job.status = ProcessingJob.STATUS_FAILED
+        job.save()
+        PDF.objects.filter(id=_processed_pdf_id(job)).update(
+            processing_status=PDF.PROCESSING_FAILED,
+            processing_error=error,
+        )
+
+
+def _heartbeat(job):
+    """
+    Callback for process_pdf_obj that refreshes the job's locked_at at most
+    every PDF_JOB_HEARTBEAT_INTERVAL seconds, so long jobs aren't taken for stale.
+    """
+    last = time.monotonic()
+
+    def beat():
+        nonlocal last
+        now = time.monotonic()
+        if now - last < settings.PDF_JOB_HEARTBEAT_INTERVAL:
+            return
+        last = now
+        alive = ProcessingJob.objects.filter(
+            id=job.id, status=ProcessingJob.STATUS_RUNNING, locked_by=job.locked_by
+        ).update(locked_at=timezone.now())
+        if not alive:
+            print(f"[{job.locked_by}] job {job.id} is no longer locked by this worker")
+
+    return beat
+
+
+def run_job(job):
+    """
+    Process one claimed job and record the outcome on both the job and the PDF.
+    """
+    from .views import process_pdf_obj
+
+    try:
+        pdf_obj = PDF.objects.get(id=_processed_pdf_id(job))
+    except PDF.DoesNotExist:
+        job.status = ProcessingJob.STATUS_FAILED
+        job.last_error = "PDF no longer exists"
+        job.save()
+        return False
+
+    pdf_obj.processing_status = PDF.PROCESSING_RUNNING
+    pdf_obj.processing_error = None
+    pdf_obj.save(update_fields=["processing_status", "processing_error"])
+
+    try:
+        success, payload = process_pdf_obj(pdf_obj, heartbeat=_heartbeat(job))
+    except Exception as e:
+        success, payload = False, {"error": str(e), "status": 500}
+
+    if not success:
+        # 4xx means the PDF itself is unusable (e.g. no text) - retrying won't help
+        retry = payload.get("status", 500) >= 500
+        _finish_failed_attempt(job, payload.get("error") or "Processing failed", retry=retry)
+        return False
+
+    pdf_obj.processing_status = PDF.PROCESSING_DONE
+    pdf_obj.processing_error = None
+    pdf_obj.processed_at = timezone.now()
+    pdf_obj.save(update_fields=["processing_status", "processing_error", "processed_at"])
+
+    job.status = ProcessingJob.STATUS_DONE
+    job.last_error = None
+    job.locked_by = None
+    job.locked_at = None
+    job.save()
+    return True
+
+
+def default_worker_id(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def worker_loop(worker_id, stop_event, poll_interval=2.0):
+    """
+    Claim and run jobs until stop_event is set. Sleeps poll_interval when the queue is empty.
+    """
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job(worker_id)
+        except Exception as e:
+            print(f"[{worker_id}] claim error:", e)
+            job = None
+
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        print(f"[{worker_id}] processing PDF {job.pdf_id} (job {job.id}, attempt {job.attempts})")
+        try:
+            ok = run_job(job)
+            print(f"[{worker_id}] job {job.id} {'done' if ok else 'failed'}")
+        except Exception as e:
+            print(f"[{worker_id}] job {job.id} crashed:", e)
+            try:
+                _finish_failed_attempt(job, str(e))
+            except Exception:
+                pass
+
+    connection.close()
+
+
+def start_workers(count, poll_interval=2.0):
+    """
+    Start `count` worker threads sharing this process's models.
+    Returns (threads, stop_event).
+    """
+    stop_event = threading.Event()
+    threads = []
+    for i in range(count):
+        t = threading.Thread(
+            target=worker_loop,
+            args=(default_worker_id(i), stop_event, poll_interval),
+            name=f"pdf-worker-{i}",
+        )
+        t.start()
+        threads.append(t)
+    return threads, stop_event
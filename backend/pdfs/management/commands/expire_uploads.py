@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdfs.uploads import expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Abort resumable uploads that stopped receiving parts and delete their part files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl", type=int, default=settings.PDF_UPLOAD_SESSION_TTL,
+            help="Abort sessions idle for this many seconds (default: PDF_UPLOAD_SESSION_TTL).",
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_stale_uploads(options["ttl"])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} upload session(s)"))
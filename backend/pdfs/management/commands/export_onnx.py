@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdfs.inference import EMBED_TASK, LLM_TASK, export_model, onnx_model_dir
+from pdfs.model_registry import EMBED_MODEL_NAME, LLM_MODEL_NAME
+
+
+class Command(BaseCommand):
+    help = "Export the embedding and answer models to ONNX for PDF_INFERENCE_BACKEND=onnx."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quantize", action="store_true", default=settings.PDF_ONNX_QUANTIZE,
+            help="Apply int8 dynamic quantization (default: PDF_ONNX_QUANTIZE).",
+        )
+        parser.add_argument(
+            "--output-dir", default=settings.PDF_ONNX_MODEL_DIR,
+            help="Where exported models are written (default: PDF_ONNX_MODEL_DIR).",
+        )
+
+    def handle(self, *args, **options):
+        for model_name, task in ((EMBED_MODEL_NAME, EMBED_TASK), (LLM_MODEL_NAME, LLM_TASK)):
+            path = onnx_model_dir(options["output_dir"], model_name, options["quantize"])
+            self.stdout.write(f"Exporting {model_name} -> {path}")
+            export_model(model_name, path, task, options["quantize"])
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdfs.embeddings import prune_embedding_cache
+
+
+class Command(BaseCommand):
+    help = "Delete cached embeddings of text that no longer appears in any PDF chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age", type=int, default=settings.PDF_EMBEDDING_CACHE_MIN_AGE,
+            help="Keep rows younger than this many seconds (default: PDF_EMBEDDING_CACHE_MIN_AGE).",
+        )
+
+    def handle(self, *args, **options):
+        pruned = prune_embedding_cache(options["min_age"])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} cached embedding(s)"))
@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Exists, OuterRef
+from django.utils.dateparse import parse_date, parse_datetime
+
+from pdfs.embeddings import convert_stored_embeddings, embedding_dtype
+from pdfs.models import PDF, PDFChunk
+from pdfs.reindex import Checkpoint, init_worker, reindex_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprocess PDFs (extract, chunk, embed, index) in parallel worker processes. "
+        "Progress is checkpointed; rerun the same command to resume an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.PDF_WORKER_CONCURRENCY,
+            help="Worker processes; each loads its own models (default: PDF_WORKER_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--status", action="append", choices=[c for c, _ in PDF.PROCESSING_STATUS_CHOICES],
+            help="Only PDFs with this processing status (repeatable).",
+        )
+        parser.add_argument("--user", action="append", help="Only PDFs of this username or user id (repeatable).")
+        parser.add_argument("--since", help="Only PDFs uploaded at or after this date/datetime (ISO 8601).")
+        parser.add_argument("--until", help="Only PDFs uploaded before this date/datetime (ISO 8601).")
+        parser.add_argument("--id", type=int, action="append", dest="ids", help="Only this PDF id (repeatable).")
+        parser.add_argument(
+            "--missing-only", action="store_true",
+            help="Only PDFs without embedded chunks (what generate_chunks.py used to fill in).",
+        )
+        parser.add_argument("--limit", type=int, help="Process at most this many PDFs.")
+        parser.add_argument(
+            "--batch-chunks", type=int, default=settings.PDF_PIPELINE_BATCH_CHUNKS,
+            help="Chunks embedded and inserted per step (default: PDF_PIPELINE_BATCH_CHUNKS).",
+        )
+        parser.add_argument(
+            "--embed-batch-size", type=int, default=settings.PDF_EMBED_BATCH_SIZE,
+            help="Embedding model batch size (default: PDF_EMBED_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--threads", type=int, default=None,
+            help="Torch threads per worker (default: CPU count / workers).",
+        )
+        parser.add_argument(
+            "--checkpoint", default=os.path.join(settings.BASE_DIR, "reindex_pdfs.checkpoint.json"),
+            help="Checkpoint file of finished PDFs.",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+        parser.add_argument("--retry-failed", action="store_true", help="Also retry PDFs that failed in the checkpointed run.")
+        parser.add_argument("--dry-run", action="store_true", help="Only list what would be reindexed.")
+        parser.add_argument(
+            "--convert-embeddings", action="store_true",
+            help="Rewrite all stored embeddings (chunks and embedding cache) in the current "
+                 "PDF_EMBEDDING_DTYPE instead of reprocessing; no re-embedding needed.",
+        )
+
+    def _parse_when(self, value, option):
+        if value is None:
+            return None
+        when = parse_datetime(value) or parse_date(value)
+        if when is None:
+            raise CommandError(f"{option}: not a date or datetime: {value}")
+        return when
+
+    def _select(self, options):
+        """
+        Ids of the canonical PDFs to reprocess: documents sharing content
+        with another one are reindexed through the PDF that holds it.
+        """
+        pdfs = PDF.objects.all()
+        if options["status"]:
+            pdfs = pdfs.filter(processing_status__in=options["status"])
+        if options["user"]:
+            ids = [u for u in options["user"] if u.isdigit()]
+            names = [u for u in options["user"] if not u.isdigit()]
+            pdfs = pdfs.filter(user_id__in=ids) | pdfs.filter(user__username__in=names)
+        since = self._parse_when(options["since"], "--since")
+        if since is not None:
+            pdfs = pdfs.filter(uploaded_at__gte=since)
+        until = self._parse_when(options["until"], "--until")
+        if until is not None:
+            pdfs = pdfs.filter(uploaded_at__lt=until)
+        if options["ids"]:
+            pdfs = pdfs.filter(id__in=options["ids"])
+
+        owner_ids = {source_id or pdf_id for pdf_id, source_id in pdfs.values_list("id", "content_source_id")}
+        owners = PDF.objects.filter(id__in=owner_ids)
+        if options["missing_only"]:
+            embedded = PDFChunk.objects.filter(pdf=OuterRef("pk"), embedding__isnull=False)
+            owners = owners.filter(~Exists(embedded))
+
+        ids = list(owners.order_by("id").values_list("id", flat=True))
+        return ids[: options["limit"]] if options["limit"] else ids
+
+    def handle(self, *args, **options):
+        if options["convert_embeddings"]:
+            converted = convert_stored_embeddings()
+            self.stdout.write(self.style.SUCCESS(
+                f"Converted {converted['PDFChunk']} chunk and {converted['EmbeddingCache']} cached "
+                f"embedding(s) to {embedding_dtype().name}"
+            ))
+            return
+
+        workers = max(options["workers"], 1)
+        selection = {
+            key: options[key]
+            for key in ("status", "user", "since", "until", "ids", "missing_only", "limit")
+        }
+        ids = self._select(options)
+
+        checkpoint = Checkpoint(options["checkpoint"], selection)
+        if options["restart"]:
+            checkpoint.remove()
+        try:
+            if checkpoint.load():
+                self.stdout.write(
+                    f"Resuming from {checkpoint.path}: {len(checkpoint.done)} done, {len(checkpoint.failed)} failed"
+                )
+        except ValueError as e:
+            raise CommandError(f"{e}; use --restart to start over")
+
+        skip = checkpoint.done if options["retry_failed"] else checkpoint.done | set(checkpoint.failed)
+        todo = [pdf_id for pdf_id in ids if pdf_id not in skip]
+        self.stdout.write(f"{len(todo)} PDF(s) to reindex ({len(ids) - len(todo)} already handled)")
+        if options["dry_run"] or not todo:
+            for pdf_id in todo:
+                self.stdout.write(f"  {pdf_id}")
+            return
+
+        overrides = {
+            "PDF_PIPELINE_BATCH_CHUNKS": options["batch_chunks"],
+            "PDF_EMBED_BATCH_SIZE": options["embed_batch_size"],
+            # Parallelism comes from the document pool; no nested page pools
+            "PDF_EXTRACT_WORKERS": 1,
+        }
+        threads = options["threads"] or max((os.cpu_count() or 1) // workers, 1)
+
+        # Spawned workers open their own DB connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(overrides, threads),
+        )
+
+        started = time.perf_counter()
+        totals = {"done": 0, "failed": 0, "pages": 0, "chunks": 0}
+        pending = set()
+        queue = iter(todo)
+        try:
+            while True:
+                # Keep a couple of documents per worker in flight, not the whole list
+                while len(pending) < workers * 2:
+                    pdf_id = next(queue, None)
+                    if pdf_id is None:
+                        break
+                    pending.add(pool.submit(reindex_document, pdf_id))
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pdf_id, success, payload = future.result()
+                    checkpoint.record(pdf_id, success, payload.get("error"))
+                    self._report(pdf_id, success, payload, totals, started, len(todo))
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise CommandError(
+                f"Interrupted after {totals['done'] + totals['failed']} PDF(s); rerun the same command to resume"
+            )
+        pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reindexed {totals['done']} PDF(s), {totals['failed']} failed: "
+            f"{totals['pages']} pages, {totals['chunks']} chunks in {elapsed:.1f}s "
+            f"({totals['pages'] / elapsed:.1f} pages/s, {totals['chunks'] / elapsed:.1f} chunks/s)"
+        ))
+        if not totals["failed"]:
+            checkpoint.remove()
+        else:
+            self.stdout.write(f"Failed PDFs are kept in {checkpoint.path}; rerun with --retry-failed to retry them")
+
+    def _report(self, pdf_id, success, payload, totals, started, total):
+        elapsed = time.perf_counter() - started
+        if success:
+            totals["done"] += 1
+            totals["pages"] += payload["pages"]
+            totals["chunks"] += payload["chunks_created"]
+            line = (
+                f"PDF {pdf_id}: {payload['pages']} pages, {payload['chunks_created']} chunks "
+                f"({payload['embeddings_computed']} embedded) in {payload['seconds']:.1f}s"
+            )
+        else:
+            totals["failed"] += 1
+            line = self.style.ERROR(f"PDF {pdf_id}: {payload.get('error')}")
+        count = totals["done"] + totals["failed"]
+        self.stdout.write(
+            f"[{count}/{total}] {line} | {totals['pages'] / elapsed:.1f} pages/s, {totals['chunks'] / elapsed:.1f} chunks/s"
+        )
@@ -0,0 +1,79 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pdfs.embeddings import prune_embedding_cache
+from pdfs.jobs import recover_stale_jobs, start_workers
+from pdfs.uploads import expire_stale_uploads
+
+# Seconds between sweeps for abandoned upload sessions and unused cached embeddings
+UPLOAD_EXPIRY_INTERVAL = 600
+
+
+class Command(BaseCommand):
+    help = "Run background PDF processing workers that consume the ProcessingJob queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.PDF_WORKER_CONCURRENCY,
+            help="Number of concurrent worker threads (default: PDF_WORKER_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument(
+            "--stale-after", type=int, default=settings.PDF_JOB_STALE_AFTER,
+            help="Requeue running jobs without a heartbeat for this many seconds on startup.",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+
+        recovered = recover_stale_jobs(options["stale_after"])
+        if recovered:
+            self.stdout.write(f"Recovered {recovered} stale job(s)")
+
+        threads, stop_event = start_workers(workers, options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Started {workers} PDF worker(s)"))
+
+        def _stop(signum, frame):
+            self.stdout.write("Stopping workers after current jobs...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+        next_expiry = 0.0
+        while any(t.is_alive() for t in threads):
+            if time.monotonic() >= next_expiry and not stop_event.is_set():
+                next_expiry = time.monotonic() + UPLOAD_EXPIRY_INTERVAL
+                self._expire_uploads()
+                self._prune_embedding_cache()
+            for t in threads:
+                t.join(timeout=1.0)
+
+        self.stdout.write("Workers stopped")
+
+    def _expire_uploads(self):
+        close_old_connections()
+        try:
+            expired = expire_stale_uploads()
+        except Exception as e:
+            self.stdout.write(f"Upload expiry failed: {e}")
+            return
+        if expired:
+            self.stdout.write(f"Expired {expired} abandoned upload session(s)")
+
+    def _prune_embedding_cache(self):
+        close_old_connections()
+        try:
+            pruned = prune_embedding_cache()
+        except Exception as e:
+            self.stdout.write(f"Embedding cache pruning failed: {e}")
+            return
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} unused cached embedding(s)")
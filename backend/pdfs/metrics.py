@@ -0,0 +1,327 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+
+from django.http import Http404
+
+
+# In-process metrics in the Prometheus text format (served at /metrics).
+# Hot paths only touch counters and histograms: one lock, a bisect and a few
+# additions per observation. Numbers owned by other components (cache
+# counters, batcher and executor queues, the job table) are read by
+# collectors at scrape time, so they cost nothing per request.
+# Like the other stats endpoints, values are per worker process.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter; inc(amount, *label_values) with values in `labelnames` order.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, k), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram of durations (seconds) or sizes.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((k, (list(counts), total)) for k, (counts, total) in self._values.items())
+        out = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", _labels(self.labelnames, labels, ("le", _number(float(bound)))), cumulative))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, labels), total))
+            out.append((f"{self.name}_count", _labels(self.labelnames, labels), cumulative))
+        return out
+
+
+class _Timer:
+    """
+    Context manager observing the elapsed time (a plain class: cheaper than @contextmanager).
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class _Family:
+    """
+    A metric produced by a collector: samples are [(label dict, value)].
+    """
+
+    def __init__(self, name, type, help, samples):
+        self.name = name
+        self.type = type
+        self.help = help
+        self._samples = samples
+
+    def samples(self):
+        suffix = "_total" if self.type == "counter" else ""
+        return [
+            (self.name + suffix, _labels(labels.keys(), labels.values()), value)
+            for labels, value in self._samples
+        ]
+
+
+def register_collector(fn):
+    """
+    Register fn() -> iterable of (name, type, help, [(labels dict, value)]), called per scrape.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    families = list(_registry)
+    for collector in _collectors:
+        try:
+            families.extend(_Family(*family) for family in collector())
+        except Exception as e:
+            print("Metrics collector error:", e)
+
+    lines = []
+    for family in families:
+        name = family.name.removesuffix("_total") if family.type == "counter" else family.name
+        lines.append(f"# HELP {name} {family.help}")
+        lines.append(f"# TYPE {name} {family.type}")
+        for sample_name, labels, value in family.samples():
+            lines.append(f"{sample_name}{labels} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "pdf_stage_seconds", "Time spent in each stage of answering a question.", ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "pdf_request_seconds", "Request handling time per view.", ["view"]
+)
+REQUESTS = Counter(
+    "pdf_requests_total", "Requests handled per view and response status.", ["view", "status"]
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "pdf_ingest_stage_seconds", "Time per PDF spent in each processing stage.", ["stage"],
+    buckets=DEFAULT_BUCKETS + (120.0, 300.0, 900.0),
+)
+INGEST_PAGES = Counter("pdf_ingest_pages_total", "Pages of processed PDFs.")
+INGEST_CHUNKS = Counter(
+    "pdf_ingest_chunks_total", "Chunks of processed PDFs by embedding source.", ["source"]
+)
+GENERATED_TOKENS = Counter("pdf_generated_tokens_total", "Tokens generated by the answer model.")
+
+
+def span(stage):
+    """
+    Time a block as one stage of question answering: `with span("generate"): ...`
+    """
+    return STAGE_SECONDS.time(stage)
+
+
+def timed_view(name):
+    """
+    Decorator recording the duration and response status of a view.
+    Put it below @api_view so DRF's handled exceptions are seen as statuses.
+    """
+
+    def _status(e):
+        return 404 if isinstance(e, Http404) else getattr(e, "status_code", 500)
+
+    def _record(started, status):
+        REQUEST_SECONDS.observe(time.perf_counter() - started, name)
+        REQUESTS.inc(1, name, str(status))
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                started = time.perf_counter()
+                status = 500
+                try:
+                    response = await view(request, *args, **kwargs)
+                    status = response.status_code
+                    return response
+                except Exception as e:
+                    status = _status(e)
+                    raise
+                finally:
+                    _record(started, status)
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            except Exception as e:
+                status = _status(e)
+                raise
+            finally:
+                _record(started, status)
+
+        return wrapper
+
+    return decorator
+
+
+def record_ingestion(payload):
+    """
+    Record a successful process_pdf_obj payload.
+    """
+    for stage, seconds in payload["timings"].items():
+        INGEST_STAGE_SECONDS.observe(seconds, stage)
+    INGEST_PAGES.inc(payload["pages"])
+    INGEST_CHUNKS.inc(payload["chunks_reused"], "reused")
+    INGEST_CHUNKS.inc(payload["embeddings_from_cache"], "cached")
+    INGEST_CHUNKS.inc(payload["embeddings_computed"], "encoded")
+
+
+@register_collector
+def _runtime_metrics():
+    # Only components already created in this process are reported
+    from . import cache, executor, generation, rerank
+
+    if cache._answer_cache is not None:
+        stats = cache._answer_cache.stats()
+        yield ("pdf_answer_cache_lookups", "counter", "Answer cache lookups by result.", [
+            ({"result": "exact_hit"}, stats["exact_hits"]),
+            ({"result": "semantic_hit"}, stats["semantic_hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ])
+        yield ("pdf_answer_cache_entries", "gauge", "Answers in the cache.", [({}, stats["entries"])])
+
+    if cache._query_embedding_cache is not None:
+        stats = cache._query_embedding_cache.stats()
+        yield ("pdf_query_embedding_cache_lookups", "counter", "Question embedding cache lookups by result.", [
+            ({"result": "hit"}, stats["hits"]),
+            ({"result": "disk_hit"}, stats["disk_hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ])
+        yield ("pdf_query_embedding_cache_entries", "gauge", "Question embeddings held in memory.", [
+            ({}, stats["entries"]),
+        ])
+
+    if rerank._score_cache is not None:
+        stats = rerank._score_cache.stats()
+        yield ("pdf_rerank_cache_lookups", "counter", "Rerank score cache lookups by result.", [
+            ({"result": "hit"}, stats["hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ])
+
+    if generation._batcher is not None:
+        stats = generation._batcher.stats()
+        yield ("pdf_generation_queue_depth", "gauge", "Prompts waiting for the generation batcher.", [
+            ({}, stats["queue_depth"]),
+        ])
+        yield ("pdf_generation_batches", "counter", "Generation batches run.", [({}, stats["batches"])])
+
+    if executor._executor is not None:
+        stats = executor._executor.stats()
+        yield ("pdf_executor_in_flight", "gauge", "Model executor calls running or queued.", [({}, stats["in_flight"])])
+        yield ("pdf_executor_waiting", "gauge", "Callers waiting for a model executor slot.", [({}, stats["waiting"])])
+        yield ("pdf_executor_rejected", "counter", "Calls rejected by the model executor.", [({}, stats["rejected"])])
+
+
+@register_collector
+def _job_metrics():
+    from django.db.models import Count
+
+    from .models import ProcessingJob
+
+    counts = dict(
+        ProcessingJob.objects.filter(
+            status__in=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING]
+        ).values_list("status").annotate(n=Count("id"))
+    )
+    yield ("pdf_job_queue_depth", "gauge", "Processing jobs queued or running (all workers).", [
+        ({"status": status}, counts.get(status, 0))
+        for status in (ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING)
+    ])
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _dtype():
+    return np.dtype(getattr(settings, "PDF_EMBEDDING_DTYPE", "float32"))
+
+
+def json_to_bytes(apps, schema_editor):
+    PDFChunk = apps.get_model("pdfs", "PDFChunk")
+    dtype = _dtype()
+
+    batch = []
+    qs = PDFChunk.objects.exclude(embedding__isnull=True).only("id", "embedding")
+    for chunk in qs.iterator(chunk_size=1000):
+        emb = chunk.embedding
+        if isinstance(emb, str):
+            try:
+                emb = json.loads(emb)
+            except Exception:
+                continue
+        if not isinstance(emb, list) or len(emb) == 0:
+            continue
+        if not all(isinstance(x, (float, int)) for x in emb):
+            continue
+
+        chunk.embedding_bytes = np.asarray(emb, dtype=dtype).tobytes()
+        batch.append(chunk)
+        if len(batch) >= 1000:
+            PDFChunk.objects.bulk_update(batch, ["embedding_bytes"])
+            batch = []
+
+    if batch:
+        PDFChunk.objects.bulk_update(batch, ["embedding_bytes"])
+
+
+def bytes_to_json(apps, schema_editor):
+    PDFChunk = apps.get_model("pdfs", "PDFChunk")
+    dtype = _dtype()
+
+    batch = []
+    qs = PDFChunk.objects.exclude(embedding_bytes__isnull=True).only("id", "embedding_bytes")
+    for chunk in qs.iterator(chunk_size=1000):
+        chunk.embedding = np.frombuffer(chunk.embedding_bytes, dtype=dtype).astype(float).tolist()
+        batch.append(chunk)
+        if len(batch) >= 1000:
+            PDFChunk.objects.bulk_update(batch, ["embedding"])
+            batch = []
+
+    if batch:
+        PDFChunk.objects.bulk_update(batch, ["embedding"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0005_pdf_processed_at_pdf_processing_error_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='embedding_bytes',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(json_to_bytes, bytes_to_json),
+        migrations.RemoveField(
+            model_name='pdfchunk',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='pdfchunk',
+            old_name='embedding_bytes',
+            new_name='embedding',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0007_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdf',
+            name='chunks_processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='page_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='pages_processed',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0008_pdf_processing_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdf',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='content_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='content_refs', to='pdfs.pdf'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:42
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_chunk_hashes(apps, schema_editor):
+    PDFChunk = apps.get_model("pdfs", "PDFChunk")
+
+    batch = []
+    for chunk in PDFChunk.objects.filter(content_hash__isnull=True).only("id", "chunk_text").iterator(chunk_size=1000):
+        chunk.content_hash = hashlib.sha256(chunk.chunk_text.encode("utf-8")).hexdigest()
+        batch.append(chunk)
+        if len(batch) >= 1000:
+            PDFChunk.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+
+    if batch:
+        PDFChunk.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0009_pdf_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_chunk_hashes, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=255)),
+                ('chunk_hash', models.CharField(max_length=64)),
+                ('embedding', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'chunk_hash'), name='unique_embedding_per_model_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0010_chunk_hash_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='token_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_current_dtype(apps, schema_editor):
+    # Existing rows were written with whatever PDF_EMBEDDING_DTYPE is set now
+    dtype = np.dtype(getattr(settings, "PDF_EMBEDDING_DTYPE", "float32")).name
+    for name in ("PDFChunk", "EmbeddingCache"):
+        apps.get_model("pdfs", name).objects.update(embedding_dtype=dtype)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdfs', '0012_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingcache',
+            name='embedding_dtype',
+            field=models.CharField(default='float32', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='pdfchunk',
+            name='embedding_dtype',
+            field=models.CharField(default='float32', max_length=16),
+        ),
+        migrations.RunPython(record_current_dtype, migrations.RunPython.noop),
+    ]
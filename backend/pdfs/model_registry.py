@@ -0,0 +1,174 @@
+import gc
+import os
+import threading
+import time
+
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+LLM_MODEL_NAME = "google/flan-t5-small"
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Models are loaded on first use (not at import) and shared by every thread in the process.
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _rss_bytes():
+    """
+    Current resident set size of this process, or None if unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _get(key, loader):
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        model = loader()
+        load_seconds = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        _models[key] = model
+        _stats[key] = {
+            "load_seconds": round(load_seconds, 3),
+            "rss_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            "pid": os.getpid(),
+        }
+        print(f"Loaded model {key} in {load_seconds:.2f}s (rss +{(_stats[key]['rss_bytes'] or 0) / 2**20:.0f} MiB)")
+        return model
+
+
+def _onnx_backend():
+    from django.conf import settings
+
+    return settings.PDF_INFERENCE_BACKEND == "onnx"
+
+
+def _onnx_options():
+    from django.conf import settings
+
+    return {
+        "base_dir": settings.PDF_ONNX_MODEL_DIR,
+        "quantize": settings.PDF_ONNX_QUANTIZE,
+        "threads": settings.PDF_ONNX_THREADS,
+    }
+
+
+def _load_embed_model():
+    if _onnx_backend():
+        from .inference import load_onnx_embedder
+
+        return load_onnx_embedder(model_name=EMBED_MODEL_NAME, **_onnx_options())
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+
+def _load_llm():
+    if _onnx_backend():
+        from .inference import load_onnx_llm
+
+        return load_onnx_llm(model_name=LLM_MODEL_NAME, **_onnx_options())
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = AutoModelForSeq2SeqLM.from_pretrained(LLM_MODEL_NAME).to(device)
+    model.eval()
+    return tokenizer, model, device
+
+
+def _load_llm_tokenizer():
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
+
+
+def _load_reranker():
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(RERANK_MODEL_NAME)
+
+
+def embed_model_key():
+    """
+    Name stored with cached embeddings. int8 ONNX embeddings differ slightly
+    from the PyTorch ones, so they are cached separately.
+    """
+    if _onnx_backend() and _onnx_options()["quantize"]:
+        return f"{EMBED_MODEL_NAME}@onnx-int8"
+    return EMBED_MODEL_NAME
+
+
+def get_embed_model():
+    """
+    Shared embedding model used for chunk and question embeddings
+    (a SentenceTransformer, or OnnxEmbedder with PDF_INFERENCE_BACKEND=onnx).
+    """
+    return _get(EMBED_MODEL_NAME, _load_embed_model)
+
+
+def get_llm():
+    """
+    Shared (tokenizer, model, device) for answer generation
+    (PyTorch, or ONNX Runtime with PDF_INFERENCE_BACKEND=onnx).
+    """
+    return _get(LLM_MODEL_NAME, _load_llm)
+
+
+def get_llm_tokenizer():
+    """
+    Tokenizer of the answer model, without loading the model itself
+    (processing workers only need it to count chunk tokens).
+    """
+    llm = _models.get(LLM_MODEL_NAME)
+    if llm is not None:
+        return llm[0]
+    return _get(f"{LLM_MODEL_NAME}:tokenizer", _load_llm_tokenizer)
+
+
+def get_reranker():
+    """
+    Shared CrossEncoder that scores (question, chunk) pairs for reranking.
+    """
+    return _get(RERANK_MODEL_NAME, _load_reranker)
+
+
+def preload_models():
+    """
+    Load every model now. Call once in the server master before workers fork
+    (e.g. gunicorn --preload with PDF_PRELOAD_MODELS=True) so workers share
+    the weights copy-on-write instead of each loading its own copy.
+    """
+    from django.conf import settings
+
+    get_embed_model()
+    get_llm()
+    if settings.PDF_RERANK_ENABLED:
+        get_reranker()
+    # Keep the loaded objects out of future GC passes so the collector
+    # doesn't touch (and un-share) their pages in forked workers.
+    gc.freeze()
+
+
+def model_stats():
+    """
+    Load time and RSS growth per loaded model, for this process.
+    """
+    return {name: dict(stats) for name, stats in _stats.items()}
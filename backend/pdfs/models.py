@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 # Create your models here.
 
 class PDF(models.Model):
@@ -25,10 +28,107 @@ class PDF(models.Model):
     processing_error = models.TextField(null=True, blank=True)
     processed_at = models.DateTimeField(null=True, blank=True)
 
+    # Content addressing: identical uploads share one file, chunk set and index.
+    # content_source points at the canonical PDF holding them (None if this is it).
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    content_source = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="content_refs"
+    )
+
+    # Progress of the current/last processing run
+    page_count = models.IntegerField(null=True, blank=True)
+    pages_processed = models.IntegerField(default=0)
+    chunks_processed = models.IntegerField(default=0)
+
+    @property
+    def content_owner(self):
+        """
+        The PDF whose chunks and index hold this document's content.
+        """
+        return self.content_source or self
+
 class PDFChunk(models.Model):
     pdf = models.ForeignKey(PDF, on_delete=models.CASCADE)
     chunk_text = models.TextField()
-    embedding = models.JSONField(null=True, blank=True)
+    embedding = models.BinaryField(null=True, blank=True)  # raw float32/float16 bytes
+    embedding_dtype = models.CharField(max_length=16, default="float32")  # dtype `embedding` was written with
     page_number = models.IntegerField(null=True, blank=True)
     order = models.IntegerField(default=0) 
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # sha256 of chunk_text
+    token_count = models.PositiveIntegerField(null=True, blank=True)  # answer-model tokens, for context packing
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class EmbeddingCache(models.Model):
+    """
+    Embeddings keyed by (model name, chunk hash), so reprocessing only encodes text it hasn't seen.
+    """
+    model_name = models.CharField(max_length=255)
+    chunk_hash = models.CharField(max_length=64)
+    embedding = models.BinaryField()
+    embedding_dtype = models.CharField(max_length=16, default="float32")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["model_name", "chunk_hash"], name="unique_embedding_per_model_chunk"),
+        ]
+
+class ProcessingJob(models.Model):
+    """
+    Durable queue entry for background PDF processing (consumed by `manage.py run_workers`).
+    PDF.processing_status stays the user-visible state.
+    """
+    pdf = models.ForeignKey(PDF, on_delete=models.CASCADE, related_name="jobs")
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload: parts are appended in order to a file on disk
+    (received = bytes written so far) until the client completes it, which
+    registers the PDF. See pdfs/uploads.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+
+    STATUS_ACTIVE = "active"
+    STATUS_COMPLETE = "complete"
+    STATUS_ABORTED = "aborted"
+
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, "Active"),
+        (STATUS_COMPLETE, "Complete"),
+        (STATUS_ABORTED, "Aborted"),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    total_size = models.BigIntegerField(null=True, blank=True)  # declared by the client, if known
+    received = models.BigIntegerField(default=0)
+    part_writer = models.UUIDField(null=True, blank=True)  # request currently writing the part at `received`
+    part_started_at = models.DateTimeField(null=True, blank=True)
+    pdf = models.ForeignKey(PDF, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
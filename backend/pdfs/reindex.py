@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+
+# Worker side of `manage.py reindex_pdfs`. Documents are processed in a pool
+# of spawned processes, each running the same streaming pipeline as the
+# background workers (process_pdf_obj: batched embedding, bulk inserts,
+# embedding cache). Progress is checkpointed by the parent after every
+# document so an interrupted run resumes where it stopped.
+# No Django imports at module level: spawned workers unpickle init_worker
+# (importing this module) before Django is set up.
+
+
+def init_worker(overrides, torch_threads):
+    """
+    Pool initializer: set up Django in the spawned process, apply the
+    command's setting overrides and cap intra-op threads so the workers
+    don't oversubscribe the CPUs.
+    """
+    import django
+
+    django.setup()
+
+    from django.test.utils import override_settings
+
+    override_settings(**overrides).enable()
+    if torch_threads:
+        try:
+            import torch
+
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+
+
+def reindex_document(pdf_id):
+    """
+    Reprocess one canonical PDF and record the outcome on it like a job run.
+    Returns (pdf_id, success, payload) with payload["seconds"] added.
+    """
+    from django.db import close_old_connections
+    from django.utils import timezone
+
+    from .models import PDF, ProcessingJob
+    from .views import process_pdf_obj
+
+    close_old_connections()
+    started = time.perf_counter()
+    pdf_obj = PDF.objects.filter(id=pdf_id).first()
+    if pdf_obj is None:
+        return pdf_id, False, {"error": "PDF no longer exists", "seconds": 0.0}
+
+    PDF.objects.filter(id=pdf_id).update(processing_status=PDF.PROCESSING_RUNNING, processing_error=None)
+    try:
+        success, payload = process_pdf_obj(pdf_obj)
+    except Exception as e:
+        success, payload = False, {"error": str(e), "status": 500}
+
+    if success:
+        PDF.objects.filter(id=pdf_id).update(
+            processing_status=PDF.PROCESSING_DONE, processing_error=None, processed_at=timezone.now()
+        )
+        # A queued job for this PDF would only redo the same work
+        ProcessingJob.objects.filter(pdf_id=pdf_id, status=ProcessingJob.STATUS_QUEUED).update(
+            status=ProcessingJob.STATUS_DONE, last_error=None
+        )
+    else:
+        PDF.objects.filter(id=pdf_id).update(
+            processing_status=PDF.PROCESSING_FAILED, processing_error=payload.get("error") or "Processing failed"
+        )
+
+    payload["seconds"] = time.perf_counter() - started
+    close_old_connections()
+    return pdf_id, success, payload
+
+
+class Checkpoint:
+    """
+    JSON file recording which documents a run has finished, tied to the
+    run's selection so a resumed run processes the same set.
+    """
+
+    def __init__(self, path, selection):
+        self.path = path
+        self.selection = selection
+        self.done = set()
+        self.failed = {}
+
+    def load(self):
+        """
+        Read an existing checkpoint. Returns False if there is none;
+        raises ValueError if it belongs to a run with another selection.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("selection") != self.selection:
+            raise ValueError(f"{self.path} belongs to a run with different filters")
+        self.done = set(data.get("done", []))
+        self.failed = {int(k): v for k, v in data.get("failed", {}).items()}
+        return True
+
+    def record(self, pdf_id, success, error=None):
+        if success:
+            self.done.add(pdf_id)
+            self.failed.pop(pdf_id, None)
+        else:
+            self.failed[pdf_id] = error
+        self.save()
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {"selection": self.selection, "done": sorted(self.done), "failed": self.failed},
+                f,
+            )
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .cache import LRUCache, normalize_question
+from .model_registry import RERANK_MODEL_NAME, get_reranker
+
+
+# Retrieve-many / rerank-few: the fused retrieval candidates are scored with a
+# cross-encoder in batches, best first, until the latency budget runs out.
+# Scores are cached per (question, chunk content) so a repeated question only
+# pays for chunks it hasn't seen.
+
+_score_cache = None
+_score_cache_lock = threading.Lock()
+
+
+def get_score_cache():
+    """
+    Process-wide cache of cross-encoder scores configured from settings.
+    """
+    global _score_cache
+    if _score_cache is None:
+        with _score_cache_lock:
+            if _score_cache is None:
+                _score_cache = LRUCache(max_entries=settings.PDF_RERANK_CACHE_SIZE)
+    return _score_cache
+
+
+def rerank(question, candidates, top_k=5):
+    """
+    Reorder candidates [(order, chunk_text, content_hash)], given in retrieval
+    order, by cross-encoder relevance and return the best top_k orders.
+    Candidates left unscored when PDF_RERANK_BUDGET_MS is exceeded keep their
+    retrieval order after the scored ones.
+    """
+    if len(candidates) <= 1:
+        return [order for order, _, _ in candidates][:top_k]
+
+    cache = get_score_cache()
+    question_key = normalize_question(question)
+    keys = [(RERANK_MODEL_NAME, question_key, content_hash) for _, _, content_hash in candidates]
+
+    scores = {}
+    pending = []
+    for i, key in enumerate(keys):
+        score = cache.get(key) if key[2] else None
+        if score is None:
+            pending.append(i)
+        else:
+            scores[i] = score
+
+    deadline = time.perf_counter() + settings.PDF_RERANK_BUDGET_MS / 1000
+    batch_size = max(settings.PDF_RERANK_BATCH_SIZE, 1)
+    model = get_reranker() if pending else None
+    for start in range(0, len(pending), batch_size):
+        if start and time.perf_counter() >= deadline:
+            print(f"Rerank budget exhausted: scored {start} of {len(pending)} uncached candidates")
+            break
+        batch = pending[start:start + batch_size]
+        predicted = model.predict([(question, candidates[i][1]) for i in batch], batch_size=batch_size)
+        for i, score in zip(batch, predicted):
+            scores[i] = float(score)
+            if keys[i][2]:
+                cache.set(keys[i], scores[i])
+
+    ranked = sorted(scores, key=lambda i: -scores[i])
+    ranked += [i for i in range(len(candidates)) if i not in scores]
+    return [candidates[i][0] for i in ranked[:top_k]]
@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+import faiss
+
+
+# Vector retrieval shared by per-PDF indexes, the per-user shards and the
+# benchmarks. Kept free of Django so scripts can use it directly.
+#
+# Vectors are L2-normalized and searched by inner product, so scores are
+# cosine similarities (higher is better) whatever the index type:
+#   flat  exact search, best up to a few hundred thousand vectors
+#   ivf   inverted lists over k-means cells; probes `nprobe` cells per query
+#   hnsw  graph search; `ef_search` trades recall for speed
+# All types are wrapped in an id map (ids are chunk orders or chunk ids) and
+# can be read back memory-mapped (read_index(path, mmap=True)).
+
+METRIC = "ip"
+INDEX_KINDS = ("flat", "ivf", "hnsw")
+
+# Below this many vectors an IVF index is not worth training: flat is used
+IVF_MIN_VECTORS = 1000
+
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def normalize(vectors):
+    """
+    Float32, C-contiguous copy of `vectors` (one vector or n x dim) with unit-length rows.
+    """
+    matrix = np.array(vectors, dtype="float32", ndmin=2, order="C", copy=True)
+    if matrix.size:
+        faiss.normalize_L2(matrix)
+    return matrix
+
+
+def ivf_nlist(n):
+    """
+    IVF cell count for n vectors (~4 sqrt(n), with at least ~39 training points per cell).
+    """
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def new_index(kind, dim, hnsw_m=32, hnsw_ef_construction=80, nlist=None):
+    """
+    Empty inner-product index of the given kind, wrapped in an id map.
+    IVF indexes need train() before vectors are added.
+    """
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "ivf":
+        base = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = hnsw_ef_construction
+    else:
+        raise ValueError(f"Unknown index type {kind!r} (expected one of {', '.join(INDEX_KINDS)})")
+    # IDMap2 can reconstruct vectors by id (needed to convert or compact indexes)
+    return faiss.IndexIDMap2(base)
+
+
+def build_index(embeddings, ids, kind="flat", **params):
+    """
+    Index `embeddings` (n x dim) under `ids`. Small collections always get a
+    flat index: IVF needs enough vectors to train on and HNSW gains nothing.
+    """
+    vectors = normalize(embeddings)
+    ids = np.asarray(ids, dtype="int64")
+    if kind != "flat" and len(vectors) < IVF_MIN_VECTORS:
+        kind = "flat"
+
+    if kind == "ivf":
+        index = new_index(kind, vectors.shape[1], nlist=params.get("nlist") or ivf_nlist(len(vectors)))
+        index.train(vectors)
+    else:
+        index = new_index(
+            kind, vectors.shape[1],
+            hnsw_m=params.get("hnsw_m", 32), hnsw_ef_construction=params.get("hnsw_ef_construction", 80),
+        )
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def add_vectors(index, embeddings, ids):
+    """
+    Normalize and append vectors to a flat or HNSW index (or a trained IVF one).
+    """
+    index.add_with_ids(normalize(embeddings), np.asarray(ids, dtype="int64"))
+
+
+def index_kind(index):
+    base = faiss.downcast_index(index.index if hasattr(index, "id_map") else index)
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_vectors(index):
+    """
+    (normalized vectors, ids) stored in an IndexIDMap2 index.
+    """
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    if not len(ids):
+        return np.empty((0, index.d), dtype="float32"), ids
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexIVF):
+        base.make_direct_map()
+    return base.reconstruct_n(0, index.ntotal), ids
+
+
+def convert_index(index, kind, **params):
+    """
+    Rebuild a (flat) index as `kind`, e.g. once an incrementally built
+    document is complete. Returns the index unchanged if nothing changes.
+    """
+    if index is None or kind == index_kind(index):
+        return index
+    vectors, ids = index_vectors(index)
+    if kind != "flat" and len(vectors) < IVF_MIN_VECTORS:
+        return index
+    return build_index(vectors, ids, kind, **params)
+
+
+def search(index, queries, top_k, nprobe=16, ef_search=64):
+    """
+    Batched search: queries is one vector or an (m x dim) matrix.
+    Returns one (ids, scores) pair of lists per query, best first; scores are cosine similarities.
+    """
+    queries = normalize(queries)
+    top_k = min(top_k, index.ntotal)
+    if top_k <= 0:
+        return [([], []) for _ in range(len(queries))]
+
+    kind = index_kind(index)
+    if kind == "ivf":
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif kind == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=max(ef_search, top_k))
+    else:
+        params = None
+
+    scores, ids = index.search(queries, top_k, params=params)
+    results = []
+    for row_ids, row_scores in zip(ids, scores):
+        keep = row_ids >= 0
+        results.append((row_ids[keep].tolist(), row_scores[keep].tolist()))
+    return results
+
+
+def write_index(index, path):
+    faiss.write_index(index, path)
+
+
+def read_index(path, mmap=True):
+    """
+    Load a persisted index; memory-mapped (read-only, shared page cache) by default.
+    """
+    return faiss.read_index(path, _MMAP_FLAGS) if mmap else faiss.read_index(path)
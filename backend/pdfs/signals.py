@@ -0,0 +1,16 @@
+from django.db.models.signals import pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import PDF
+from .content import release_content, delete_content_files
+
+
+@receiver(pre_delete, sender=PDF)
+def _hand_over_shared_content(sender, instance, **kwargs):
+    instance._content_still_referenced = release_content(instance)
+
+
+@receiver(post_delete, sender=PDF)
+def _delete_unreferenced_files(sender, instance, **kwargs):
+    if not getattr(instance, "_content_still_referenced", False):
+        delete_content_files(instance)
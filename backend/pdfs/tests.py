@@ -1,3 +1,1152 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, cache, extraction, generation, index_store, jobs, model_registry, rerank, uploads, user_index, views
+from .bm25 import build_bm25, reciprocal_rank_fusion
+from .cache import AnswerCache, QueryEmbeddingCache
+from .chunking import chunk_text, iter_chunks
+from .context import pack_context
+from .embeddings import embedding_from_bytes, embeddings_matrix
+from .models import PDF, EmbeddingCache, PDFChunk, ProcessingJob, UploadSession
+
+
+# Behaviour tests. The models are stubbed (a bag-of-words embedder) so no
+# weights are downloaded; media goes to a temporary directory per test.
+
+WORDS = (
+    "contract clause payment invoice delivery warranty liability report revenue customer "
+    "product policy engine valve pump pressure manual maintenance inspection safety"
+).split()
+
+
+def write_pdf(path, pages, words_per_page=120, seed=0):
+    """
+    Write a minimal text PDF (one Helvetica text stream per page) and return
+    the text of each page.
+    """
+    rng = random.Random(seed)
+    texts = [
+        " ".join([f"page{i + 1}"] + [rng.choice(WORDS) for _ in range(words_per_page - 1)])
+        for i in range(pages)
+    ]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(texts):
+        words = text.split()
+        lines = [" ".join(words[j:j + 12]) for j in range(0, len(words), 12)]
+        stream = ("BT /F1 9 Tf 30 810 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET").encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return texts
+
+
+class FakeEmbedder:
+    dim = 16
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        vectors = np.zeros((1 if single else len(texts), self.dim), dtype="float32")
+        for row, text in enumerate([texts] if single else texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        return vectors[0] if single else vectors
+
+
+class FakeTokenizer:
+    # Whitespace "tokens"
+    model_max_length = 512
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [text.split() for text in texts]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+class FakeReranker:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        # Relevance = number of question words found in the passage
+        self.pairs.extend(pairs)
+        return [len(set(q.lower().split()) & set(p.lower().split())) for q, p in pairs]
+
+
+def call_command_output(*args):
+    out = io.StringIO()
+    call_command(*args, stdout=out)
+    return out.getvalue().strip()
+
+
+class PDFTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp, "media"),
+            PDF_UPLOAD_DIR=os.path.join(self.tmp, "uploads"),
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.embedder = FakeEmbedder()
+        self.reranker = FakeReranker()
+        model = mock.patch.dict(model_registry._models, {
+            model_registry.EMBED_MODEL_NAME: self.embedder,
+            model_registry.RERANK_MODEL_NAME: self.reranker,
+            f"{model_registry.LLM_MODEL_NAME}:tokenizer": FakeTokenizer(),
+        })
+        model.start()
+        self.addCleanup(model.stop)
+        cache._answer_cache = None
+        cache._query_embedding_cache = None
+        rerank._score_cache = None
+
+        self.user = User.objects.create_user("reader", password="x")
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def make_pdf_file(self, name="doc.pdf", pages=2, seed=0):
+        path = os.path.join(self.tmp, name)
+        write_pdf(path, pages, seed=seed)
+        return path
+
+    def upload(self, client=None, name="doc.pdf", pages=2, seed=0):
+        with open(self.make_pdf_file(name, pages, seed), "rb") as f:
+            response = (client or self.client).post("/api/upload_pdf/", {"file": f}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.data)
+        return PDF.objects.get(id=response.data["pdf_id"])
+
+    def create_pdf(self, user=None, name="doc.pdf", pages=2, seed=0):
+        with open(self.make_pdf_file(name, pages, seed), "rb") as f:
+            return PDF.objects.create(user=user or self.user, file=File(f, name=name), title=name)
+
+    def process(self, pdf, client=None):
+        response = (client or self.client).post(f"/api/pdf/{pdf.id}/process/")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+
+class IndexPersistenceTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.create_pdf(pages=3)
+        self.process(self.pdf)
+        self.chunks = list(PDFChunk.objects.filter(pdf=self.pdf).order_by("order"))
+        index_store._cache.clear()
+
+    def test_processing_persists_index(self):
+        path = index_store.index_path(self.pdf)
+        self.assertTrue(os.path.exists(path))
+
+        with mock.patch.object(index_store, "rebuild_index", side_effect=AssertionError("rebuilt")):
+            index = index_store.load_index(self.pdf)
+        self.assertEqual(index.ntotal, len(self.chunks))
+        # Cached per process until the file changes
+        self.assertIs(index_store.load_index(self.pdf), index)
+
+        chunk = self.chunks[-1]
+        orders, _ = index_store.search_index(index, self.embedder.encode(chunk.chunk_text), top_k=1)
+        self.assertEqual(orders, [chunk.order])
+
+    def test_missing_index_is_rebuilt_from_stored_embeddings(self):
+        index_store.invalidate_index(self.pdf)
+        path = index_store.index_path(self.pdf)
+        self.assertFalse(os.path.exists(path))
+
+        index = index_store.load_index(self.pdf)
+        self.assertEqual(index.ntotal, len(self.chunks))
+        self.assertTrue(os.path.exists(path))
+        orders, _ = index_store.search_index(index, self.embedder.encode(self.chunks[0].chunk_text), top_k=1)
+        self.assertEqual(orders, [self.chunks[0].order])
+
+    def test_reprocessing_serves_old_index_until_replaced(self):
+        path = index_store.index_path(self.pdf)
+        seen = []
+        embed_batch = views._embed_chunk_batch
+
+        def checking(*args):
+            # Mid-run the old files are still there and no partial index gets written
+            with mock.patch.object(index_store, "rebuild_index", side_effect=AssertionError("rebuilt")):
+                seen.append(index_store.load_index(self.pdf).ntotal)
+            self.assertTrue(os.path.exists(index_store.lexical_index_path(self.pdf)))
+            return embed_batch(*args)
+
+        with mock.patch.object(views, "_embed_chunk_batch", checking):
+            self.process(self.pdf)
+        self.assertEqual(seen[0], len(self.chunks))
+        self.assertTrue(os.path.exists(path))
+
+    def test_index_rebuilt_during_processing_is_not_persisted(self):
+        index_store.invalidate_index(self.pdf)
+        PDF.objects.filter(id=self.pdf.id).update(processing_status=PDF.PROCESSING_RUNNING)
+        self.assertEqual(index_store.load_index(self.pdf).ntotal, len(self.chunks))
+        self.assertIsNotNone(index_store.load_lexical_index(self.pdf))
+        self.assertFalse(os.path.exists(index_store.index_path(self.pdf)))
+        self.assertFalse(os.path.exists(index_store.lexical_index_path(self.pdf)))
+
+    @override_settings(PDF_EMBEDDING_DTYPE="float16")
+    def test_rows_keep_the_dtype_they_were_written_with(self):
+        self.assertEqual({c.embedding_dtype for c in self.chunks}, {"float32"})
+        index_store.invalidate_index(self.pdf)
+        index = index_store.load_index(self.pdf)
+        orders, _ = index_store.search_index(index, self.embedder.encode(self.chunks[0].chunk_text), top_k=1)
+        self.assertEqual(orders, [self.chunks[0].order])
+
+        # New rows are float16 and decode alongside the float32 ones
+        new = self.create_pdf(name="other.pdf", pages=2, seed=1)
+        self.process(new)
+        self.assertEqual(set(PDFChunk.objects.filter(pdf=new).values_list("embedding_dtype", flat=True)), {"float16"})
+        blobs, dtypes = zip(*PDFChunk.objects.order_by("id").values_list("embedding", "embedding_dtype"))
+        self.assertEqual(embeddings_matrix(blobs, dtypes).shape, (len(blobs), self.embedder.dim))
+
+    def test_mismatched_embeddings_are_rejected(self):
+        blob = np.ones(self.embedder.dim, dtype="float32").tobytes()
+        with self.assertRaises(ValueError):
+            embeddings_matrix([blob, blob], ["float32", "float16"])
+        with self.assertRaises(ValueError):
+            embedding_from_bytes(blob[:-1], "float32")
+
+
+class JobQueueTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.upload()
+        self.job = ProcessingJob.objects.get(pdf=self.pdf)
+
+    def run_next(self, result):
+        job = jobs.claim_next_job("worker-1")
+        with mock.patch.object(views, "process_pdf_obj", return_value=result):
+            jobs.run_job(job)
+        job.refresh_from_db()
+        self.pdf.refresh_from_db()
+        return job
+
+    def test_enqueue_reuses_pending_job(self):
+        self.assertEqual(self.pdf.processing_status, PDF.PROCESSING_PENDING)
+        self.assertEqual(jobs.enqueue_processing(self.pdf).id, self.job.id)
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+
+    @override_settings(PDF_JOB_RETRY_BACKOFF=30)
+    def test_server_errors_retry_with_backoff_then_fail(self):
+        error = (False, {"error": "model crashed", "status": 500})
+        for attempt, delay in ((1, 30), (2, 60)):
+            before = timezone.now()
+            job = self.run_next(error)
+            self.assertEqual((job.status, job.attempts), (ProcessingJob.STATUS_QUEUED, attempt))
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay))
+            self.assertIsNone(job.locked_by)
+            self.assertEqual(self.pdf.processing_status, PDF.PROCESSING_PENDING)
+            # Not claimable before its backoff is over
+            self.assertIsNone(jobs.claim_next_job("worker-2"))
+            ProcessingJob.objects.filter(id=job.id).update(run_after=timezone.now())
+
+        job = self.run_next(error)
+        self.assertEqual((job.status, job.attempts), (ProcessingJob.STATUS_FAILED, 3))
+        self.assertEqual(self.pdf.processing_status, PDF.PROCESSING_FAILED)
+        self.assertEqual(self.pdf.processing_error, "model crashed")
+
+    def test_unusable_pdf_fails_without_retry(self):
+        job = self.run_next((False, {"error": "Could not extract text from PDF", "status": 400}))
+        self.assertEqual((job.status, job.attempts), (ProcessingJob.STATUS_FAILED, 1))
+        self.assertEqual(self.pdf.processing_status, PDF.PROCESSING_FAILED)
+
+    def test_success_marks_job_and_pdf_done(self):
+        job = jobs.claim_next_job("worker-1")
+        self.assertTrue(jobs.run_job(job))
+        job.refresh_from_db()
+        self.pdf.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_DONE)
+        self.assertEqual(self.pdf.processing_status, PDF.PROCESSING_DONE)
+        self.assertIsNotNone(self.pdf.processed_at)
+        self.assertTrue(PDFChunk.objects.filter(pdf=self.pdf, embedding__isnull=False).exists())
+
+
+class JobHeartbeatTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.upload()
+        self.job = jobs.claim_next_job("worker-1")
+        # Claimed long ago
+        ProcessingJob.objects.filter(id=self.job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+    @override_settings(PDF_JOB_HEARTBEAT_INTERVAL=0)
+    def test_heartbeat_keeps_long_running_job(self):
+        jobs._heartbeat(self.job)()
+        self.assertEqual(jobs.recover_stale_jobs(stale_after=60), 0)
+        self.assertEqual(ProcessingJob.objects.get(id=self.job.id).status, ProcessingJob.STATUS_RUNNING)
+
+    def test_job_without_heartbeat_is_requeued(self):
+        self.assertEqual(jobs.recover_stale_jobs(stale_after=60), 1)
+        job = ProcessingJob.objects.get(id=self.job.id)
+        self.assertEqual(job.status, ProcessingJob.STATUS_QUEUED)
+        self.assertIsNone(job.locked_by)
+
+    @override_settings(PDF_JOB_HEARTBEAT_INTERVAL=0, PDF_PIPELINE_BATCH_CHUNKS=1)
+    def test_processing_refreshes_lock(self):
+        beats = []
+        heartbeat = jobs._heartbeat
+
+        def counting(job):
+            beat = heartbeat(job)
+            return lambda: (beats.append(ProcessingJob.objects.get(id=job.id).locked_at), beat())
+
+        with mock.patch.object(jobs, "_heartbeat", counting):
+            self.assertTrue(jobs.run_job(self.job))
+        self.assertGreater(len(beats), 1)
+        self.assertGreater(beats[-1], timezone.now() - timedelta(minutes=1))
+
+
+class StreamingAnswerTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.create_pdf()
+        self.process(self.pdf)
+        self.prompts = []
+
+        def fake_stream(prompt, cancelled, max_new_tokens=200, on_complete=None):
+            self.prompts.append(prompt)
+            try:
+                for piece in ("The ", "answer"):
+                    if cancelled.is_set():
+                        return
+                    yield views.sse_event("token", {"text": piece})
+                yield views.sse_event("done", {})
+                if on_complete is not None:
+                    on_complete("The answer")
+            finally:
+                cancelled.set()
+
+        stream = mock.patch.object(views, "stream_answer_events", fake_stream)
+        stream.start()
+        self.addCleanup(stream.stop)
+
+    def test_answer_is_streamed_as_events(self):
+        response = self.client.post(
+            f"/api/ask_pdf/{self.pdf.id}/stream/", {"question": "page1 payment"}, format="json",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(
+            body,
+            'event: token\ndata: {"text": "The "}\n\n'
+            'event: token\ndata: {"text": "answer"}\n\n'
+            "event: done\ndata: {}\n\n",
+        )
+        # The prompt carries the retrieved chunk
+        self.assertIn("page1", self.prompts[0])
+
+    def test_errors_are_sent_as_an_event(self):
+        response = self.client.post(
+            f"/api/ask_pdf/{self.pdf.id}/stream/", {"question": " "}, format="json",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode(), 'event: error\ndata: {"error": "Question required"}\n\n')
+        self.assertEqual(self.prompts, [])
+
+
+class GenerationBatcherTests(TestCase):
+    def setUp(self):
+        self.batches = []
+
+        def fake_generate_batch(prompts, max_new_tokens=200):
+            self.batches.append(list(prompts))
+            if "boom" in prompts:
+                raise RuntimeError("model crashed")
+            return [prompt.upper() for prompt in prompts]
+
+        patch = mock.patch.object(generation, "generate_batch", fake_generate_batch)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_concurrent_prompts_share_a_batch(self):
+        batcher = generation.GenerationBatcher(max_batch_size=2, max_wait_ms=500)
+        futures = [batcher.submit(prompt) for prompt in ("a", "b", "c")]
+        # Each caller gets its own answer
+        self.assertEqual([f.result(timeout=5) for f in futures], ["A", "B", "C"])
+        self.assertEqual(self.batches, [["a", "b"], ["c"]])
+
+        stats = batcher.stats()
+        self.assertEqual((stats["requests"], stats["batches"]), (3, 2))
+        self.assertEqual(stats["batch_size_histogram"], {"1": 1, "2": 1})
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        batcher = generation.GenerationBatcher(max_batch_size=8, max_wait_ms=200)
+        futures = [batcher.submit(prompt) for prompt in ("boom", "other")]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, "model crashed"):
+                future.result(timeout=5)
+        # The batcher keeps serving afterwards
+        self.assertEqual(batcher.generate("next", timeout=5), "NEXT")
+
+
+class AnswerCacheTests(TestCase):
+    def test_exact_and_semantic_hits_stay_in_scope(self):
+        answers = AnswerCache(similarity=0.9)
+        scope = (1, "2026-01-01T00:00:00")
+        answers.set(scope, "What is the warranty?", [1.0, 0.0], "Two years.")
+
+        self.assertEqual(answers.get_exact(scope, "what is the  warranty"), "Two years.")
+        self.assertEqual(answers.get_similar(scope, [0.99, 0.05]), "Two years.")
+        self.assertIsNone(answers.get_similar(scope, [0.0, 1.0]))
+        # Reprocessing changes the scope
+        self.assertIsNone(answers.get_exact((1, "2026-02-01T00:00:00"), "What is the warranty?"))
+        self.assertEqual(answers.stats()["exact_hits"], 1)
+        self.assertEqual(answers.stats()["semantic_hits"], 1)
+
+
+class AskCacheTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.create_pdf()
+        self.process(self.pdf)
+        generate = mock.patch.object(views, "generate_answer", return_value="Two years.")
+        self.generate = generate.start()
+        self.addCleanup(generate.stop)
+
+    def ask(self, question):
+        response = self.client.post(f"/api/ask_pdf/{self.pdf.id}/", {"question": question}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_repeated_question_is_answered_from_cache(self):
+        self.assertEqual(self.ask("What is the warranty?"), {"answer": "Two years."})
+        self.assertEqual(self.ask("what is the warranty"), {"answer": "Two years.", "cached": True})
+        self.assertEqual(self.generate.call_count, 1)
+
+        # Reprocessing the PDF invalidates its answers
+        self.process(self.pdf)
+        self.assertNotIn("cached", self.ask("What is the warranty?"))
+        self.assertEqual(self.generate.call_count, 2)
+
+
+class ChunkingTests(TestCase):
+    def test_iter_chunks_matches_chunk_text(self):
+        pages = [(1, " ".join(f"a{i}" for i in range(130))), (2, ""), (3, " ".join(f"c{i}" for i in range(75)))]
+        text = " ".join(t for _, t in pages)
+        for chunk_size, overlap in ((200, 40), (50, 10), (20, 0), (10, 15), (7, 3)):
+            with self.subTest(chunk_size=chunk_size, overlap=overlap):
+                chunks = list(iter_chunks(iter(pages), chunk_size, overlap))
+                self.assertEqual([c for c, _ in chunks], chunk_text(text, chunk_size, overlap))
+
+    def test_chunks_record_their_first_page(self):
+        pages = [(1, "one two three"), (2, "four five six seven")]
+        self.assertEqual(list(iter_chunks(pages, 3, 1)), [
+            ("one two three", 1), ("three four five", 1), ("five six seven", 2), ("seven", 2),
+        ])
+
+
+@override_settings(PDF_PIPELINE_BATCH_CHUNKS=2)
+class PipelineTests(PDFTestCase):
+    def test_large_pdf_is_processed_in_batches_with_progress(self):
+        pdf = self.create_pdf(pages=6)
+        beats = []
+        success, payload = views.process_pdf_obj(pdf, heartbeat=lambda: beats.append(1))
+        self.assertTrue(success, payload)
+
+        pdf.refresh_from_db()
+        chunks = list(PDFChunk.objects.filter(pdf=pdf).order_by("order"))
+        self.assertEqual(len(chunks), payload["chunks_created"])
+        self.assertEqual((pdf.page_count, pdf.pages_processed, pdf.chunks_processed), (6, 6, len(chunks)))
+        self.assertEqual([c.order for c in chunks], list(range(len(chunks))))
+        self.assertEqual(chunks[0].page_number, 1)
+        # One heartbeat per batch of two chunks
+        self.assertEqual(len(beats), (len(chunks) + 1) // 2)
+        self.assertEqual(index_store.load_index(pdf).ntotal, len(chunks))
+
+
+class SharedContentTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = self.upload()
+        self.process(self.owner)
+        self.other_user = User.objects.create_user("other", password="x")
+        self.other_client = self.client_for(self.other_user)
+
+    def test_duplicate_upload_shares_processed_content(self):
+        def post(name, seed):
+            with open(self.make_pdf_file(name, seed=seed), "rb") as f:
+                response = self.other_client.post("/api/upload_pdf/", {"file": f}, format="multipart")
+            data = dict(response.data)
+            return PDF.objects.get(id=data.pop("pdf_id")), data
+
+        duplicate, response = post("doc.pdf", 0)
+        self.assertEqual(duplicate.content_source_id, self.owner.id)
+        self.assertEqual(duplicate.processing_status, PDF.PROCESSING_DONE)
+        # The uploader can't tell the file was already uploaded by someone else
+        fresh, fresh_response = post("new.pdf", 1)
+        self.assertIsNone(fresh.content_source_id)
+        self.assertEqual(response["message"], fresh_response["message"])
+        self.assertEqual(set(response), set(fresh_response))
+        response = self.other_client.get(f"/api/pdf_chunks/{duplicate.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), PDFChunk.objects.filter(pdf=self.owner).count())
+
+    def test_reprocessing_through_duplicate_updates_owner(self):
+        duplicate = self.upload(self.other_client)
+        self.owner.refresh_from_db()
+        processed_at = self.owner.processed_at
+        scope = AnswerCache.scope_for(self.owner)
+
+        response = self.other_client.post(f"/api/pdf/{duplicate.id}/process/")
+        self.assertEqual(response.status_code, 200)
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.processing_status, PDF.PROCESSING_DONE)
+        self.assertGreater(self.owner.processed_at, processed_at)
+        # Cached answers for the old version are no longer in scope
+        self.assertNotEqual(AnswerCache.scope_for(self.owner), scope)
+
+    def test_deleting_owner_hands_content_to_duplicate(self):
+        duplicate = self.upload(self.other_client)
+        third = self.upload(self.client_for(User.objects.create_user("third", password="x")))
+        chunk_count = PDFChunk.objects.filter(pdf=self.owner).count()
+        file_name = self.owner.file.name
+
+        self.owner.delete()
+        duplicate.refresh_from_db()
+        third.refresh_from_db()
+        self.assertIsNone(duplicate.content_source_id)
+        self.assertEqual(third.content_source_id, duplicate.id)
+        self.assertEqual(PDFChunk.objects.filter(pdf=duplicate).count(), chunk_count)
+        self.assertTrue(duplicate.file.storage.exists(file_name))
+
+        # The last reference takes the file with it
+        third.delete()
+        duplicate.delete()
+        self.assertFalse(PDFChunk.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "media", file_name)))
+
+
+
+class IncrementalReprocessTests(PDFTestCase):
+    def test_reprocessing_reuses_unchanged_chunks(self):
+        pdf = self.create_pdf(pages=3)
+        first = self.process(pdf).data
+        self.assertEqual(first["embeddings_computed"], first["chunks_created"])
+        ids = set(PDFChunk.objects.filter(pdf=pdf).values_list("id", flat=True))
+
+        second = self.process(pdf).data
+        self.assertEqual((second["chunks_reused"], second["embeddings_computed"]), (first["chunks_created"], 0))
+        self.assertEqual(set(PDFChunk.objects.filter(pdf=pdf).values_list("id", flat=True)), ids)
+
+    def test_embeddings_are_shared_through_the_cache(self):
+        self.process(self.create_pdf(pages=2))
+        other = self.create_pdf(user=User.objects.create_user("other", password="x"), name="copy.pdf", pages=2)
+        payload = views.process_pdf_obj(other)[1]
+        self.assertEqual(payload["embeddings_computed"], 0)
+        self.assertEqual(payload["embeddings_from_cache"], payload["chunks_created"])
+
+    def test_unused_cached_embeddings_are_pruned(self):
+        kept = self.create_pdf(pages=2)
+        self.process(kept)
+        gone = self.create_pdf(name="gone.pdf", pages=2, seed=1)
+        self.process(gone)
+        gone.delete()
+        used = set(PDFChunk.objects.values_list("content_hash", flat=True))
+        self.assertGreater(EmbeddingCache.objects.count(), len(used))
+
+        # Fresh rows may belong to a batch whose chunks aren't inserted yet
+        self.assertEqual(call_command_output("prune_embedding_cache"), "Pruned 0 cached embedding(s)")
+        pruned = EmbeddingCache.objects.count() - len(used)
+        self.assertEqual(
+            call_command_output("prune_embedding_cache", "--min-age", "0"), f"Pruned {pruned} cached embedding(s)"
+        )
+        self.assertEqual(set(EmbeddingCache.objects.values_list("chunk_hash", flat=True)), used)
+
+
+class UserIndexTests(PDFTestCase):
+    def test_search_before_first_processed_pdf(self):
+        # The first search writes an empty index for the user...
+        response = self.client.get("/api/search/", {"q": "pump valve"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [])
+
+        # ...which the first processed PDF must still be added to
+        pdf = self.create_pdf()
+        self.process(pdf)
+
+        response = self.client.get("/api/search/", {"q": "pump valve"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["results"])
+        self.assertEqual({r["pdf_id"] for r in response.data["results"]}, {pdf.id})
+
+    def test_search_spans_the_users_documents_only(self):
+        first = self.create_pdf(name="first.pdf", seed=1)
+        second = self.create_pdf(name="second.pdf", seed=2)
+        self.process(first)
+        self.process(second)
+        other_client = self.client_for(User.objects.create_user("other", password="x"))
+        self.process(self.create_pdf(user=User.objects.get(username="other"), name="theirs.pdf", seed=3), other_client)
+
+        response = self.client.get("/api/search/", {"q": "pump valve pressure", "top_k": 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({r["pdf_id"] for r in response.data["results"]}, {first.id, second.id})
+
+    def test_adding_chunks_leaves_searched_shard_untouched(self):
+        self.process(self.create_pdf(name="first.pdf", seed=1))
+        path = user_index._shard_path(self.user.id, 0)
+        shard = user_index._load_shard(path)
+        size = shard.ntotal
+
+        self.process(self.create_pdf(name="second.pdf", seed=2))
+        # A search still holding the old shard sees it unchanged; the next one maps the new file
+        self.assertEqual(shard.ntotal, size)
+        self.assertGreater(user_index._load_shard(path).ntotal, size)
+
+    def test_shard_cache_is_bounded_by_bytes(self):
+        with override_settings(PDF_USER_INDEX_SHARD_SIZE=2, PDF_USER_INDEX_CACHE_BYTES=1):
+            self.process(self.create_pdf(pages=3))
+            response = self.client.get("/api/search/", {"q": "pump valve"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["results"])
+        shards = [p for p in user_index._cache if p.startswith(user_index.user_index_dir(self.user.id))]
+        self.assertEqual(len(shards), 1)
+
+
+class RetrievalTests(TestCase):
+    def test_bm25_ranks_exact_terms(self):
+        index = build_bm25([(0, "pump pressure manual"), (1, "invoice payment terms"), (2, "part PN-01234 valve")])
+        orders, scores = index.search("PN-01234", top_k=3)
+        self.assertEqual(orders, [2])
+        orders, scores = index.search("payment of the invoice", top_k=3)
+        self.assertEqual(orders[0], 1)
+        self.assertEqual(index.search("nothing matches", top_k=3), ([], []))
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60, top_k=3)
+        self.assertEqual(fused, [1, 3, 2])
+
+    def test_pack_context_respects_budget(self):
+        tokenizer = FakeTokenizer()
+        chunks = [("a b c d.", 4), ("e f g.", 3), ("h i. j k l.", 5)]
+        self.assertEqual(pack_context(tokenizer, chunks, 7), "a b c d.\n\ne f g.")
+        # The first chunk that doesn't fit is cut at a sentence boundary
+        self.assertEqual(pack_context(tokenizer, chunks, 9), "a b c d.\n\ne f g.\n\nh i.")
+        # A best chunk without a fitting sentence is cut at the token budget
+        self.assertEqual(pack_context(tokenizer, [("one two three four five", 5)], 3), "one two three")
+
+
+
+class RerankTests(PDFTestCase):
+    candidates = [
+        (0, "invoice payment terms", "h0"),
+        (1, "pump valve pressure manual", "h1"),
+        (2, "pump manual", "h2"),
+        (3, "warranty clause", "h3"),
+    ]
+
+    def test_candidates_are_ordered_by_cross_encoder_score(self):
+        self.assertEqual(rerank.rerank("pump valve manual", self.candidates, top_k=3), [1, 2, 0])
+        # Scores are cached per question and chunk content
+        scored = len(self.reranker.pairs)
+        self.assertEqual(rerank.rerank("Pump valve manual?", self.candidates, top_k=3), [1, 2, 0])
+        self.assertEqual(len(self.reranker.pairs), scored)
+
+    @override_settings(PDF_RERANK_BATCH_SIZE=2, PDF_RERANK_BUDGET_MS=0)
+    def test_unscored_candidates_keep_retrieval_order_after_budget(self):
+        # Only the first batch is scored once the budget is spent
+        self.assertEqual(rerank.rerank("warranty clause", self.candidates, top_k=4), [0, 1, 2, 3])
+        self.assertEqual(len(self.reranker.pairs), 2)
+        self.assertEqual(rerank.rerank("pump manual", self.candidates[::-1], top_k=4), [2, 3, 1, 0])
+
+
+class ContextPackingTests(PDFTestCase):
+    def test_chunk_token_counts_are_stored_at_ingest(self):
+        pdf = self.create_pdf()
+        self.process(pdf)
+        for text, tokens in PDFChunk.objects.filter(pdf=pdf).values_list("chunk_text", "token_count"):
+            self.assertEqual(tokens, len(text.split()))
+
+
+class InlineModelExecutor:
+    # Runs calls on the test's thread, inside its transaction, instead of the pool
+    async def run(self, fn, *args, **kwargs):
+        return await sync_to_async(fn)(*args, **kwargs)
+
+
+class AsyncViewTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        executor = mock.patch.object(async_views, "get_model_executor", InlineModelExecutor)
+        executor.start()
+        self.addCleanup(executor.stop)
+        self.bearer = Client(enforce_csrf_checks=True, HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_ask_with_bearer_token_needs_no_csrf_cookie(self):
+        # Past the CSRF check, the unknown PDF is a 404 (not a 403)
+        response = self.bearer.post("/api/async/ask_pdf/999/", {"question": "pump?"}, content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_ask_and_list_chunks(self):
+        pdf = self.create_pdf()
+        self.process(pdf)
+        with mock.patch.object(async_views, "generate_answer", return_value="Two years.") as generate:
+            response = self.bearer.post(
+                f"/api/async/ask_pdf/{pdf.id}/", {"question": "What is the warranty?"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"answer": "Two years."})
+        self.assertIn("page1", generate.call_args[0][0])
+
+        response = self.bearer.get(f"/api/async/pdf_chunks/{pdf.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), PDFChunk.objects.filter(pdf=pdf).count())
+        self.assertEqual(Client().get(f"/api/async/pdf_chunks/{pdf.id}/").status_code, 401)
+
+
+class FileServingTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.create_pdf()
+        with open(self.pdf.file.path, "rb") as f:
+            self.content = f.read()
+        self.url = f"/api/pdf/{self.pdf.id}/view/"
+        self.bearer = Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_full_download_and_conditional_get(self):
+        response = self.bearer.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+
+        response = self.bearer.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.bearer.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(Client().get(self.url).status_code, 401)
+
+    def test_byte_ranges(self):
+        size = len(self.content)
+        response = self.bearer.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{size}")
+        self.assertEqual(response["Content-Length"], "10")
+
+        # Suffix range
+        response = self.bearer.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-5:])
+
+        response = self.bearer.get(self.url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+    def test_if_range_only_honours_current_copy(self):
+        etag = self.bearer.get(self.url)["ETag"]
+        response = self.bearer.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        # A stale validator gets the whole (changed) file instead
+        response = self.bearer.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    @override_settings(PDF_FILE_OFFLOAD="x-accel")
+    def test_offload_to_proxy(self):
+        response = self.bearer.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.pdf.file.name)
+        self.assertEqual(response.content, b"")
+
+
+class UploadTests(PDFTestCase):
+    def start(self, size=None):
+        data = {"filename": "big.pdf"} if size is None else {"filename": "big.pdf", "size": size}
+        response = self.client.post("/api/uploads/", data, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["upload_id"]
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(
+            f"/api/uploads/{upload_id}/?offset={offset}", data, content_type="application/octet-stream"
+        )
+
+    def test_resume_after_offset_conflict_and_complete(self):
+        with open(self.make_pdf_file(pages=3), "rb") as f:
+            data = f.read()
+        upload_id = self.start(len(data))
+        half = len(data) // 2
+
+        self.assertEqual(self.put(upload_id, 0, data[:half]).data["offset"], half)
+        # A retried part at a stale offset is rejected with the offset to resume from
+        response = self.put(upload_id, 0, data[:half])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], half)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}/").data["offset"], half)
+
+        # Completing early reports where to continue
+        response = self.client.post(f"/api/uploads/{upload_id}/complete/")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], half)
+
+        # The hash is recomputed from disk when the running one was lost (other process, restart)
+        uploads._hashers.clear()
+        self.assertEqual(self.put(upload_id, half, data[half:]).data["offset"], len(data))
+        response = self.client.post(f"/api/uploads/{upload_id}/complete/")
+        self.assertEqual(response.status_code, 200, response.data)
+
+        pdf = PDF.objects.get(id=response.data["pdf_id"])
+        self.assertEqual(pdf.content_hash, hashlib.sha256(data).hexdigest())
+        with pdf.file.open("rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertTrue(ProcessingJob.objects.filter(pdf=pdf, status=ProcessingJob.STATUS_QUEUED).exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp, "uploads")), [])
+        self.assertEqual(self.put(upload_id, len(data), b"x").status_code, 409)
+
+    def test_rejects_oversized_and_non_pdf_uploads(self):
+        upload_id = self.start(4)
+        self.assertEqual(self.put(upload_id, 0, b"12345").status_code, 413)
+        self.assertEqual(self.put(upload_id, 0, b"1234").status_code, 200)
+        response = self.client.post(f"/api/uploads/{upload_id}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Not a PDF file")
+
+    def test_other_users_session_is_not_found(self):
+        upload_id = self.start()
+        other = self.client_for(User.objects.create_user("other", password="x"))
+        response = other.put(f"/api/uploads/{upload_id}/?offset=0", b"%PDF-", content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 404)
+
+    def test_idle_sessions_expire(self):
+        idle = self.start()
+        self.assertEqual(self.put(idle, 0, b"%PDF-1.4 part").status_code, 200)
+        fresh = self.start()
+        UploadSession.objects.filter(id=idle).update(updated_at=timezone.now() - timedelta(days=2))
+        orphan = os.path.join(self.tmp, "uploads", f"{uuid.uuid4()}.part")
+        open(orphan, "wb").close()
+        os.utime(orphan, (0, 0))
+
+        self.assertEqual(call_command_output("expire_uploads"), "Expired 1 upload session(s)")
+        self.assertEqual(UploadSession.objects.get(id=idle).status, UploadSession.STATUS_ABORTED)
+        self.assertEqual(UploadSession.objects.get(id=fresh).status, UploadSession.STATUS_ACTIVE)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tmp, "uploads"))), [f"{fresh}.part"]
+        )
+        # An expired session can't be resumed
+        self.assertEqual(self.put(idle, 13, b"more").status_code, 409)
+
+    def append_with_reader(self, upload_id, data, on_read):
+        class Stream(io.BytesIO):
+            def read(stream, size=-1):
+                on_read()
+                return io.BytesIO.read(stream, size)
+
+        return uploads.append_part(self.user, upload_id, 0, Stream(data), len(data))
+
+    def test_part_is_written_outside_the_session_lock(self):
+        upload_id = self.start()
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def during_read():
+            if seen:
+                return
+            seen.append(len(connection.atomic_blocks))
+            # The offset is reserved: a concurrent part is turned away, as is completing
+            with self.assertRaisesMessage(uploads.UploadError, "Another part is being written"):
+                uploads.append_part(self.user, upload_id, 0, io.BytesIO(b"%PDF-"), 5)
+            self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/complete/").status_code, 409)
+
+        session = self.append_with_reader(upload_id, b"%PDF-1.4 part", during_read)
+        self.assertEqual(seen, [depth])
+        self.assertEqual(session.received, 13)
+        session.refresh_from_db()
+        self.assertEqual((session.received, session.part_writer), (13, None))
+        self.assertEqual(self.put(upload_id, 13, b"more").data["offset"], 17)
+
+    def test_part_does_not_count_if_the_session_changed(self):
+        upload_id = self.start()
+
+        def abort():
+            UploadSession.objects.filter(id=upload_id).update(status=UploadSession.STATUS_ABORTED)
+
+        with self.assertRaisesMessage(uploads.UploadError, "Upload changed while the part was written"):
+            self.append_with_reader(upload_id, b"%PDF-1.4 part", abort)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).received, 0)
+
+    def test_stalled_part_can_be_retried(self):
+        upload_id = self.start()
+        with self.assertRaises(OSError):
+            self.append_with_reader(upload_id, b"%PDF-", mock.Mock(side_effect=OSError("client went away")))
+        self.assertIsNone(UploadSession.objects.get(id=upload_id).part_writer)
+
+        # A writer that died without releasing its reservation blocks others until it times out
+        UploadSession.objects.filter(id=upload_id).update(part_writer=uuid.uuid4(), part_started_at=timezone.now())
+        self.assertEqual(self.put(upload_id, 0, b"%PDF-").status_code, 409)
+        UploadSession.objects.filter(id=upload_id).update(part_started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.put(upload_id, 0, b"%PDF-").data["offset"], 5)
+
+
+
+class MetricsTests(PDFTestCase):
+    def scrape(self, **headers):
+        response = Client().get("/metrics", **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def sample(self, text, name):
+        for line in text.splitlines():
+            if line.startswith(name + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_requests_stages_and_queue_are_exported(self):
+        asked = 'pdf_requests_total{view="ask_pdf",status="200"}'
+        searched = 'pdf_stage_seconds_count{stage="vector_search"}'
+        before = self.scrape()
+
+        self.upload()
+        pdf = self.create_pdf(name="other.pdf", seed=1)
+        self.process(pdf)
+        with mock.patch.object(views, "generate_answer", return_value="Two years."):
+            response = self.client.post(f"/api/ask_pdf/{pdf.id}/", {"question": "warranty?"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        text = self.scrape()
+        self.assertIn("# TYPE pdf_requests counter", text)
+        self.assertIn("# TYPE pdf_stage_seconds histogram", text)
+        self.assertEqual(self.sample(text, asked), self.sample(before, asked) + 1)
+        self.assertEqual(self.sample(text, searched), self.sample(before, searched) + 1)
+        self.assertGreaterEqual(
+            self.sample(text, 'pdf_stage_seconds_bucket{stage="vector_search",le="+Inf"}'), self.sample(text, searched)
+        )
+        # The upload's job is still waiting for a worker
+        self.assertEqual(self.sample(text, 'pdf_job_queue_depth{status="queued"}'), 1)
+
+    @override_settings(PDF_METRICS_TOKEN="s3cret")
+    def test_token_protects_the_endpoint(self):
+        self.assertEqual(Client().get("/metrics").status_code, 401)
+        self.assertEqual(Client().get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertIn("pdf_job_queue_depth", self.scrape(HTTP_AUTHORIZATION="Bearer s3cret"))
+
+
+class InlineProcessPool:
+    # Runs each document in this process (and test transaction) as it is submitted
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+
+class ReindexTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        from .management.commands import reindex_pdfs
+
+        for name, value in (("ProcessPoolExecutor", InlineProcessPool), ("connections", mock.Mock())):
+            patch = mock.patch.object(reindex_pdfs, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.checkpoint = os.path.join(self.tmp, "reindex.json")
+        self.good = self.create_pdf(pages=3)
+        self.broken = PDF.objects.create(user=self.user, file=ContentFile(b"not a pdf", name="broken.pdf"), title="broken.pdf")
+
+    def reindex(self, *args):
+        return call_command_output("reindex_pdfs", "--checkpoint", self.checkpoint, *args)
+
+    def test_dry_run_lists_selection(self):
+        output = self.reindex("--dry-run", "--id", str(self.good.id))
+        self.assertEqual(output.splitlines(), ["1 PDF(s) to reindex (0 already handled)", f"  {self.good.id}"])
+        self.assertFalse(PDFChunk.objects.exists())
+
+    def test_failures_are_checkpointed_and_retried(self):
+        output = self.reindex()
+        self.assertIn("Reindexed 1 PDF(s), 1 failed", output)
+        self.good.refresh_from_db()
+        self.broken.refresh_from_db()
+        self.assertEqual(self.good.processing_status, PDF.PROCESSING_DONE)
+        self.assertTrue(PDFChunk.objects.filter(pdf=self.good, embedding__isnull=False).exists())
+        self.assertEqual(self.broken.processing_status, PDF.PROCESSING_FAILED)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        # A rerun resumes: nothing left unless failures are retried
+        output = self.reindex()
+        self.assertIn("Resuming from", output)
+        self.assertIn("0 PDF(s) to reindex (2 already handled)", output)
+        output = self.reindex("--retry-failed")
+        self.assertIn("1 PDF(s) to reindex (1 already handled)", output)
+        self.assertIn("Reindexed 0 PDF(s), 1 failed", output)
+
+        # Another selection can't reuse the checkpoint
+        with self.assertRaisesMessage(CommandError, "different filters"):
+            self.reindex("--missing-only")
+        self.assertIn("1 PDF(s) to reindex", self.reindex("--missing-only", "--restart"))
+
+    def test_checkpoint_is_removed_after_a_clean_run(self):
+        output = self.reindex("--missing-only", "--id", str(self.good.id))
+        self.assertIn("Reindexed 1 PDF(s), 0 failed", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # Now embedded, so no longer selected
+        self.assertIn("0 PDF(s) to reindex", self.reindex("--missing-only", "--id", str(self.good.id)))
+
+    def test_convert_embeddings_rewrites_rows_in_the_current_dtype(self):
+        self.process(self.good)
+        before = {c.id: embedding_from_bytes(c.embedding, c.embedding_dtype) for c in PDFChunk.objects.all()}
+
+        with override_settings(PDF_EMBEDDING_DTYPE="float16"):
+            output = self.reindex("--convert-embeddings")
+        count = len(before)
+        self.assertIn(f"Converted {count} chunk and {EmbeddingCache.objects.count()} cached embedding(s) to float16", output)
+        for chunk in PDFChunk.objects.all():
+            self.assertEqual(chunk.embedding_dtype, "float16")
+            self.assertEqual(len(chunk.embedding), self.embedder.dim * 2)
+            np.testing.assert_allclose(embedding_from_bytes(chunk.embedding, "float16"), before[chunk.id], atol=1e-3)
+        self.assertFalse(EmbeddingCache.objects.exclude(embedding_dtype="float16").exists())
+        # The broken PDF was not reprocessed
+        self.broken.refresh_from_db()
+        self.assertEqual(self.broken.processing_status, PDF.PROCESSING_PENDING)
+
+
+class QueryEmbeddingCacheTests(PDFTestCase):
+    def test_disk_store_is_shared_but_not_peeked(self):
+        path = os.path.join(self.tmp, "query_embeddings.sqlite3")
+        writer = QueryEmbeddingCache(10, path)
+        reader = QueryEmbeddingCache(10, path)
+        writer.set("model", "Where is the pump?", [1, 2, 3])
+
+        # peek never touches the disk store (it runs on the event loop)
+        self.assertIsNone(reader.peek("model", "where is the pump"))
+        np.testing.assert_array_equal(reader.get("model", "where is the pump"), [1, 2, 3])
+        np.testing.assert_array_equal(reader.peek("model", "Where is the pump?"), [1, 2, 3])
+        self.assertIsNone(reader.get("other-model", "where is the pump"))
+
+        stats = reader.stats()
+        self.assertEqual((stats["hits"], stats["disk_hits"], stats["misses"]), (1, 1, 1))
+
+    def test_repeated_question_is_embedded_once(self):
+        embedder = model_registry._models[model_registry.EMBED_MODEL_NAME]
+        with mock.patch.object(embedder, "encode", wraps=embedder.encode) as encode:
+            for query in ("Pump pressure?", "pump  pressure", "PUMP PRESSURE?"):
+                self.assertEqual(self.client.get("/api/search/", {"q": query}).status_code, 200)
+        self.assertEqual(encode.call_count, 1)
+
+
+    def test_async_ask_embeds_repeated_question_once(self):
+        pdf = self.create_pdf()
+        self.process(pdf)
+        bearer = Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        embedder = model_registry._models[model_registry.EMBED_MODEL_NAME]
+        with mock.patch.object(async_views, "get_model_executor", InlineModelExecutor), \
+                mock.patch.object(async_views, "generate_answer", side_effect=["One.", "Two."]), \
+                mock.patch.object(embedder, "encode", wraps=embedder.encode) as encode:
+            for question in ("Where is the pump?", "Where is the valve?", "where is the pump"):
+                response = bearer.post(
+                    f"/api/async/ask_pdf/{pdf.id}/", {"question": question}, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 200)
+        # The third question is an answer cache hit; the two others were embedded once each
+        self.assertEqual(response.json(), {"answer": "One.", "cached": True})
+        self.assertEqual(encode.call_count, 2)
+
+
+class AskBeforeProcessingTests(PDFTestCase):
+    def ask(self, pdf):
+        with mock.patch.object(views, "generate_answer", return_value="Two years."):
+            return self.client.post(f"/api/ask_pdf/{pdf.id}/", {"question": "warranty?"}, format="json")
+
+    def test_pending_or_queued_pdf_is_not_processed_inline(self):
+        pdf = self.upload()
+        with mock.patch.object(views, "process_pdf_obj", side_effect=AssertionError("processed inline")):
+            response = self.ask(pdf)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data["processing_status"], PDF.PROCESSING_PENDING)
+
+            # A queued retry still belongs to the worker even if the status says otherwise
+            PDF.objects.filter(id=pdf.id).update(processing_status=PDF.PROCESSING_FAILED)
+            self.assertEqual(self.ask(pdf).status_code, 409)
+
+            ProcessingJob.objects.filter(pdf=pdf).update(status=ProcessingJob.STATUS_FAILED)
+            PDF.objects.filter(id=pdf.id).update(processing_error="Could not extract text from PDF")
+            response = self.ask(pdf)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data["error"], "Could not extract text from PDF")
+        self.assertFalse(PDFChunk.objects.exists())
+
+    def test_processed_pdf_without_chunks_is_recovered_inline(self):
+        pdf = self.create_pdf()
+        self.process(pdf)
+        PDFChunk.objects.filter(pdf=pdf).delete()
+        index_store.invalidate_index(pdf)
+
+        response = self.ask(pdf)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(PDFChunk.objects.filter(pdf=pdf).exists())
+
+
+class ExtractionFallbackTests(PDFTestCase):
+    def test_pdf_pypdf2_cannot_open_is_read_with_pdfplumber(self):
+        pdf = self.create_pdf(pages=3)
+        with mock.patch.object(extraction.PyPDF2, "PdfReader", side_effect=ValueError("broken xref")):
+            self.assertEqual(extraction.count_pages(pdf.file.path), 3)
+            with pdf.file.open("rb") as f:
+                pages = list(extraction.iter_pages(f))
+            response = self.process(pdf)
+
+        self.assertEqual([number for number, _ in pages], [1, 2, 3])
+        self.assertTrue(all(text.startswith(f"page{number}") for number, text in pages))
+        self.assertEqual(response.data["pages"], 3)
+        self.assertEqual(
+            list(PDFChunk.objects.filter(pdf=pdf).order_by("order").values_list("page_number", flat=True)),
+            [1, 2, 3],
+        )
@@ -0,0 +1,310 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+from .content import create_pdf
+
+
+# Resumable chunked uploads: init -> append parts (in order, at the offset the
+# server reports) -> complete. Parts are streamed from the request body to a
+# file under PDF_UPLOAD_DIR in blocks; nothing is held in memory whole.
+# The SHA-256 is updated as parts arrive; a session resumed in another
+# process (or after a restart) is rehashed from disk on completion instead.
+# Sessions idle for PDF_UPLOAD_SESSION_TTL are aborted by expire_stale_uploads
+# (run by `manage.py run_workers` and `manage.py expire_uploads`).
+
+_BLOCK_SIZE = 64 * 1024
+
+_hashers = {}  # session id -> (bytes hashed, hasher)
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """
+    A request the upload protocol rejects; `status` is the HTTP status to return.
+    """
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def part_path(session):
+    return os.path.join(settings.PDF_UPLOAD_DIR, f"{session.id}.part")
+
+
+class _PartFile(File):
+    """
+    The assembled upload. temporary_file_path() lets FileSystemStorage move it
+    into place instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def start_upload(user, filename, total_size=None):
+    if not filename.lower().endswith(".pdf"):
+        raise UploadError("Only PDF files allowed")
+    if total_size is not None and total_size <= 0:
+        raise UploadError("File is empty")
+    if total_size is not None and total_size > settings.PDF_UPLOAD_MAX_SIZE:
+        raise UploadError("File too large", status=413)
+
+    os.makedirs(settings.PDF_UPLOAD_DIR, exist_ok=True)
+    _prune_hashers()
+    session = UploadSession.objects.create(user=user, filename=filename, total_size=total_size)
+    open(part_path(session), "wb").close()
+    with _hashers_lock:
+        _hashers[session.id] = (0, hashlib.sha256())
+    return session
+
+
+def _prune_hashers():
+    """
+    Drop running hashes of sessions that are no longer active (e.g. expired
+    by another process), so abandoned uploads don't pin memory here.
+    """
+    with _hashers_lock:
+        ids = list(_hashers)
+    if not ids:
+        return
+    active = set(
+        UploadSession.objects.filter(id__in=ids, status=UploadSession.STATUS_ACTIVE).values_list("id", flat=True)
+    )
+    with _hashers_lock:
+        for session_id in ids:
+            if session_id not in active:
+                _hashers.pop(session_id, None)
+
+
+def _locked_session(user, upload_id):
+    session = UploadSession.objects.select_for_update().filter(id=upload_id, user=user).first()
+    if session is None:
+        raise UploadError("Upload not found", status=404)
+    if session.status != UploadSession.STATUS_ACTIVE:
+        raise UploadError(f"Upload is {session.status}", status=409)
+    return session
+
+
+def _part_in_progress(session):
+    """
+    Whether another request is writing a part of this session. A writer
+    silent for PDF_UPLOAD_PART_TIMEOUT is presumed dead and can be replaced.
+    """
+    if session.part_writer is None:
+        return False
+    cutoff = timezone.now() - timedelta(seconds=settings.PDF_UPLOAD_PART_TIMEOUT)
+    return session.part_started_at is not None and session.part_started_at > cutoff
+
+
+def _release_part(session, token):
+    UploadSession.objects.filter(id=session.id, part_writer=token).update(part_writer=None, part_started_at=None)
+
+
+def _write_part(session, offset, stream, length, hasher):
+    written = 0
+    with open(part_path(session), "r+b") as f:
+        f.seek(offset)
+        f.truncate()
+        while written < length:
+            block = stream.read(min(_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            f.write(block)
+            if hasher is not None:
+                hasher.update(block)
+            written += len(block)
+    return written
+
+
+def append_part(user, upload_id, offset, stream, length):
+    """
+    Write `length` bytes read from `stream` at `offset`, which must equal the
+    bytes received so far (a client resuming after an error asks for the
+    current offset first). Bytes past `offset` from a failed earlier attempt
+    are discarded. Returns the session.
+
+    The session row is only locked to validate and reserve the offset; the
+    part is read from the client outside any transaction and committed with
+    a compare-and-set on (offset, writer), so a slow client holds no lock.
+    """
+    if length is None or length <= 0:
+        raise UploadError("Content-Length required")
+    if length > settings.PDF_UPLOAD_MAX_PART_SIZE:
+        raise UploadError("Part too large", status=413)
+
+    token = uuid.uuid4()
+    with transaction.atomic():
+        session = _locked_session(user, upload_id)
+        if offset != session.received:
+            raise UploadError("Offset mismatch", status=409, offset=session.received)
+        limit = session.total_size or settings.PDF_UPLOAD_MAX_SIZE
+        if session.received + length > limit:
+            raise UploadError("Upload exceeds its size", status=413)
+        if _part_in_progress(session):
+            raise UploadError("Another part is being written", status=409, offset=session.received)
+
+        session.part_writer = token
+        session.part_started_at = timezone.now()
+        session.save(update_fields=["part_writer", "part_started_at", "updated_at"])
+
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(session.id, (None, None))
+    if hashed != offset:
+        hasher = None  # hashed elsewhere or interrupted: rehash from disk at completion
+
+    try:
+        written = _write_part(session, offset, stream, length, hasher)
+    except BaseException:
+        _release_part(session, token)
+        raise
+    if written != length:
+        _release_part(session, token)
+        raise UploadError("Incomplete part", offset=offset)
+
+    # Only counts if the session wasn't aborted, completed or taken over meanwhile
+    updated = UploadSession.objects.filter(
+        id=session.id, status=UploadSession.STATUS_ACTIVE, received=offset, part_writer=token
+    ).update(received=offset + written, part_writer=None, part_started_at=None, updated_at=timezone.now())
+    if not updated:
+        current = UploadSession.objects.filter(id=session.id).values_list("received", flat=True).first()
+        raise UploadError("Upload changed while the part was written", status=409, offset=current)
+
+    session.received = offset + written
+    session.part_writer = session.part_started_at = None
+    if hasher is not None:
+        with _hashers_lock:
+            _hashers[session.id] = (session.received, hasher)
+    return session
+
+
+def _file_hash(session):
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(session.id, (None, None))
+    if hasher is not None and hashed == session.received:
+        return hasher.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(part_path(session), "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(user, upload_id):
+    """
+    Verify the assembled file and register it as a PDF (deduplicated against
+    processed copies, otherwise moved into storage and queued for processing).
+    """
+    with transaction.atomic():
+        session = _locked_session(user, upload_id)
+        if _part_in_progress(session):
+            raise UploadError("A part is still being written", status=409, offset=session.received)
+        if session.received == 0:
+            raise UploadError("File is empty")
+        if session.total_size is not None and session.received != session.total_size:
+            raise UploadError("Upload incomplete", status=409, offset=session.received)
+
+        path = part_path(session)
+        with open(path, "rb") as f:
+            if not f.read(5) == b"%PDF-":
+                raise UploadError("Not a PDF file")
+
+        content_hash = _file_hash(session)
+        with open(path, "rb") as f:
+            pdf_obj = create_pdf(user, _PartFile(f, name=session.filename), session.filename, content_hash)
+
+        session.status = UploadSession.STATUS_COMPLETE
+        session.pdf = pdf_obj
+        session.save(update_fields=["status", "pdf", "updated_at"])
+
+    # Moved into storage, or not needed (deduplicated)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return pdf_obj
+
+
+def abort_upload(user, upload_id):
+    with transaction.atomic():
+        session = _locked_session(user, upload_id)
+        session.status = UploadSession.STATUS_ABORTED
+        session.save(update_fields=["status", "updated_at"])
+
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    return session
+
+
+def expire_stale_uploads(ttl=None):
+    """
+    Abort active sessions that received nothing for `ttl` seconds
+    (PDF_UPLOAD_SESSION_TTL by default) and delete their part files, plus
+    part files left without an active session. Sessions locked by a request,
+    or with a part being written right now, are skipped. Returns the number
+    of sessions aborted.
+    """
+    ttl = settings.PDF_UPLOAD_SESSION_TTL if ttl is None else ttl
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+
+    with transaction.atomic():
+        stale = [
+            session
+            for session in UploadSession.objects.select_for_update(skip_locked=True).filter(
+                status=UploadSession.STATUS_ACTIVE, updated_at__lt=cutoff
+            )
+            if not _part_in_progress(session)
+        ]
+        UploadSession.objects.filter(id__in=[s.id for s in stale]).update(
+            status=UploadSession.STATUS_ABORTED, updated_at=timezone.now()
+        )
+
+    for session in stale:
+        with _hashers_lock:
+            _hashers.pop(session.id, None)
+        try:
+            os.remove(part_path(session))
+        except FileNotFoundError:
+            pass
+
+    # Part files whose session is gone (e.g. deleted with its user)
+    try:
+        names = os.listdir(settings.PDF_UPLOAD_DIR)
+    except FileNotFoundError:
+        names = []
+    orphans = {}
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext != ".part":
+            continue
+        try:
+            orphans[uuid.UUID(stem)] = os.path.join(settings.PDF_UPLOAD_DIR, name)
+        except ValueError:
+            continue
+    active = set(
+        UploadSession.objects.filter(id__in=list(orphans), status=UploadSession.STATUS_ACTIVE).values_list("id", flat=True)
+    )
+    for session_id, path in orphans.items():
+        try:
+            if session_id not in active and os.path.getmtime(path) < time.time() - ttl:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    return len(stale)
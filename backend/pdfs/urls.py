@@ -1,11 +1,25 @@
 from django.urls import path
-from .views import upload_pdf, my_pdfs, view_pdf, process_pdf, pdf_chunks, ask_pdf
+from .views import upload_pdf, my_pdfs, view_pdf, process_pdf, pdf_chunks, ask_pdf, ask_pdf_stream, models_status, generation_stats, cache_stats, search, executor_stats, upload_start, upload_session, upload_complete
+from .async_views import ask_pdf_async, pdf_chunks_async, my_pdfs_async
 
 urlpatterns = [
     path('upload_pdf/', upload_pdf),
+    path('uploads/', upload_start),
+    path('uploads/<uuid:upload_id>/', upload_session),
+    path('uploads/<uuid:upload_id>/complete/', upload_complete),
     path('my_pdfs/', my_pdfs),
     path('pdf/<int:pdf_id>/view/', view_pdf),
     path('pdf/<int:pdf_id>/process/', process_pdf),
     path("pdf_chunks/<int:pdf_id>/", pdf_chunks),
     path("ask_pdf/<int:pdf_id>/", ask_pdf),
+    path("ask_pdf/<int:pdf_id>/stream/", ask_pdf_stream),
+    path("models/status/", models_status),
+    path("generation/stats/", generation_stats),
+    path("cache/stats/", cache_stats),
+    path("search/", search),
+    path("executor/stats/", executor_stats),
+    # Async views for ASGI deployments (pdfchat.asgi)
+    path("async/ask_pdf/<int:pdf_id>/", ask_pdf_async),
+    path("async/pdf_chunks/<int:pdf_id>/", pdf_chunks_async),
+    path("async/my_pdfs/", my_pdfs_async),
 ]
\ No newline at end of file
@@ -0,0 +1,366 @@
+import os
+import json
+import fcntl
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import faiss
+from django.conf import settings
+from django.db.models import Q
+
+from .models import PDF, PDFChunk
+from .embeddings import embeddings_matrix
+from . import retrieval
+
+
+# Per-user ANN index over every chunk of every processed PDF the user can see,
+# for cross-document search. Vectors live in HNSW shards of at most
+# PDF_USER_INDEX_SHARD_SIZE vectors; ids are PDFChunk ids. HNSW can't delete,
+# so chunks that were reprocessed away or deleted stay in the shard as dead
+# entries: search drops them by checking the DB, and shards are rebuilt from
+# their live chunks (in the background indexing path) once too many are dead.
+# Vectors are normalized and searched by inner product (cosine), like the
+# per-PDF indexes; a manifest written for another metric is rebuilt.
+# Searches use memory-mapped, read-only shards from a cache bounded by
+# PDF_USER_INDEX_CACHE_BYTES. Writers never touch a cached shard (HNSW can't
+# be modified while it is searched): they add to a private copy, write it
+# out and replace the file, and the next search maps the new one.
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_user_locks = {}
+_user_locks_lock = threading.Lock()
+
+
+def user_index_dir(user_id):
+    return os.path.join(settings.MEDIA_ROOT, "indexes", f"user_{user_id}")
+
+
+def _manifest_path(user_id):
+    return os.path.join(user_index_dir(user_id), "manifest.json")
+
+
+def _shard_path(user_id, shard):
+    return os.path.join(user_index_dir(user_id), f"shard_{shard}.faiss")
+
+
+def _read_manifest(user_id):
+    """
+    The user's manifest, or None if there is none or it was written for another metric.
+    """
+    try:
+        with open(_manifest_path(user_id)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("metric") == retrieval.METRIC else None
+
+
+def _write_manifest(user_id, manifest):
+    path = _manifest_path(user_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _locked(user_id):
+    """
+    Serialize writers to one user's index across threads (lock object) and
+    processes (flock on a lock file).
+    """
+    with _user_locks_lock:
+        lock = _user_locks.setdefault(user_id, threading.Lock())
+    os.makedirs(user_index_dir(user_id), exist_ok=True)
+    with lock:
+        with open(os.path.join(user_index_dir(user_id), ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _new_shard(dim):
+    return retrieval.new_index(
+        "hnsw", dim,
+        hnsw_m=settings.PDF_USER_INDEX_HNSW_M,
+        hnsw_ef_construction=settings.PDF_USER_INDEX_HNSW_EF_CONSTRUCTION,
+    )
+
+
+def _load_shard(path):
+    """
+    Shared read-only shard for searching; it is never modified.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(path)
+            return cached[1]
+
+    shard = retrieval.read_index(path)
+    with _cache_lock:
+        _cache[path] = (version, shard)
+        _cache.move_to_end(path)
+        # Evict least recently used shards past the byte budget (always keep this one)
+        while len(_cache) > 1 and sum(v[1] for v, _ in _cache.values()) > settings.PDF_USER_INDEX_CACHE_BYTES:
+            _cache.popitem(last=False)
+    return shard
+
+
+def _copy_shard(path):
+    """
+    Private, writable copy of a shard for adding vectors to.
+    """
+    return retrieval.read_index(path, mmap=False)
+
+
+def _save_shard(path, shard):
+    tmp_path = f"{path}.tmp"
+    retrieval.write_index(shard, tmp_path)
+    os.replace(tmp_path, path)
+    with _cache_lock:
+        _cache.pop(path, None)
+
+
+def _shard_ids(shard):
+    return faiss.vector_to_array(shard.id_map)
+
+
+def visible_owner_ids(user_id):
+    """
+    {content owner pdf id: the user's pdf id} for the user's PDFs.
+    Visibility follows the chunk rows: a PDF's chunks exist only once processed.
+    """
+    rows = PDF.objects.filter(user_id=user_id).values_list(
+        "id", "content_source_id"
+    )
+    owners = {}
+    for pdf_id, source_id in rows:
+        owners.setdefault(source_id or pdf_id, pdf_id)
+    return owners
+
+
+def _live_chunk_ids(user_id, ids):
+    owners = visible_owner_ids(user_id)
+    return set(
+        PDFChunk.objects.filter(id__in=[int(i) for i in ids], pdf_id__in=list(owners)).values_list("id", flat=True)
+    )
+
+
+def _compact(user_id, manifest, shard_no):
+    """
+    Rebuild a shard from its live chunks only.
+    """
+    path = _shard_path(user_id, shard_no)
+    ids = _shard_ids(_load_shard(path))
+    live = sorted(_live_chunk_ids(user_id, ids))
+
+    rows = list(
+        PDFChunk.objects.filter(id__in=live, embedding__isnull=False)
+        .order_by("id")
+        .values_list("id", "embedding", "embedding_dtype")
+    )
+    if rows:
+        matrix = embeddings_matrix([emb for _, emb, _ in rows], [dtype for _, _, dtype in rows])
+        shard = _new_shard(matrix.shape[1])
+        retrieval.add_vectors(shard, matrix, [i for i, _, _ in rows])
+        _save_shard(path, shard)
+        size = len(rows)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size = 0
+
+    manifest["shards"][shard_no] = {"size": size}
+
+
+def add_chunks(user_id, chunk_ids, embeddings):
+    """
+    Append chunk vectors to the user's index (ids already indexed are skipped).
+    """
+    if len(chunk_ids) == 0:
+        return 0
+
+    with _locked(user_id):
+        manifest = _read_manifest(user_id) or {
+            "metric": retrieval.METRIC, "dim": int(embeddings.shape[1]), "shards": [],
+        }
+        if not any(meta["size"] for meta in manifest["shards"]):
+            # Nothing indexed yet (e.g. the empty manifest ensure_user_index writes
+            # for a user without processed PDFs): the first batch sets the dim
+            manifest["dim"] = int(embeddings.shape[1])
+        if manifest["dim"] != embeddings.shape[1]:
+            raise ValueError(f"Embedding dim {embeddings.shape[1]} != user index dim {manifest['dim']}")
+
+        known = set()
+        for shard_no, meta in enumerate(manifest["shards"]):
+            if meta["size"]:
+                known.update(_shard_ids(_load_shard(_shard_path(user_id, shard_no))).tolist())
+
+        ids = np.asarray(chunk_ids, dtype="int64")
+        fresh = np.array([i not in known for i in ids.tolist()], dtype=bool)
+        ids, vectors = ids[fresh], retrieval.normalize(embeddings[fresh])
+
+        added = 0
+        capacity = settings.PDF_USER_INDEX_SHARD_SIZE
+        while added < len(ids):
+            if not manifest["shards"] or manifest["shards"][-1]["size"] >= capacity:
+                manifest["shards"].append({"size": 0})
+            shard_no = len(manifest["shards"]) - 1
+            meta = manifest["shards"][shard_no]
+            path = _shard_path(user_id, shard_no)
+
+            shard = _copy_shard(path) if meta["size"] else _new_shard(manifest["dim"])
+            take = min(capacity - meta["size"], len(ids) - added)
+            retrieval.add_vectors(shard, vectors[added:added + take], ids[added:added + take])
+            _save_shard(path, shard)
+            meta["size"] += take
+            added += take
+
+        _write_manifest(user_id, manifest)
+    return added
+
+
+def index_document(user_id, owner_pdf_id):
+    """
+    Add a processed document's chunks to a user's index.
+    """
+    rows = list(
+        PDFChunk.objects.filter(pdf_id=owner_pdf_id, embedding__isnull=False)
+        .order_by("order")
+        .values_list("id", "embedding", "embedding_dtype")
+    )
+    if not rows:
+        return 0
+    matrix = embeddings_matrix([emb for _, emb, _ in rows], [dtype for _, _, dtype in rows])
+    return add_chunks(user_id, [i for i, _, _ in rows], matrix)
+
+
+def index_document_for_all_users(owner_pdf):
+    """
+    Called when a document finishes processing: update the index of every
+    user that has this content (the owner and users with duplicate uploads),
+    then compact shards that collected too many dead entries.
+    """
+    user_ids = set(
+        PDF.objects.filter(Q(id=owner_pdf.id) | Q(content_source=owner_pdf)).values_list("user_id", flat=True)
+    )
+    for user_id in user_ids:
+        # An index from before the current metric is rebuilt whole (this document included)
+        ensure_user_index(user_id)
+        index_document(user_id, owner_pdf.id)
+        compact_if_needed(user_id)
+
+
+def ensure_user_index(user_id):
+    """
+    Build the user's index from scratch if it doesn't exist yet (e.g. PDFs
+    processed before it existed) or was built for another metric.
+    """
+    if _read_manifest(user_id) is not None:
+        return
+    for owner_id in visible_owner_ids(user_id):
+        index_document(user_id, owner_id)
+    if _read_manifest(user_id) is None:
+        with _locked(user_id):
+            _write_manifest(user_id, {"metric": retrieval.METRIC, "dim": 0, "shards": []})
+
+
+def search(user_id, query_vec, top_k=10):
+    """
+    Top-k chunks across all of the user's processed PDFs.
+    Returns a list of dicts with pdf_id (the user's own PDF), title, chunk_id,
+    order, page_number, chunk_text and score (cosine similarity).
+    """
+    manifest = _read_manifest(user_id)
+    if not manifest or not manifest["shards"]:
+        return []
+
+    fetch = top_k * 2  # headroom for dead entries
+    scores = []
+    ids = []
+    for shard_no, meta in enumerate(manifest["shards"]):
+        if not meta["size"]:
+            continue
+        shard = _load_shard(_shard_path(user_id, shard_no))
+        shard_ids, shard_scores = retrieval.search(
+            shard, query_vec, fetch, ef_search=max(settings.PDF_USER_INDEX_HNSW_EF_SEARCH, fetch)
+        )[0]
+        scores.extend(shard_scores)
+        ids.extend(shard_ids)
+
+    if not ids:
+        return []
+    scores = np.asarray(scores, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    ranked = np.argsort(-scores, kind="stable")
+
+    chunks = PDFChunk.objects.filter(id__in=[int(ids[r]) for r in ranked]).in_bulk()
+
+    # Map content owners back to the user's own PDFs (drops dead/foreign chunks)
+    owner_ids = {c.pdf_id for c in chunks.values()}
+    owners = {}
+    titles = {}
+    rows = PDF.objects.filter(user_id=user_id).filter(
+        Q(id__in=owner_ids) | Q(content_source_id__in=owner_ids)
+    ).values_list("id", "content_source_id", "title")
+    for pdf_id, source_id, title in rows:
+        owners.setdefault(source_id or pdf_id, pdf_id)
+        titles[pdf_id] = title
+
+    results = []
+    seen = set()
+    for r in ranked:
+        chunk = chunks.get(int(ids[r]))
+        if chunk is None or chunk.id in seen or chunk.pdf_id not in owners:
+            continue
+        seen.add(chunk.id)
+        pdf_id = owners[chunk.pdf_id]
+        results.append({
+            "pdf_id": pdf_id,
+            "title": titles.get(pdf_id),
+            "chunk_id": chunk.id,
+            "order": chunk.order,
+            "page_number": chunk.page_number,
+            "chunk_text": chunk.chunk_text,
+            "score": float(scores[r]),
+        })
+        if len(results) >= top_k:
+            break
+    return results
+
+
+def compact_if_needed(user_id):
+    """
+    Rebuild shards once the dead fraction of the user's index exceeds
+    PDF_USER_INDEX_MAX_DEAD_RATIO. The overall ratio is estimated with one
+    COUNT query; only then are shards checked one by one.
+    """
+    with _locked(user_id):
+        manifest = _read_manifest(user_id)
+        if not manifest:
+            return
+        indexed = sum(meta["size"] for meta in manifest["shards"])
+        if not indexed:
+            return
+        live = PDFChunk.objects.filter(pdf_id__in=list(visible_owner_ids(user_id))).count()
+        if 1 - live / indexed <= settings.PDF_USER_INDEX_MAX_DEAD_RATIO:
+            return
+
+        for shard_no, meta in enumerate(manifest["shards"]):
+            if not meta["size"]:
+                continue
+            ids = _shard_ids(_load_shard(_shard_path(user_id, shard_no)))
+            dead = len(ids) - len(_live_chunk_ids(user_id, ids))
+            if dead / len(ids) > settings.PDF_USER_INDEX_MAX_DEAD_RATIO:
+                _compact(user_id, manifest, shard_no)
+        _write_manifest(user_id, manifest)
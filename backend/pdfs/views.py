@@ -1,128 +1,126 @@
 from django.shortcuts import get_object_or_404
-from django.core.files.base import ContentFile
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
+from django.conf import settings
+from django.db.models import Q
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from .models import PDF, PDFChunk, UploadSession
+from .embeddings import (
+    chunk_hash,
+    embedding_dtype,
+    embedding_from_bytes,
+    embeddings_to_bytes,
+    load_cached_embeddings,
+    store_cached_embeddings,
+)
+from .content import hash_uploaded_file, create_pdf
+from .jobs import has_active_job
+from .uploads import UploadError, start_upload, append_part, complete_upload, abort_upload
+from .auth import authenticate_bearer
+from .file_serving import serve_file
+from .extraction import count_pages, iter_pages
+from .index_store import (
+    extend_index, finish_index, save_index, invalidate_index, load_index, search_index, save_lexical_index, load_lexical_index,
+)
+from .bm25 import BM25Builder, reciprocal_rank_fusion
+from .rerank import rerank, get_score_cache
+from .context import count_tokens, pack_context
+from .chunking import iter_chunks
+from . import user_index
+from .metrics import span, timed_view, record_ingestion, render as render_metrics
 
-from .models import PDF, PDFChunk
-
-import PyPDF2
-import pdfplumber
 import numpy as np
-import faiss
-import json
-import torch
+import hmac
+import itertools
+import threading
+import time
 
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from .model_registry import embed_model_key, get_embed_model, get_llm_tokenizer, model_stats
+from .cache import AnswerCache, get_answer_cache, get_query_embedding_cache
+from .executor import get_model_executor
+from .generation import generate_answer, get_batcher, stream_answer_events, astream_answer_events, sse_event
 
 
-# ---------------- Model Loading (runs on server startup) ----------------
+# ---------------- Utility Functions ----------------
 
-embed_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+def _local_path(file_obj):
+    try:
+        return file_obj.path if hasattr(file_obj, "path") else None
+    except (NotImplementedError, ValueError):
+        return None
 
-llm_model_name = "google/flan-t5-small"
-tokenizer = AutoTokenizer.from_pretrained(llm_model_name)
-llm_model = AutoModelForSeq2SeqLM.from_pretrained(llm_model_name)
-device = "cuda" if torch.cuda.is_available() else "cpu"
-llm_model = llm_model.to(device)
 
+def count_pdf_pages(file_obj):
+    path = _local_path(file_obj)
+    if path:
+        return count_pages(path)
 
-# ---------------- Utility Functions ----------------
-
-def extract_text_from_pdf(file_obj) -> str:
-    """
-    Extract text from a PDF file using:
-    1) PyPDF2 (fast, works for many)
-    2) pdfplumber fallback (better for some PDFs)
-    Returns "" if nothing extracted.
-    """
-    # 1) Try PyPDF2
+    f = file_obj.open("rb") if hasattr(file_obj, "open") else file_obj
     try:
-        f = file_obj.open("rb") if hasattr(file_obj, "open") else file_obj
-        reader = PyPDF2.PdfReader(f)
-        parts = []
-        for page in reader.pages:
-            t = page.extract_text()
-            if t:
-                parts.append(t)
-
+        return count_pages(f)
+    finally:
         if hasattr(file_obj, "open"):
             f.close()
 
-        merged = "\n".join(parts).strip()
-        if merged:
-            return merged
-    except Exception as e:
-        print("PyPDF2 error:", e)
 
-    # 2) Fallback to pdfplumber
-    try:
-        f = file_obj.open("rb") if hasattr(file_obj, "open") else file_obj
-        parts = []
-        with pdfplumber.open(f) as pdf:
-            for page in pdf.pages:
-                t = page.extract_text()
-                if t:
-                    parts.append(t)
+def iter_pages_from_pdf(file_obj, page_count=None):
+    """
+    Yield (page_number, text) for each page, in order.
+    Each page is read with PyPDF2 (fast, works for many) and only pages where
+    it finds nothing fall back to pdfplumber (better for some PDFs); when
+    PyPDF2 can't open the file at all, pdfplumber reads every page.
+    Page ranges are extracted in parallel (PDF_EXTRACT_WORKERS processes)
+    when the file is on local disk.
+    """
+    path = _local_path(file_obj)
+    if path:
+        yield from iter_pages(
+            path,
+            workers=settings.PDF_EXTRACT_WORKERS,
+            pages_per_task=settings.PDF_EXTRACT_PAGES_PER_TASK,
+            page_count=page_count,
+        )
+        return
 
+    f = file_obj.open("rb") if hasattr(file_obj, "open") else file_obj
+    try:
+        yield from iter_pages(f, page_count=page_count)
+    finally:
         if hasattr(file_obj, "open"):
             f.close()
 
-        return "\n".join(parts).strip()
-    except Exception as e:
-        print("pdfplumber error:", e)
 
-    return ""
-
-
-def chunk_text(text: str, chunk_size: int = 200, overlap: int = 40):
+def extract_pages_from_pdf(file_obj):
     """
-    Word-based overlapping chunking.
-    chunk_size and overlap are in WORDS.
+    Extract text per page as a list of (page_number, text).
+    Returns [] if the file can't be read.
     """
-    words = text.split()
-    if not words:
+    try:
+        return list(iter_pages_from_pdf(file_obj))
+    except Exception as e:
+        print("PDF extraction error:", e)
         return []
 
-    step = max(chunk_size - overlap, 1)
-    chunks = []
-    for i in range(0, len(words), step):
-        chunk = " ".join(words[i:i + chunk_size]).strip()
-        if chunk:
-            chunks.append(chunk)
-    return chunks
-
 
-def vector_search(query_vec, chunk_embeds, top_k=5):
+def extract_text_from_pdf(file_obj) -> str:
     """
-    FAISS L2 search.
-    chunk_embeds: list[np.array(float32)] with same dimension
+    Extract the whole text of a PDF (pages joined by newlines).
+    Returns "" if nothing extracted.
     """
-    if len(chunk_embeds) == 0:
-        return [], []
-
-    dim = chunk_embeds[0].shape[0]
-    index = faiss.IndexFlatL2(dim)
-
-    embeddings_np = np.array(chunk_embeds, dtype="float32")
-    index.add(embeddings_np)
-
-    top_k = min(top_k, len(chunk_embeds))
-    distances, indices = index.search(np.array([query_vec], dtype="float32"), top_k)
-    return indices[0], distances[0]
+    return "\n".join(t for _, t in extract_pages_from_pdf(file_obj) if t).strip()
 
 
 # ---------------- API Endpoints ----------------
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@timed_view("upload_pdf")
 def upload_pdf(request):
     file = request.FILES.get("file")
 
@@ -132,112 +130,335 @@ def upload_pdf(request):
         return Response({"error": "Only PDF files allowed"}, status=400)
 
     try:
-        file.seek(0)
-        file_content = file.read()
-        if not file_content:
+        if not file.size:
             return Response({"error": "File is empty"}, status=400)
 
-        pdf_file = ContentFile(file_content, name=file.name)
-        pdf_obj = PDF.objects.create(
-            user=request.user,
-            file=pdf_file,
-            title=file.name,
-            processing_status=PDF.PROCESSING_PENDING,
-        )
+        content_hash = hash_uploaded_file(file)
+        pdf_obj = create_pdf(request.user, file, file.name, content_hash)
 
-        # Kick off background processing to avoid long upload timeouts
-        import threading
-
-        def _bg_process(pdf_id):
-            try:
-                # fetch up-to-date object
-                p = PDF.objects.get(id=pdf_id)
-                p.processing_status = PDF.PROCESSING_RUNNING
-                p.processing_error = None
-                p.save()
-
-                success, payload = process_pdf_obj(p)
-                if success:
-                    p.processing_status = PDF.PROCESSING_DONE
-                    p.processing_error = None
-                    from django.utils import timezone
-                    p.processed_at = timezone.now()
-                    p.save()
-                else:
-                    p.processing_status = PDF.PROCESSING_FAILED
-                    p.processing_error = payload.get("error")
-                    p.save()
-            except Exception as e:
-                try:
-                    p = PDF.objects.get(id=pdf_id)
-                    p.processing_status = PDF.PROCESSING_FAILED
-                    p.processing_error = str(e)
-                    p.save()
-                except Exception:
-                    pass
-
-        t = threading.Thread(target=_bg_process, args=(pdf_obj.id,), daemon=True)
-        t.start()
-
-        return Response({
-            "message": "PDF uploaded. Processing started",
-            "pdf_id": pdf_obj.id,
-            "file_url": f"/api/pdf/{pdf_obj.id}/view/",
-            "chunks_url": f"/api/pdf_chunks/{pdf_obj.id}/",
-            "ask_url": f"/api/ask_pdf/{pdf_obj.id}/",
-        })
+        return Response(_upload_response(pdf_obj))
     except Exception as e:
         return Response({"error": f"Upload failed: {str(e)}"}, status=500)
 
 
-def process_pdf_obj(pdf_obj):
+def _upload_response(pdf_obj):
+    # Identical whether or not the content was deduplicated against another user's upload
+    return {
+        "message": "PDF uploaded. Processing started",
+        "pdf_id": pdf_obj.id,
+        "file_url": f"/api/pdf/{pdf_obj.id}/view/",
+        "chunks_url": f"/api/pdf_chunks/{pdf_obj.id}/",
+        "ask_url": f"/api/ask_pdf/{pdf_obj.id}/",
+    }
+
+
+def _upload_session_data(session):
+    return {
+        "upload_id": str(session.id),
+        "filename": session.filename,
+        "status": session.status,
+        "offset": session.received,
+        "total_size": session.total_size,
+        "max_part_size": settings.PDF_UPLOAD_MAX_PART_SIZE,
+    }
+
+
+def _upload_error(e):
+    return Response({"error": str(e), **e.extra}, status=e.status)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_start(request):
     """
-    Core processing logic for a PDF object:
-    Extract text -> chunk -> embed -> save in DB.
-    Returns (success: bool, payload: dict) where payload contains message or error and optional status.
+    Start a resumable chunked upload.
+    Body: {"filename": "doc.pdf", "size": <total bytes, optional>}
+    Then PUT the bytes in order to /api/uploads/<upload_id>/?offset=<n>
+    (raw body, application/octet-stream) and POST .../complete/.
     """
+    filename = str(request.data.get("filename", "")).strip()
+    size = request.data.get("size")
     try:
-        text = extract_text_from_pdf(pdf_obj.file)
-        if not text:
-            return False, {"error": "Could not extract text from PDF", "status": 400}
+        size = int(size) if size is not None else None
+        session = start_upload(request.user, filename, size)
+    except ValueError:
+        return Response({"error": "size must be an integer"}, status=400)
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(_upload_session_data(session), status=201)
 
-        chunks = chunk_text(text, chunk_size=200, overlap=40)
-        if not chunks:
-            return False, {"error": "No chunks created from extracted text", "status": 400}
 
-        # Clear old chunks
-        PDFChunk.objects.filter(pdf=pdf_obj).delete()
+@api_view(["GET", "PUT", "DELETE"])
+@permission_classes([IsAuthenticated])
+def upload_session(request, upload_id):
+    """
+    GET: current offset (where to resume). PUT ?offset=<n>: append the request
+    body as the next part. DELETE: abort the upload.
+    """
+    try:
+        if request.method == "GET":
+            session = UploadSession.objects.filter(id=upload_id, user=request.user).first()
+            if session is None:
+                return Response({"error": "Upload not found"}, status=404)
+            return Response(_upload_session_data(session))
+
+        if request.method == "DELETE":
+            return Response(_upload_session_data(abort_upload(request.user, upload_id)))
+
+        try:
+            offset = int(request.query_params.get("offset", ""))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return Response({"error": "offset and Content-Length must be integers"}, status=400)
+        # Read the raw body stream in blocks (request.data / request.body would buffer it)
+        session = append_part(request.user, upload_id, offset, request.stream, length)
+        return Response(_upload_session_data(session))
+    except UploadError as e:
+        return _upload_error(e)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_complete(request, upload_id):
+    """
+    Finish a chunked upload: the file is registered and processing is queued.
+    """
+    try:
+        pdf_obj = complete_upload(request.user, upload_id)
+    except UploadError as e:
+        return _upload_error(e)
+    except Exception as e:
+        return Response({"error": f"Upload failed: {str(e)}"}, status=500)
+    return Response(_upload_response(pdf_obj))
 
-        # Save new chunks
-        created = 0
-        for i, chunk_text_content in enumerate(chunks):
-            try:
-                embedding = embed_model.encode(chunk_text_content).tolist()
-            except Exception as e:
-                return False, {"error": f"Embedding generation failed: {str(e)}", "status": 500}
 
-            PDFChunk.objects.create(
+def _timed(iterable, timings, key):
+    """
+    Pass items through, adding the time spent producing them to timings[key].
+    """
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - started
+            return
+        timings[key] += time.perf_counter() - started
+        yield item
+
+
+def _embed_chunk_batch(pdf_obj, batch, first_order, reusable, counts):
+    """
+    Embed and store one batch of (chunk_text, page_number), reusing what we can:
+    1) an old chunk of this PDF with the same content hash keeps its row and
+       embedding (only order/page_number are updated),
+    2) otherwise the embedding comes from EmbeddingCache,
+    3) otherwise the text is encoded (and added to the cache).
+    `reusable` maps content hash -> ids of old chunks not yet reused.
+    Returns the batch's embeddings as an (n x dim) float32 matrix.
+    """
+    hashes = [chunk_hash(text) for text, _ in batch]
+
+    reused = {}  # position in batch -> old chunk id
+    for i, h in enumerate(hashes):
+        ids = reusable.get(h)
+        if ids:
+            reused[i] = ids.pop()
+
+    vectors = [None] * len(batch)
+    if reused:
+        old = PDFChunk.objects.in_bulk(list(reused.values()))
+        for i, chunk_id in reused.items():
+            vectors[i] = embedding_from_bytes(old[chunk_id].embedding, old[chunk_id].embedding_dtype)
+            old[chunk_id].order = first_order + i
+            old[chunk_id].page_number = batch[i][1]
+        PDFChunk.objects.bulk_update(old.values(), ["order", "page_number"])
+
+    missing = [i for i in range(len(batch)) if vectors[i] is None]
+    cached = load_cached_embeddings(embed_model_key(), [hashes[i] for i in missing])
+    to_encode = []
+    for i in missing:
+        if hashes[i] in cached:
+            vectors[i] = cached[hashes[i]]
+        else:
+            to_encode.append(i)
+
+    if to_encode:
+        try:
+            encoded = get_embed_model().encode(
+                [batch[i][0] for i in to_encode],
+                batch_size=settings.PDF_EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+            ).astype("float32")
+        except Exception as e:
+            raise RuntimeError(f"Embedding generation failed: {str(e)}")
+        store_cached_embeddings(embed_model_key(), [hashes[i] for i in to_encode], encoded)
+        for row, i in enumerate(to_encode):
+            vectors[i] = encoded[row]
+
+    embeddings = np.vstack(vectors).astype("float32")
+    dtype = embedding_dtype()
+    stored = embeddings_to_bytes(embeddings, dtype)
+    token_counts = count_tokens(get_llm_tokenizer(), [batch[i][0] for i in missing])
+    PDFChunk.objects.bulk_create(
+        [
+            PDFChunk(
                 pdf=pdf_obj,
-                chunk_text=chunk_text_content,
-                embedding=embedding,
-                order=i,
-                page_number=None,  # real page numbers require page-based extraction
+                chunk_text=batch[i][0],
+                embedding=stored[i],
+                embedding_dtype=dtype.name,
+                order=first_order + i,
+                page_number=batch[i][1],
+                content_hash=hashes[i],
+                token_count=tokens,
             )
-            created += 1
+            for i, tokens in zip(missing, token_counts)
+        ]
+    )
+
+    counts["reused"] += len(reused)
+    counts["cached"] += len(missing) - len(to_encode)
+    counts["encoded"] += len(to_encode)
+    return embeddings
+
+
+def process_pdf_obj(pdf_obj, heartbeat=None):
+    """
+    Core processing logic for a PDF object, as a streaming pipeline:
+    pages are extracted lazily, fed through a rolling word window into
+    overlapping chunks, embedded in fixed-size batches and written to the DB
+    (and the search index) batch by batch, so memory stays bounded for very
+    large PDFs. pages_processed / chunks_processed on the PDF show progress.
+    Reprocessing is incremental: unchanged chunks keep their rows and
+    embeddings, and only text not seen before is encoded.
+    A PDF that shares content with another one processes the shared copy.
+    `heartbeat()`, if given, is called after every batch (the job queue uses
+    it to show the job is still alive).
+    Returns (success: bool, payload: dict) where payload contains message or error and optional status.
+    On success the payload also has per-stage timings in seconds.
+    """
+    pdf_obj = pdf_obj.content_owner
+    try:
+        timings = {"extract": 0.0, "chunk": 0.0, "embed": 0.0, "persist": 0.0}
+
+        try:
+            page_count = count_pdf_pages(pdf_obj.file)
+        except Exception as e:
+            return False, {"error": f"Could not read PDF: {str(e)}", "status": 400}
+
+        # Old chunks stay until the new set is known; the ones not reused are dropped at the end.
+        # The old indexes keep serving questions until the new ones replace them.
+        reusable = {}
+        for chunk_id, content_hash in PDFChunk.objects.filter(
+            pdf=pdf_obj, content_hash__isnull=False, embedding__isnull=False
+        ).values_list("id", "content_hash"):
+            reusable.setdefault(content_hash, []).append(chunk_id)
+        PDFChunk.objects.filter(pdf=pdf_obj).filter(
+            Q(content_hash__isnull=True) | Q(embedding__isnull=True)
+        ).delete()
+        PDF.objects.filter(id=pdf_obj.id).update(page_count=page_count, pages_processed=0, chunks_processed=0)
+
+        progress = {"page": 0}
+
+        def _track(pages):
+            for page in pages:
+                progress["page"] = page[0]
+                yield page
+
+        pages = _track(_timed(iter_pages_from_pdf(pdf_obj.file, page_count), timings, "extract"))
+        chunks = _timed(iter_chunks(pages, chunk_size=200, overlap=40), timings, "chunk")
+
+        index = None
+        lexical = BM25Builder()
+        created = 0
+        counts = {"reused": 0, "cached": 0, "encoded": 0}
+        started_at = time.perf_counter()
+        try:
+            while True:
+                batch = list(itertools.islice(chunks, settings.PDF_PIPELINE_BATCH_CHUNKS))
+                if not batch:
+                    break
+
+                started = time.perf_counter()
+                embeddings = _embed_chunk_batch(pdf_obj, batch, created, reusable, counts)
+                timings["embed"] += time.perf_counter() - started
+
+                started = time.perf_counter()
+                index = extend_index(index, embeddings, range(created, created + len(batch)))
+                for i, (text, _) in enumerate(batch):
+                    lexical.add(created + i, text)
+                created += len(batch)
+                PDF.objects.filter(id=pdf_obj.id).update(
+                    pages_processed=progress["page"], chunks_processed=created
+                )
+                timings["persist"] += time.perf_counter() - started
+                if heartbeat is not None:
+                    heartbeat()
+
+            # Chunks that no longer exist in the new version
+            stale = [chunk_id for ids in reusable.values() for chunk_id in ids]
+            if stale:
+                PDFChunk.objects.filter(id__in=stale).delete()
+        except Exception:
+            # Don't leave a half-written document behind (embeddings stay in EmbeddingCache)
+            PDFChunk.objects.filter(pdf=pdf_obj).delete()
+            invalidate_index(pdf_obj)
+            raise
+
+        # chunk time was measured around the page iterator too
+        timings["chunk"] = max(timings["chunk"] - timings["extract"], 0.0)
 
-        return True, {"message": "PDF processed successfully", "chunks_created": created}
+        if created == 0:
+            invalidate_index(pdf_obj)
+            return False, {"error": "Could not extract text from PDF", "status": 400}
+
+        # Persist the search indexes so ask_pdf doesn't rebuild them per question
+        started = time.perf_counter()
+        save_index(pdf_obj, finish_index(index))
+        save_lexical_index(pdf_obj, lexical.build(k1=settings.PDF_BM25_K1, b=settings.PDF_BM25_B))
+        PDF.objects.filter(id=pdf_obj.id).update(pages_processed=page_count)
+        try:
+            user_index.index_document_for_all_users(pdf_obj)
+        except Exception as e:
+            # Cross-document search catches up on the next search (ensure_user_index) or reprocess
+            print(f"User index update failed for PDF {pdf_obj.id}:", e)
+        timings["persist"] += time.perf_counter() - started
+
+        total = time.perf_counter() - started_at
+        print(
+            f"Processed PDF {pdf_obj.id}: {page_count} pages, {created} chunks "
+            f"({counts['reused']} reused, {counts['cached']} from cache, {counts['encoded']} encoded) in {total:.2f}s "
+            f"({page_count / total if total else 0:.1f} pages/s, {created / total if total else 0:.1f} chunks/s) "
+            + " ".join(f"{k}={v:.2f}s" for k, v in timings.items())
+        )
+
+        payload = {
+            "message": "PDF processed successfully",
+            "pages": page_count,
+            "chunks_created": created,
+            "chunks_reused": counts["reused"],
+            "embeddings_from_cache": counts["cached"],
+            "embeddings_computed": counts["encoded"],
+            "timings": {k: round(v, 4) for k, v in timings.items()},
+        }
+        record_ingestion(payload)
+        return True, payload
     except Exception as e:
         return False, {"error": f"Processing failed: {str(e)}", "status": 500}
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@timed_view("process_pdf")
 def process_pdf(request, pdf_id):
     """
     Wrapper view around process_pdf_obj
     """
     try:
-        pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user)
+        # A duplicate upload reprocesses the shared copy: its status and processed_at
+        # (part of the answer cache scope) are the ones that change
+        pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user).content_owner
         # mark running
         pdf_obj.processing_status = PDF.PROCESSING_RUNNING
         pdf_obj.processing_error = None
@@ -273,7 +494,7 @@ def pdf_chunks(request, pdf_id):
     """
     try:
         pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user)
-        chunks = PDFChunk.objects.filter(pdf=pdf_obj).order_by("order")
+        chunks = PDFChunk.objects.filter(pdf=pdf_obj.content_owner).order_by("order")
 
         data = [
             {"id": c.id, "chunk_text": c.chunk_text, "order": c.order, "page_number": c.page_number}
@@ -295,115 +516,159 @@ def my_pdfs(request):
             "file_url": f"/api/pdf/{p.id}/view/",
             "processing_status": p.processing_status,
             "processing_error": p.processing_error,
+            "page_count": p.page_count,
+            "pages_processed": p.pages_processed,
+            "chunks_processed": p.chunks_processed,
         }
         for p in pdfs
     ]
     return Response(data)
 
 
-@require_http_methods(["GET"])
+@require_http_methods(["GET", "HEAD"])
 def view_pdf(request, pdf_id):
     """
-    Serve PDF with JWT auth (streams file)
+    Serve PDF with JWT auth
     Your frontend must send Authorization: Bearer <token>
+    Supports byte ranges (so viewers can fetch pages on demand) and
+    conditional GETs; with PDF_FILE_OFFLOAD set, the proxy sends the bytes.
     """
-    auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-    if not auth_header.startswith("Bearer "):
-        return HttpResponse("Unauthorized", status=401)
-
-    token = auth_header.split(" ")[1]
-
-    # Validate JWT manually using SimpleJWT
-    try:
-        jwt_auth = JWTAuthentication()
-
-        class FakeRequest:
-            def __init__(self, token_str):
-                self.META = {"HTTP_AUTHORIZATION": f"Bearer {token_str}"}
-
-        fake_req = FakeRequest(token)
-        auth_result = jwt_auth.authenticate(fake_req)
-
-        if auth_result is None:
-            return HttpResponse("Unauthorized", status=401)
-
-        user, _ = auth_result
-    except (InvalidToken, AuthenticationFailed) as e:
-        return HttpResponse(f"Unauthorized: {str(e)}", status=401)
+    user, error = authenticate_bearer(request)
+    if error is not None:
+        return error
 
     # Get PDF owned by user
     pdf = get_object_or_404(PDF, id=pdf_id, user=user)
 
-    # Stream file
     try:
         # Ensure file exists on storage before opening to avoid 500s
         if not pdf.file or not pdf.file.storage.exists(pdf.file.name):
             return HttpResponse("File not found on server", status=404)
 
-        response = FileResponse(pdf.file.open("rb"), content_type="application/pdf")
-        response["Content-Disposition"] = f'inline; filename="{pdf.title}"'
-        return response
+        return serve_file(request, pdf.file, "application/pdf", pdf.title)
     except Exception as e:
         return HttpResponse(f"Error: {str(e)}", status=500)
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def ask_pdf(request, pdf_id):
+def _retrieve_context(pdf_obj, question, q_embed, top_k=5):
     """
-    Ask a question about a PDF using:
-    - SentenceTransformer embeddings + FAISS retrieval
-    - flan-t5-small generation using retrieved context
+    Find the chunks most relevant to the question: nearest chunks by
+    embedding and best BM25 matches (exact terms such as part numbers or
+    clause ids), fused with reciprocal rank fusion. The fused pool
+    (PDF_RERANK_CANDIDATES) is then reranked by a cross-encoder down to top_k
+    and packed into the prompt's token budget.
+    Returns (relevant_text, None) or (None, error Response).
     """
-    question = request.data.get("question", "").strip()
-    if not question:
-        return Response({"error": "Question required"}, status=400)
-
-    # Ensure PDF belongs to user (important security)
-    pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user)
-
-    chunks_qs = PDFChunk.objects.filter(pdf=pdf_obj).order_by("order")
-    if not chunks_qs.exists():
-        # No chunks present — attempt synchronous processing to recover
+    pdf_obj = pdf_obj.content_owner
+    with span("index_load"):
+        index = load_index(pdf_obj)
+    if index is None:
+        # Not processed yet: never process inline what a worker is (or will be) processing
+        if pdf_obj.processing_status in (PDF.PROCESSING_PENDING, PDF.PROCESSING_RUNNING) or has_active_job(pdf_obj):
+            return None, Response(
+                {"error": "PDF is still processing", "processing_status": pdf_obj.processing_status}, status=409
+            )
+        if pdf_obj.processing_status != PDF.PROCESSING_DONE:
+            return None, Response(
+                {"error": pdf_obj.processing_error or "PDF processing failed", "processing_status": pdf_obj.processing_status},
+                status=409,
+            )
+        # Processed, but no chunks present — attempt synchronous processing to recover
         success, payload = process_pdf_obj(pdf_obj)
         if not success:
             # Return the processing error so frontend can surface it or allow manual reprocess
-            return Response(payload, status=payload.get("status", 500))
-        # Re-fetch chunks after processing
-        chunks_qs = PDFChunk.objects.filter(pdf=pdf_obj).order_by("order")
-        if not chunks_qs.exists():
-            return Response({"error": "No chunks found after processing"}, status=500)
-
-    q_embed = embed_model.encode(question)
-
-    # Build (text, embedding) pairs ONLY for valid embeddings
-    pairs = []
-    for c in chunks_qs:
-        emb = c.embedding
-        if emb is None:
-            continue
-        if isinstance(emb, str):
-            try:
-                emb = json.loads(emb)
-            except Exception:
-                continue
-        if not isinstance(emb, list) or len(emb) == 0:
-            continue
-        if not all(isinstance(x, (float, int)) for x in emb):
-            continue
-
-        pairs.append((c.chunk_text, np.array(emb, dtype="float32")))
-
-    if len(pairs) == 0:
-        return Response({"error": "No valid embeddings found"}, status=500)
-
-    texts = [t for t, _ in pairs]
-    embeds = [e for _, e in pairs]
-
-    top_indices, _ = vector_search(q_embed, embeds, top_k=5)
-    relevant_text = "\n\n".join([texts[i] for i in top_indices])
-
-    prompt = f"""
+            return None, Response(payload, status=payload.get("status", 500))
+        index = load_index(pdf_obj)
+        if index is None:
+            return None, Response({"error": "No valid embeddings found"}, status=500)
+
+    pool = max(top_k, settings.PDF_RERANK_CANDIDATES) if settings.PDF_RERANK_ENABLED else top_k
+    candidates = max(pool, settings.PDF_HYBRID_CANDIDATES)
+    with span("vector_search"):
+        vector_orders, _ = search_index(index, q_embed, top_k=candidates)
+    with span("lexical_search"):
+        lexical = load_lexical_index(pdf_obj)
+        lexical_orders = lexical.search(question, top_k=candidates)[0] if lexical is not None else []
+    top_orders = reciprocal_rank_fusion([vector_orders, lexical_orders], k=settings.PDF_RRF_K, top_k=pool)
+
+    with span("fetch_chunks"):
+        rows = {
+            order: (text, content_hash, token_count)
+            for order, text, content_hash, token_count in PDFChunk.objects.filter(
+                pdf=pdf_obj, order__in=top_orders
+            ).values_list("order", "chunk_text", "content_hash", "token_count")
+        }
+    if len(top_orders) > top_k:
+        try:
+            with span("rerank"):
+                top_orders = rerank(question, [(o, *rows[o][:2]) for o in top_orders if o in rows], top_k=top_k)
+        except Exception as e:
+            # Fall back to the fused retrieval order
+            print("Rerank error:", e)
+            top_orders = top_orders[:top_k]
+
+    with span("pack_context"):
+        return _pack_context(pdf_obj, question, [(o, *rows[o]) for o in top_orders if o in rows]), None
+
+
+def _pack_context(pdf_obj, question, chunks):
+    """
+    Fit the chunks [(order, text, content_hash, token_count)], most relevant
+    first, into the answer model's input budget minus the prompt template.
+    Chunks stored before token counts existed are counted here once and saved.
+    """
+    tokenizer = get_llm_tokenizer()
+    missing = [(order, text) for order, text, _, tokens in chunks if tokens is None]
+    if missing:
+        counted = dict(zip([o for o, _ in missing], count_tokens(tokenizer, [t for _, t in missing])))
+        for order, tokens in counted.items():
+            PDFChunk.objects.filter(pdf=pdf_obj, order=order).update(token_count=tokens)
+        chunks = [(o, text, h, counted.get(o, tokens)) for o, text, h, tokens in chunks]
+
+    max_tokens = min(settings.PDF_PROMPT_MAX_TOKENS, tokenizer.model_max_length)
+    # +1 for the </s> the tokenizer appends to the prompt
+    budget = max_tokens - len(tokenizer(_build_prompt("", question))["input_ids"]) - 1
+    return pack_context(tokenizer, [(text, tokens) for _, text, _, tokens in chunks], budget)
+
+
+def _encode_question(question):
+    """
+    Embed a question with the embedding model and remember the vector.
+    """
+    with span("query_embed"):
+        q_embed = get_embed_model().encode(question)
+    return get_query_embedding_cache().set(embed_model_key(), question, q_embed)
+
+
+def _embed_question(question):
+    """
+    Question embedding, from the query embedding cache when the same
+    (normalized) question was embedded before with the current model.
+    """
+    q_embed = get_query_embedding_cache().get(embed_model_key(), question)
+    return q_embed if q_embed is not None else _encode_question(question)
+
+
+def _cached_answer(pdf_obj, question):
+    """
+    Look the question up in the answer cache: exact match first, then by
+    embedding similarity. Returns (answer or None, scope, question embedding).
+    The embedding is only computed when the exact lookup misses.
+    """
+    cache = get_answer_cache()
+    scope = AnswerCache.scope_for(pdf_obj.content_owner)
+
+    answer = cache.get_exact(scope, question)
+    if answer is not None:
+        return answer, scope, None
+
+    q_embed = _embed_question(question)
+    with span("answer_cache"):
+        return cache.get_similar(scope, q_embed), scope, q_embed
+
+
+def _build_prompt(relevant_text, question):
+    return f"""
 You are an AI assistant for a PDF. Use ONLY the content below.
 
 Relevant PDF Content:
@@ -416,8 +681,175 @@ Question:
 Answer clearly and concisely.
 """.strip()
 
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(device)
-    outputs = llm_model.generate(**inputs, max_new_tokens=200)
-    answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
 
-    return Response({"answer": answer})
\ No newline at end of file
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@timed_view("ask_pdf")
+def ask_pdf(request, pdf_id):
+    """
+    Ask a question about a PDF using:
+    - SentenceTransformer embeddings + FAISS retrieval, fused with BM25 matches
+    - cross-encoder reranking of the retrieved pool
+    - flan-t5-small generation using retrieved context
+    """
+    with span("parse_request"):
+        question = request.data.get("question", "").strip()
+    if not question:
+        return Response({"error": "Question required"}, status=400)
+
+    # Ensure PDF belongs to user (important security)
+    with span("fetch_pdf"):
+        pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user)
+
+    answer, scope, q_embed = _cached_answer(pdf_obj, question)
+    if answer is not None:
+        return Response({"answer": answer, "cached": True})
+
+    relevant_text, error = _retrieve_context(pdf_obj, question, q_embed)
+    if error is not None:
+        return error
+
+    with span("generate"):
+        answer = generate_answer(_build_prompt(relevant_text, question))
+    get_answer_cache().set(scope, question, q_embed, answer)
+
+    return Response({"answer": answer})
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets SSE clients (Accept: text/event-stream) through content negotiation;
+    error responses are sent to them as a single "error" event.
+    """
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event("error", data)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+@timed_view("ask_pdf_stream")
+def ask_pdf_stream(request, pdf_id):
+    """
+    Same as ask_pdf, but streams the answer as server-sent events:
+    "token" events as text is generated, then "done".
+    Generation stops when the client disconnects.
+    Request metrics cover the time to the start of the stream.
+    """
+    with span("parse_request"):
+        question = request.data.get("question", "").strip()
+    if not question:
+        return Response({"error": "Question required"}, status=400)
+
+    with span("fetch_pdf"):
+        pdf_obj = get_object_or_404(PDF, id=pdf_id, user=request.user)
+
+    answer, scope, q_embed = _cached_answer(pdf_obj, question)
+    if answer is not None:
+        events = [sse_event("token", {"text": answer}), sse_event("done", {"cached": True})]
+    else:
+        relevant_text, error = _retrieve_context(pdf_obj, question, q_embed)
+        if error is not None:
+            return error
+
+        prompt = _build_prompt(relevant_text, question)
+
+        def _remember(full_answer):
+            get_answer_cache().set(scope, question, q_embed, full_answer)
+
+        if isinstance(request._request, ASGIRequest):
+            # Async iterator so the ASGI server streams it (a sync one would be buffered)
+            events = astream_answer_events(prompt, on_complete=_remember)
+        else:
+            events = stream_answer_events(prompt, threading.Event(), on_complete=_remember)
+
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def models_status(request):
+    """
+    Load time and RSS per model loaded in this worker process
+    """
+    return Response(model_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def generation_stats(request):
+    """
+    Queue depth and batch-size histogram of the generation batcher in this worker process
+    """
+    return Response(get_batcher().stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def executor_stats(request):
+    """
+    Load and admission counters of the model executor used by the async views
+    """
+    return Response(get_model_executor().stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def cache_stats(request):
+    """
+    Size and hit-rate counters of the in-process caches
+    """
+    return Response({
+        "answers": get_answer_cache().stats(),
+        "rerank_scores": get_score_cache().stats(),
+        "query_embeddings": get_query_embedding_cache().stats(),
+    })
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Prometheus scrape endpoint: request and stage latency histograms, token,
+    cache and queue counters of this worker process.
+    Protected by PDF_METRICS_TOKEN when it is set.
+    """
+    token = settings.PDF_METRICS_TOKEN
+    if token and not hmac.compare_digest(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized", status=401)
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@timed_view("search")
+def search(request):
+    """
+    Top-k semantic search across all of the user's processed PDFs.
+    GET ?q=<query>&top_k=<n, default 10, max 100>
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "Query is required"}, status=400)
+    try:
+        top_k = min(max(int(request.query_params.get("top_k", 10)), 1), 100)
+    except ValueError:
+        return Response({"error": "top_k must be an integer"}, status=400)
+
+    started = time.perf_counter()
+    q_embed = _embed_question(query)
+    user_index.ensure_user_index(request.user.id)
+    with span("user_index_search"):
+        results = user_index.search(request.user.id, q_embed, top_k)
+
+    return Response({
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
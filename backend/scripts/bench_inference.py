@@ -0,0 +1,131 @@
+"""
+Compare the PyTorch and ONNX Runtime (fp32 and int8) inference backends for
+the embedding and answer models: latency, throughput and accuracy deltas
+against PyTorch. Runs without Django.
+
+    python scripts/bench_inference.py --threads 4 --sentences 512 --prompts 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pdfs import inference  # noqa: E402
+from pdfs.model_registry import EMBED_MODEL_NAME, LLM_MODEL_NAME  # noqa: E402
+
+WORDS = (
+    "the contract clause section payment invoice delivery term party notice warranty liability "
+    "report figure table revenue growth quarter customer product service policy data model"
+).split()
+
+
+def synthetic_sentences(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(8, 40))) for _ in range(n)]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def ms(samples):
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def unit(matrix):
+    matrix = np.asarray(matrix, dtype="float32")
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def bench_embeddings(name, model, sentences, reference=None):
+    single = timed(lambda: model.encode([sentences[0]], batch_size=1), 20)
+    started = time.perf_counter()
+    vectors = unit(model.encode(sentences, batch_size=64))
+    elapsed = time.perf_counter() - started
+
+    row = {"backend": name, "single_ms": ms(single), "sentences_per_s": round(len(sentences) / elapsed, 1)}
+    if reference is not None:
+        cosine = (vectors * reference).sum(axis=1)
+        queries = vectors[:50] @ vectors.T
+        ref_queries = reference[:50] @ reference.T
+        top = np.argsort(-queries, axis=1)[:, 1:6]
+        ref_top = np.argsort(-ref_queries, axis=1)[:, 1:6]
+        overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top, ref_top)])
+        row.update({"cosine_mean": round(float(cosine.mean()), 5), "cosine_min": round(float(cosine.min()), 5),
+                    "top5_overlap": round(float(overlap), 3)})
+    return row, vectors
+
+
+def bench_generation(name, llm, prompts, max_new_tokens, reference=None):
+    tokenizer, model, device = llm
+    answers = []
+    latencies = []
+    new_tokens = 0
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, return_token_type_ids=False).to(device)
+        started = time.perf_counter()
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+        latencies.append(time.perf_counter() - started)
+        new_tokens += output.shape[1]
+        answers.append(tokenizer.decode(output[0], skip_special_tokens=True))
+
+    row = {"backend": name, "latency_ms": ms(latencies), "tokens_per_s": round(new_tokens / sum(latencies), 1)}
+    if reference is not None:
+        row["exact_match"] = round(sum(a == b for a, b in zip(answers, reference)) / len(answers), 3)
+    return row, answers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embed-model", default=EMBED_MODEL_NAME)
+    parser.add_argument("--llm-model", default=LLM_MODEL_NAME)
+    parser.add_argument("--threads", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--prompts", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--onnx-dir", default=None, help="Reuse exported models from here (default: a temp dir).")
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    torch.set_num_threads(args.threads)
+    onnx_dir = args.onnx_dir or tempfile.mkdtemp(prefix="onnx_models_")
+    sentences = synthetic_sentences(args.sentences)
+    prompts = [f"Summarize: {s}" for s in synthetic_sentences(args.prompts, seed=1)]
+
+    print(f"threads={args.threads} sentences={len(sentences)} prompts={len(prompts)}")
+
+    print("\nEmbedding")
+    row, reference = bench_embeddings("torch", SentenceTransformer(args.embed_model, device="cpu"), sentences)
+    print(row)
+    for quantize in (False, True):
+        model = inference.load_onnx_embedder(onnx_dir, args.embed_model, quantize, args.threads)
+        print(bench_embeddings("onnx-int8" if quantize else "onnx-fp32", model, sentences, reference)[0])
+
+    print("\nGeneration")
+    tokenizer = AutoTokenizer.from_pretrained(args.llm_model)
+    model = AutoModelForSeq2SeqLM.from_pretrained(args.llm_model).eval()
+    with torch.inference_mode():
+        row, reference = bench_generation("torch", (tokenizer, model, "cpu"), prompts, args.max_new_tokens)
+    print(row)
+    for quantize in (False, True):
+        llm = inference.load_onnx_llm(onnx_dir, args.llm_model, quantize, args.threads)
+        name = "onnx-int8" if quantize else "onnx-fp32"
+        print(bench_generation(name, llm, prompts, args.max_new_tokens, reference)[0])
+
+
+if __name__ == "__main__":
+    main()
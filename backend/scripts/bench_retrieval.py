@@ -0,0 +1,132 @@
+"""
+Benchmark the BM25 index build, the vector index types (flat / IVF / HNSW:
+build time, single and batched query latency, recall against flat) and the
+hybrid (vector + BM25 + RRF) query path on a synthetic document, without
+Django or the embedding model.
+
+    python scripts/bench_retrieval.py --chunks 20000 --queries 500 --index-types flat ivf hnsw
+"""
+import argparse
+import io
+import itertools
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pdfs.bm25 import build_bm25, reciprocal_rank_fusion, BM25Index  # noqa: E402
+from pdfs import retrieval  # noqa: E402
+
+
+def synthetic_chunks(n_chunks, words_per_chunk=200, vocab_size=30000, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    # Zipf-ish word distribution plus a sprinkle of identifiers like "PN-12345"
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(vocab_size)))
+    for order in range(n_chunks):
+        words = rng.choices(vocab, cum_weights=cum_weights, k=words_per_chunk)
+        words[rng.randrange(words_per_chunk)] = f"PN-{rng.randrange(100000):05d}"
+        yield order, " ".join(words)
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {p: round(float(np.percentile(samples, p)), 3) for p in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "ivf", "hnsw"], choices=retrieval.INDEX_KINDS)
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batched search.")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    chunks = list(synthetic_chunks(args.chunks))
+
+    started = time.perf_counter()
+    bm25 = build_bm25(chunks)
+    build_seconds = time.perf_counter() - started
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **bm25.to_arrays())
+    started = time.perf_counter()
+    buffer.seek(0)
+    with np.load(buffer) as arrays:
+        BM25Index.from_arrays(arrays)
+    load_seconds = time.perf_counter() - started
+
+    print(f"chunks: {args.chunks}, terms: {len(bm25.terms)}, postings: {len(bm25.doc_ids)}")
+    print(f"bm25 build: {build_seconds:.2f}s ({args.chunks / build_seconds:.0f} chunks/s)")
+    print(f"bm25 size on disk: {buffer.tell() / 2**20:.1f} MiB, load: {load_seconds * 1000:.1f} ms")
+
+    rng = random.Random(1)
+    queries = []
+    for _ in range(args.queries):
+        _, text = chunks[rng.randrange(len(chunks))]
+        words = text.split()
+        queries.append(" ".join(rng.sample(words, 6)))
+
+    bm25_times = []
+    for q in queries:
+        started = time.perf_counter()
+        bm25.search(q, top_k=args.candidates)
+        bm25_times.append(time.perf_counter() - started)
+
+    print(f"bm25 query ms (p50/p95/p99): {percentiles(bm25_times)}")
+
+    # Clustered vectors (topics), like real embeddings; uniform noise is a worst case for ANN indexes
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(args.chunks // 100, 1), args.dim))
+    vectors = (centers[rng.integers(len(centers), size=args.chunks)]
+               + 0.5 * rng.standard_normal((args.chunks, args.dim))).astype("float32")
+    query_vecs = (centers[rng.integers(len(centers), size=args.queries)]
+                  + 0.5 * rng.standard_normal((args.queries, args.dim))).astype("float32")
+    ids = np.arange(args.chunks, dtype="int64")
+    search_params = {"nprobe": args.nprobe, "ef_search": args.ef_search}
+
+    exact = None
+    for kind in args.index_types:
+        started = time.perf_counter()
+        index = retrieval.build_index(vectors, ids, kind)
+        build_seconds = time.perf_counter() - started
+
+        vector_times = []
+        hybrid_times = []
+        results = []
+        for q, vec in zip(queries, query_vecs):
+            started = time.perf_counter()
+            vector_orders, _ = retrieval.search(index, vec, args.candidates, **search_params)[0]
+            vector_times.append(time.perf_counter() - started)
+            lexical_orders, _ = bm25.search(q, top_k=args.candidates)
+            reciprocal_rank_fusion([vector_orders, lexical_orders], top_k=5)
+            hybrid_times.append(time.perf_counter() - started)
+            results.append(vector_orders)
+
+        started = time.perf_counter()
+        for i in range(0, len(query_vecs), args.batch):
+            retrieval.search(index, query_vecs[i:i + args.batch], args.candidates, **search_params)
+        batch_qps = len(query_vecs) / (time.perf_counter() - started)
+
+        if exact is None and kind == "flat":
+            exact = results
+        recall = ""
+        if exact is not None:
+            hits = sum(len(set(r) & set(e)) for r, e in zip(results, exact))
+            recall = f", recall@{args.candidates} vs flat: {hits / sum(len(e) for e in exact):.3f}"
+
+        print(f"[{retrieval.index_kind(index)}] build: {build_seconds:.2f}s{recall}")
+        print(f"[{retrieval.index_kind(index)}] vector query ms (p50/p95/p99): {percentiles(vector_times)}")
+        print(f"[{retrieval.index_kind(index)}] hybrid query ms (p50/p95/p99): {percentiles(hybrid_times)}")
+        print(f"[{retrieval.index_kind(index)}] batched ({args.batch}/search): {batch_qps:.0f} queries/s")
+
+
+if __name__ == "__main__":
+    main()